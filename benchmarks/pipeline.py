@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from benchmarks.synthetic import make_catalog, make_fault_layer
+from src.utils import column_store, common_functions
+from src.utils.clean_data import CLEAN_DATA_PATH, add_boundary_columns, add_sequence_columns
+from src.utils.data_provider import DASHBOARD_COLUMNS, Dataset
+from src.utils.figure_encoding import encode_figure
+from src.utils.tectonics import TECTONIC_CACHE_PATH, FaultLayer
+
+# Tailles par défaut des catalogues synthétiques (10 millions : --sizes ... 10000000)
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+# Plage de magnitudes filtrée, proche de la sélection par défaut du dashboard
+DEFAULT_MAG_RANGE = (4.5, 10.0)
+# Au-delà de ce ratio (durée actuelle / durée de référence), une étape est signalée
+REGRESSION_THRESHOLD = 1.2
+# Écart absolu minimal pour signaler une régression (ignore le bruit des étapes très courtes)
+REGRESSION_MIN_SECONDS = 0.002
+# Budget de points et niveau de grille du globe (MAX_GLOBE_POINTS et GLOBE_GRID_LEVEL du composant)
+GLOBE_POINT_BUDGET = 20_000
+GLOBE_GRID_LEVEL = 3
+RESULTS_DIR = 'benchmarks/results'
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """
+    Chronomètre `func` (`repeat` exécutions, après une exécution d'échauffement
+    qui charge les imports et caches paresseux) puis mesure son pic d'allocation
+    mémoire lors d'une exécution supplémentaire sous tracemalloc (NumPy et
+    pandas y déclarent leurs tableaux).
+    Returns:
+        {'seconds_min', 'seconds_median', 'peak_bytes', 'repeat'}
+    """
+    func()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds_min': min(durations),
+        'seconds_median': statistics.median(durations),
+        'peak_bytes': peak,
+        'repeat': repeat,
+    }
+
+
+def load_fault_layer_for_bench() -> FaultLayer:
+    """
+    Couche tectonique réelle si sa copie locale existe, synthétique sinon
+    (les mesures restent possibles hors ligne).
+    """
+    if os.path.isfile(TECTONIC_CACHE_PATH):
+        return FaultLayer.load(TECTONIC_CACHE_PATH)
+    return make_fault_layer()
+
+
+def bench_catalog(name: str, store_path: str, fault_layer: FaultLayer, repeat: int,
+                  mag_range: tuple) -> List[dict]:
+    """
+    Mesure chaque étape du pipeline chargement -> filtre -> figure sur un store.
+    """
+    results = []
+
+    def record(step: str, func: Callable[[], object], step_repeat: int = repeat) -> None:
+        result = {'catalog': name, 'step': step, **measure(func, step_repeat)}
+        results.append(result)
+        print(f"{name:<20} {step:<28} {result['seconds_median'] * 1000:10.1f} ms "
+              f"{result['peak_bytes'] / 2 ** 20:9.1f} MiB")
+
+    record('load_clean_data', lambda: common_functions.load_clean_data(DASHBOARD_COLUMNS, store_path))
+    df = common_functions.load_clean_data(DASHBOARD_COLUMNS, store_path)
+    record('build_indexes', lambda: Dataset(df))
+    dataset = Dataset(df)
+
+    # Filtre par magnitude tel que fait par `update_visuals` (sans le cache des vues)
+    def magnitude_filter() -> pd.DataFrame:
+        start, stop, _ = dataset.selection(list(mag_range))
+        return dataset.df.iloc[start:stop]
+
+    record('magnitude_filter', magnitude_filter)
+    filtered = magnitude_filter()
+    results[-1]['n_filtered'] = len(filtered)
+
+    record('create_magnitude_histogram', lambda: common_functions.create_magnitude_histogram(
+        *dataset.histogram(list(mag_range)), bin_width=dataset.mag_index.bin_width
+    ))
+
+    def map_figure():
+        fig = common_functions.create_earthquake_map(filtered, 'open-street-map')
+        return common_functions.add_fault_lines_mapbox(fig, fault_layer, 1)
+
+    record('create_earthquake_map', map_figure)
+    map_fig = map_figure()
+    record('create_globe_figure', lambda: common_functions.create_globe_figure(filtered))
+    globe_fig = common_functions.create_globe_figure(filtered)
+
+    strongest = filtered.iloc[-1]
+    radius = common_functions.felt_radius_km(float(strongest['mag']))
+    record('create_geodesic_circle', lambda: common_functions.create_geodesic_circle(
+        float(strongest['latitude']), float(strongest['longitude']), radius
+    ))
+    zones = filtered.iloc[-2000:]
+    record('felt_zone_polygons', lambda: common_functions.felt_zone_polygons(
+        zones['latitude'].to_numpy(), zones['longitude'].to_numpy(), zones['mag'].to_numpy()
+    ))
+
+    record('map_figure_to_json', map_fig.to_json)
+    record('globe_figure_to_json', globe_fig.to_json)
+    results[-1]['payload_bytes'] = len(globe_fig.to_json())
+
+    # Réponse réellement envoyée par `update_visuals` (tableaux typés)
+    def encoded_globe_json() -> str:
+        return json.dumps(encode_figure(globe_fig), cls=plotly.utils.PlotlyJSONEncoder)
+
+    record('globe_figure_encoded_json', encoded_globe_json)
+    results[-1]['payload_bytes'] = len(encoded_globe_json())
+
+    # Globe réellement construit par `build_main_figure` : face cachée écartée, puis échantillon
+    def globe_points() -> np.ndarray:
+        _, on_globe = dataset.globe_positions(list(mag_range), None, None)
+        return dataset.grid_lod.decimate(on_globe, GLOBE_GRID_LEVEL, GLOBE_POINT_BUDGET)
+
+    record('globe_cull_decimate', globe_points)
+    shown = globe_points()
+    results[-1]['n_shown'] = len(shown)
+    decimated_globe = common_functions.create_globe_figure(dataset.df.iloc[shown])
+
+    def encoded_decimated_globe_json() -> str:
+        return json.dumps(encode_figure(decimated_globe), cls=plotly.utils.PlotlyJSONEncoder)
+
+    record('globe_decimated_encoded_json', encoded_decimated_globe_json)
+    results[-1]['payload_bytes'] = len(encoded_decimated_globe_json())
+    for result in results:
+        result['n_events'] = len(df)
+    return results
+
+
+def environment() -> dict:
+    """
+    Contexte de la mesure (versions, machine, commit), pour comparer des exécutions.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+        'machine': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results: List[dict], baseline_path: str, threshold: float = REGRESSION_THRESHOLD) -> int:
+    """
+    Compare les durées médianes à celles d'un fichier de résultats précédent.
+    Returns:
+        Nombre d'étapes en régression (ratio supérieur à `threshold` et écart
+        supérieur à REGRESSION_MIN_SECONDS).
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['catalog'], r['step']): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\n{'catalog':<20} {'step':<28} {'before':>10} {'after':>10} {'ratio':>7}")
+    for result in results:
+        before = baseline.get((result['catalog'], result['step']))
+        if before is None:
+            continue
+        ratio = result['seconds_median'] / max(before['seconds_median'], 1e-9)
+        flag = ''
+        if ratio > threshold and result['seconds_median'] - before['seconds_median'] > REGRESSION_MIN_SECONDS:
+            regressions += 1
+            flag = '  REGRESSION'
+        print(f"{result['catalog']:<20} {result['step']:<28} {before['seconds_median'] * 1000:8.1f}ms "
+              f"{result['seconds_median'] * 1000:8.1f}ms {ratio:7.2f}{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mesure le pipeline chargement -> filtre -> figure.")
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES,
+                        help="tailles des catalogues synthétiques")
+    parser.add_argument('--no-bundled', action='store_true', help="ignore les données 2024 livrées")
+    parser.add_argument('--repeat', type=int, default=5, help="exécutions chronométrées par étape")
+    parser.add_argument('--mag-range', type=float, nargs=2, default=DEFAULT_MAG_RANGE)
+    parser.add_argument('--data-dir', help="conserve les stores générés dans ce répertoire")
+    parser.add_argument('--output', help="fichier JSON des résultats (par défaut dans benchmarks/results/)")
+    parser.add_argument('--compare', help="fichier de résultats de référence")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='earthquake-bench-')
+    fault_layer = load_fault_layer_for_bench()
+    catalogs = []
+    if not args.no_bundled and os.path.isfile(CLEAN_DATA_PATH):
+        catalogs.append(('bundled-2024', lambda: pd.read_csv(CLEAN_DATA_PATH)))
+    for size in args.sizes:
+        catalogs.append((f'synthetic-{size}', lambda size=size: make_catalog(size, seed=args.seed)))
+
+    results = []
+    try:
+        for name, make in catalogs:
+            store_path = os.path.join(data_dir, name)
+            if not column_store.store_exists(store_path):
+                catalog = add_sequence_columns(add_boundary_columns(make(), fault_layer))
+                column_store.write_store(catalog, store_path, partitioning=column_store.CATALOG_PARTITIONING)
+            results.extend(bench_catalog(name, store_path, fault_layer, args.repeat, tuple(args.mag_range)))
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {'environment': environment(), 'mag_range': list(args.mag_range), 'results': results}
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['environment']['commit'] or 'local'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"\nResults written to {output}.")
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
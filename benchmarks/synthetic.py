@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.tectonics import FaultLayer
+
+# Magnitude de complétude et pente b de la loi de Gutenberg–Richter des catalogues synthétiques
+MIN_MAGNITUDE = 2.5
+B_VALUE = 1.0
+# Nombre de foyers autour desquels se regroupent les épicentres
+N_SOURCES = 400
+# Nombre de lieux distincts (colonne `place`)
+N_PLACES = 5000
+
+
+def make_catalog(n_events: int, seed: int = 0, start: str = "2000-01-01", end: str = "2025-01-01") -> pd.DataFrame:
+    """
+    Catalogue synthétique au format du CSV nettoyé : magnitudes selon
+    Gutenberg–Richter, épicentres regroupés autour de foyers, profondeurs
+    majoritairement superficielles, dates uniformes sur la période.
+    Args:
+        n_events: Nombre d'événements.
+        seed: Graine du générateur (catalogues reproductibles).
+        start: Première date possible.
+        end: Dernière date possible.
+    Returns:
+        DataFrame avec les colonnes 'id', 'time', 'updated', 'latitude',
+        'longitude', 'depth', 'mag' et 'place'.
+    """
+    rng = np.random.default_rng(seed)
+    source_lat = rng.uniform(-60, 70, N_SOURCES)
+    source_lon = rng.uniform(-180, 180, N_SOURCES)
+    source = rng.integers(0, N_SOURCES, n_events)
+    latitude = np.clip(source_lat[source] + rng.normal(0, 2, n_events), -90, 90)
+    longitude = (source_lon[source] + rng.normal(0, 2, n_events) + 180) % 360 - 180
+
+    t0 = np.datetime64(start, 'ms').astype(np.int64)
+    t1 = np.datetime64(end, 'ms').astype(np.int64)
+    time = rng.integers(t0, t1, n_events).astype('datetime64[ms]')
+    updated = time + rng.integers(0, 90 * 86_400_000, n_events).astype('timedelta64[ms]')
+
+    mag = MIN_MAGNITUDE - np.log10(rng.random(n_events)) / B_VALUE
+    depth = np.where(rng.random(n_events) < 0.8, rng.exponential(20, n_events), rng.uniform(70, 700, n_events))
+    places = np.array([f"{k % 100} km NE of Town {k}" for k in range(N_PLACES)], dtype=object)
+
+    return pd.DataFrame({
+        'id': np.char.add('syn', np.arange(n_events).astype(str)),
+        'time': pd.to_datetime(time, utc=True),
+        'updated': pd.to_datetime(updated, utc=True),
+        'latitude': latitude.astype(np.float32),
+        'longitude': longitude.astype(np.float32),
+        'depth': depth.astype(np.float32),
+        'mag': np.round(mag, 1).astype(np.float32),
+        'place': places[rng.integers(0, N_PLACES, n_events)],
+    })
+
+
+def make_fault_layer(n_lines: int = 230, points_per_line: int = 60, seed: int = 0) -> FaultLayer:
+    """
+    Couche de frontières synthétique de taille comparable à PB2002 (marches
+    aléatoires lon/lat), utilisée quand la copie locale n'est pas disponible.
+    """
+    rng = np.random.default_rng(seed)
+    lines = []
+    for _ in range(n_lines):
+        origin = np.array([rng.uniform(-180, 180), rng.uniform(-70, 70)])
+        steps = rng.normal(0, 0.3, (points_per_line, 2))
+        line = origin + np.cumsum(steps, axis=0)
+        line[:, 0] = np.clip(line[:, 0], -180, 180)
+        line[:, 1] = np.clip(line[:, 1], -90, 90)
+        lines.append(line)
+    return FaultLayer(lines, [f"B{i}" for i in range(n_lines)], ["boundary"] * n_lines)
@@ -1,8 +1,34 @@
-from src.app import app
-from src.pages import home
+import sys
+from src.utils.startup import startup_timer
 
-app.layout = home.layout
+with startup_timer.phase("imports"):
+    from src.app import app
+    from src.pages import home
+    from src.utils.data_provider import provider
+    from src.utils.refresh import refresher_from_env
+
+with startup_timer.phase("layout"):
+    app.layout = home.layout
+
+# Point d'entrée WSGI (ex. gunicorn main:server)
+server = app.server
+
+# Rafraîchissement périodique (EARTHQUAKE_REFRESH_INTERVAL) dans chaque processus qui
+# sert l'application, y compris les workers gunicorn : un verrou de fichier désigne
+# celui qui interroge l'API, les autres rechargent le store modifié
+refresher = refresher_from_env(provider)
+if refresher is not None and '--profile-startup' not in sys.argv:
+    refresher.start()
+
+# Données, index et couche tectonique chargés en arrière-plan dans chaque processus
+# (les callbacks n'utilisent que la couche déjà chargée, sans téléchargement)
+if '--profile-startup' not in sys.argv:
+    provider.warm(background=True)
 
 if __name__ == '__main__':
-    app.run_server(debug=True, port=8051)
-    
\ No newline at end of file
+    if '--profile-startup' in sys.argv:
+        # Mesure du démarrage : chargement complet puis rapport par phase
+        provider.warm()
+        report = startup_timer.report()
+        sys.exit(0 if report['within_budget'] else 1)
+    app.run(debug=True, port=8051)
@@ -1,5 +1,9 @@
 from dash import Dash
 import dash_bootstrap_components as dbc
 
+from src.utils.metrics import callback_metrics
+
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 server = app.server
+# Durées, tailles des réponses et taux de succès des caches des callbacks : GET /metrics
+callback_metrics.register_server(server)
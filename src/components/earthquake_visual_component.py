@@ -1,27 +1,74 @@
-from dash import dcc, html, Input, Output, State, callback
+from dash import dcc, html, Input, Output, State, Patch, callback, ctx, no_update
 from ..utils import common_functions
+from ..utils.data_provider import Dataset, provider
+from ..utils.figure_cache import FigureCache, cache_key
+from ..utils.figure_encoding import encode_figure
+from ..utils.metrics import callback_metrics
+from ..utils.spatial import DEFAULT_GLOBE_VIEW, parse_globe_view, parse_mapbox_viewport
 import plotly.graph_objects as go
-import requests
-import json
+import numpy as np
+import os
 import pandas as pd  # Ajouté pour typage
 
-# URL du GeoJSON des frontières tectoniques
-geojson_url = "https://raw.githubusercontent.com/fraxen/tectonicplates/master/GeoJSON/PB2002_boundaries.json"
-response = requests.get(geojson_url)
-tectonic_data: dict = json.loads(response.text)
+# Au-delà de ce nombre de séismes visibles, la carte 2D affiche des agrégats par cellule
+MAX_MAP_POINTS = 20000
+# Nombre maximal de séismes envoyés au globe 3D (modifiable par EARTHQUAKE_GLOBE_POINT_BUDGET) :
+# le rendu orthographique de Scattergeo s'effondre bien avant 100 000 points
+MAX_GLOBE_POINTS = int(os.environ.get('EARTHQUAKE_GLOBE_POINT_BUDGET', 20000))
+# Niveau de grille de l'échantillonnage du globe à l'échelle 1 (cellules d'environ 5,6°)
+GLOBE_GRID_LEVEL = 3
+# Position de la trace « Zone ressentie » du globe (juste après la trace des séismes)
+HOVER_ZONE_TRACE = 1
+# Nombre maximal de zones ressenties superposées (les plus fortes magnitudes d'abord)
+MAX_FELT_ZONES = 2000
+# Durée d'affichage d'une image de la lecture animée (millisecondes)
+PLAYBACK_INTERVAL_MS = 700
+# Borne du slider de distance aux frontières tectoniques (km) : la valeur maximale désactive le filtre
+MAX_BOUNDARY_KM = 1000
 
-# Chargement du DataFrame des séismes
-df: pd.DataFrame = common_functions.load_clean_data()
+# Figures du graphique principal déjà construites (voir `update_visuals`)
+figure_cache = FigureCache()
+callback_metrics.register_source(figure_cache.statistics)
+
+# La mise en page n'utilise que des métadonnées (lues dans le manifeste du store) :
+# les données et les index sont chargés par `provider` à la première utilisation
+metadata = provider.metadata()
 
 # Calcul des valeurs de référence pour la plage de magnitude
-mag_min: float = df['mag'].min()
-mag_max: float = df['mag'].max()
+# (bornes arrondies au pas du slider, la colonne étant stockée en float32)
+mag_min: float = float(np.floor(metadata['mag_min'] * 10) / 10)
+mag_max: float = float(np.ceil(metadata['mag_max'] * 10) / 10)
 
 # Statistiques
-total_seismes: int = len(df)
-magnitude_moyenne: float = round(df['mag'].mean(), 2)
-magnitude_max_: float = df['mag'].max()
-magnitude_min_: float = df['mag'].min()
+total_seismes: int = metadata['n_rows']
+magnitude_moyenne: float = round(metadata['mag_mean'], 2)
+magnitude_max_: float = round(metadata['mag_max'], 2)
+magnitude_min_: float = round(metadata['mag_min'], 2)
+
+# Période couverte par le catalogue : le slider temporel compte les jours depuis la première date
+time_origin = np.datetime64(metadata['time_min'] or 'today', 'D')
+n_days: int = int((np.datetime64(metadata['time_max'] or 'today', 'D') - time_origin) // np.timedelta64(1, 'D'))
+
+
+def day_bounds(day_range: list[int]) -> tuple[str, str]:
+    """
+    Dates ISO [début, fin) correspondant à une plage de jours du slider temporel
+    (le dernier jour est inclus).
+    """
+    return str(time_origin + int(day_range[0])), str(time_origin + int(day_range[1]) + 1)
+
+
+def time_marks() -> dict:
+    """
+    Graduations du slider temporel : chaque mois, ou chaque année au-delà de deux ans.
+    """
+    months = np.arange(time_origin.astype('datetime64[M]') + 1,
+                       (time_origin + n_days).astype('datetime64[M]') + 1)
+    if len(months) > 24:
+        months = months[months.astype(int) % 12 == 0]
+        return {int((m.astype('datetime64[D]') - time_origin).astype(int)): str(m)[:4] for m in months}
+    return {int((m.astype('datetime64[D]') - time_origin).astype(int)): str(m) for m in months}
+
 
 # RangeSlider pour la plage de magnitude
 magnitude_selection = dcc.RangeSlider(
@@ -34,6 +81,79 @@ magnitude_selection = dcc.RangeSlider(
     tooltip={"placement": "bottom", "always_visible": True}
 )
 
+# RangeSlider pour la période (en jours depuis la première date du catalogue)
+time_selection = dcc.RangeSlider(
+    id='time-slider',
+    min=0,
+    max=n_days,
+    step=1,
+    value=[0, n_days],
+    marks=time_marks(),
+    allowCross=False
+)
+
+# Slider de distance maximale à une frontière tectonique (désactivé si le store ne la fournit pas)
+boundary_selection = dcc.Slider(
+    id='boundary-slider',
+    min=0,
+    max=MAX_BOUNDARY_KM,
+    step=25,
+    value=MAX_BOUNDARY_KM,
+    marks={0: '0', 100: '100', 250: '250', 500: '500', MAX_BOUNDARY_KM: 'Tous'},
+    disabled=not metadata.get('has_boundaries')
+)
+
+
+def boundary_limit(distance_km: float | None) -> float | None:
+    """
+    Distance maximale à une frontière sélectionnée, None si le filtre est inactif.
+    """
+    if distance_km is None or distance_km >= MAX_BOUNDARY_KM:
+        return None
+    return float(distance_km)
+
+
+# Séquences de répliques : coloration des séismes et filtre des chocs principaux
+sequence_controls = html.Div([
+    dcc.RadioItems(
+        id='color-mode',
+        options=[
+            {'label': 'Couleur unique', 'value': 'uniform'},
+            {'label': 'Choc principal / réplique', 'value': 'mainshock'},
+            {'label': 'Par séquence', 'value': 'sequence'}
+        ],
+        value='uniform',
+        inputStyle={"marginRight": "5px"},
+        style={"color": "#fff"}
+    ),
+    dcc.Checklist(
+        id='sequence-filter',
+        options=[{'label': 'Chocs principaux uniquement', 'value': 'mainshocks'}],
+        value=[],
+        style={"color": "#fff"}
+    ),
+])
+
+
+# Lecture animée de la période choisie, image par image (jour ou semaine)
+playback_controls = html.Div([
+    dcc.RadioItems(
+        id='playback-period',
+        options=[
+            {'label': 'Par jour', 'value': 'D'},
+            {'label': 'Par semaine', 'value': 'W'}
+        ],
+        value='W',
+        inline=True,
+        inputStyle={"marginRight": "5px", "marginLeft": "5px"},
+        style={"color": "#fff"}
+    ),
+    html.Button("▶ Lecture", id='playback-button', n_clicks=0, className="playback-btn"),
+    html.Button("⏹ Arrêt", id='playback-stop', n_clicks=0, className="playback-btn"),
+    dcc.Interval(id='playback-interval', interval=PLAYBACK_INTERVAL_MS, disabled=True),
+    dcc.Store(id='playback-frame'),
+])
+
 # Dropdown pour le style de carte (utilisé à la fois pour 2D et 3D)
 map_style_dropdown = dcc.Dropdown(
     id='map-style-dropdown',
@@ -75,7 +195,10 @@ layer_switch_2d = dcc.Checklist(
 # Checklist pour afficher les zones sur le globe (3D)
 zone_display_switch = dcc.Checklist(
     id="zone-display-switch",
-    options=[{'label': 'Afficher zones sur le Globe (3D)', 'value': 'globe-zones'}],
+    options=[
+        {'label': 'Afficher zones sur le Globe (3D)', 'value': 'globe-zones'},
+        {'label': 'Toutes les zones ressenties (3D)', 'value': 'all-zones'}
+    ],
     value=[],
     style={"color": "#fff"}
 )
@@ -95,6 +218,20 @@ sidebar_content = html.Div(
         html.Label("Contrôles de la magnitude"),
         magnitude_selection,
 
+        html.Br(),
+        html.Label("Période"),
+        time_selection,
+        html.Div(id='time-range-label', className="time-range-label"),
+        playback_controls,
+
+        html.Br(),
+        html.Label("Distance max. à une frontière tectonique (km)"),
+        boundary_selection,
+
+        html.Br(),
+        html.Label("Séquences de répliques"),
+        sequence_controls,
+
         html.Br(),
         html.Label("Contrôles de la carte"),
         map_style_dropdown,
@@ -119,15 +256,23 @@ sidebar_content = html.Div(
         html.H4("Infographies Sismiques"),
         html.Div([
             html.P("Nombre total de séismes"),
-            html.P(f"{total_seismes}", className="kpi-number")
+            html.P(f"{total_seismes}", id="kpi-count", className="kpi-number")
         ], className="kpi-box"),
         html.Div([
             html.P("Magnitude moyenne"),
-            html.P(f"{magnitude_moyenne}", className="kpi-number")
+            html.P(f"{magnitude_moyenne}", id="kpi-mean", className="kpi-number")
         ], className="kpi-box"),
         html.Div([
             html.P("Magnitude min/max"),
-            html.P(f"{magnitude_min_} / {magnitude_max_}", className="kpi-number")
+            html.P(f"{magnitude_min_} / {magnitude_max_}", id="kpi-min-max", className="kpi-number")
+        ], className="kpi-box"),
+        html.Div([
+            html.P("Énergie libérée"),
+            html.P("-", id="kpi-energy", className="kpi-number")
+        ], className="kpi-box"),
+        html.Div([
+            html.P("Répartition par profondeur"),
+            html.Div(id="kpi-depth")
         ], className="kpi-box"),
     ],
     id="sidebar-content"
@@ -151,6 +296,10 @@ main_content = html.Div(
         html.Div(
             dcc.Graph(id='main-graph', className="graph-container", config={'scrollZoom': True})
         ),
+        html.Div("Survolez un séisme pour afficher son lieu.", id='hover-info', className="hover-info"),
+        dcc.Store(id='map-viewport'),
+        dcc.Store(id='globe-view'),
+        dcc.Store(id='time-window'),
     ]
 )
 
@@ -159,6 +308,27 @@ earthquake_component = html.Div(
     className="earthquake-container"
 )
 
+def hovered_row(dataset: Dataset, hover_data: dict) -> pd.Series | None:
+    """
+    Retrouve la ligne de `dataset.df` correspondant au point survolé : en O(1)
+    par l'index porté dans `customdata` (s'il désigne toujours le même point),
+    sinon par le plus proche voisin.
+    """
+    point = hover_data['points'][0]
+    customdata = point.get('customdata')
+    if isinstance(customdata, (int, float)):
+        row = int(customdata)
+        # La figure peut dater d'une version précédente du jeu de données (rafraîchissement)
+        if row < len(dataset.df) and (
+            'lat' not in point
+            or (abs(dataset.df['latitude'].iat[row] - point['lat']) < 1e-3
+                and abs(dataset.df['longitude'].iat[row] - point['lon']) < 1e-3)
+        ):
+            return dataset.df.iloc[row]
+    if 'lat' in point and 'lon' in point:
+        return dataset.df.iloc[dataset.nearest_index.nearest(point['lat'], point['lon'])]
+    return None
+
 @callback(
     Output("sidebar", "className"),
     Output("main-content", "className"),
@@ -167,6 +337,7 @@ earthquake_component = html.Div(
     State("main-content", "className"),
     prevent_initial_call=True
 )
+@callback_metrics.instrument()
 def toggle_sidebar(n_clicks: int, sidebar_class: str, content_class: str) -> tuple[str, str]:
     """
     Au clic sur le bouton menu-toggle-btn :
@@ -182,102 +353,482 @@ def toggle_sidebar(n_clicks: int, sidebar_class: str, content_class: str) -> tup
         return "sidebar-open", "content-open"
 
 
+@callback(
+    Output('map-viewport', 'data'),
+    Input('main-graph', 'relayoutData'),
+    prevent_initial_call=True
+)
+@callback_metrics.instrument()
+def store_map_viewport(relayout_data: dict | None) -> dict:
+    """
+    Mémorise la vue de la carte 2D (zoom et emprise) lorsqu'elle change ;
+    les autres événements de mise en page sont ignorés.
+    """
+    viewport = parse_mapbox_viewport(relayout_data)
+    if viewport is None:
+        return no_update
+    return viewport
+
+
+@callback(
+    Output('globe-view', 'data'),
+    Input('main-graph', 'relayoutData'),
+    Input('view-switch', 'value'),
+    State('globe-view', 'data'),
+    prevent_initial_call=True
+)
+@callback_metrics.instrument()
+def store_globe_view(relayout_data: dict | None, view_mode: str, previous: dict | None) -> dict | None:
+    """
+    Mémorise l'orientation et l'échelle du globe 3D lorsqu'elles changent
+    (arrondies, voir `parse_globe_view`). Au changement de vue, le globe
+    reprend son orientation par défaut : la vue mémorisée est oubliée.
+    """
+    if ctx.triggered_id == 'view-switch':
+        return None if previous is not None else no_update
+    view = parse_globe_view(relayout_data, previous)
+    if view is None or view == previous:
+        return no_update
+    return view
+
+
+@callback(
+    Output('playback-interval', 'disabled'),
+    Output('playback-button', 'children'),
+    Input('playback-button', 'n_clicks'),
+    Input('playback-stop', 'n_clicks'),
+    State('playback-interval', 'disabled'),
+    prevent_initial_call=True
+)
+@callback_metrics.instrument()
+def toggle_playback(play_clicks: int, stop_clicks: int, disabled: bool) -> tuple[bool, str]:
+    """
+    Lance ou met en pause la lecture animée ; « Arrêt » la met en pause et
+    revient à la période choisie (voir `advance_playback`).
+    """
+    if ctx.triggered_id == 'playback-stop' or not disabled:
+        return True, "▶ Lecture"
+    return False, "⏸ Pause"
+
+
+@callback(
+    Output('playback-frame', 'data'),
+    Input('playback-interval', 'n_intervals'),
+    Input('playback-stop', 'n_clicks'),
+    Input('time-slider', 'value'),
+    Input('playback-period', 'value'),
+    State('playback-frame', 'data'),
+    prevent_initial_call=True
+)
+@callback_metrics.instrument()
+def advance_playback(n_intervals: int, stop_clicks: int, day_range: list[int], period: str,
+                     frame: int | None) -> int | None:
+    """
+    Passe à l'image suivante de la lecture (en boucle sur la période choisie).
+    Les images sont précalculées par l'index temporel : seul leur numéro circule.
+    Un changement de période ou un arrêt quitte la lecture (None).
+    """
+    time_index = provider.get().time_index
+    if ctx.triggered_id != 'playback-interval' or time_index is None:
+        return None
+    first, last = time_index.frame_range(period, *day_bounds(day_range))
+    if last <= first:
+        return None
+    if frame is None or not first <= frame + 1 < last:
+        return first
+    return frame + 1
+
+
+@callback(
+    Output('time-window', 'data'),
+    Output('time-range-label', 'children'),
+    Input('time-slider', 'value'),
+    Input('playback-frame', 'data'),
+    State('playback-period', 'value')
+)
+@callback_metrics.instrument()
+def update_time_window(day_range: list[int], frame: int | None, period: str) -> tuple[dict | None, str]:
+    """
+    Période appliquée aux graphiques : l'image en cours pendant la lecture,
+    sinon la plage du slider (None si elle couvre tout le catalogue).
+    """
+    if frame is not None:
+        time_index = provider.get().time_index
+        edges, _ = time_index.frames(period)
+        frame_start = edges[min(frame, len(edges) - 2)]
+        label = f"Jour : {frame_start}" if period == 'D' else f"Semaine du {frame_start}"
+        return {'period': period, 'frame': frame}, label
+    start, end = day_bounds(day_range)
+    label = f"{start} → {time_origin + int(day_range[1])}"
+    if day_range[0] <= 0 and day_range[1] >= n_days:
+        return None, label
+    return {'start': start, 'end': end}, label
+
+
 @callback(
     Output('histogram', 'figure'),
+    Input('magnitude-slider', 'value'),
+    Input('time-window', 'data'),
+    Input('boundary-slider', 'value'),
+    Input('sequence-filter', 'value')
+)
+@callback_metrics.instrument()
+def update_histogram(mag_range: list[float], time_window: dict | None,
+                     boundary_km: float | None, sequence_filter: list[str]) -> go.Figure:
+    """
+    Met à jour l'histogramme selon la plage de magnitudes, la période, la
+    distance aux frontières et le filtre des chocs principaux ; il ne dépend
+    d'aucune autre entrée et n'est donc recalculé que lorsque les filtres changent.
+    """
+    dataset = provider.get()
+    with callback_metrics.phase('filter'):
+        histogram = dataset.histogram(mag_range, time_window, boundary_limit(boundary_km),
+                                      'mainshocks' in (sequence_filter or []))
+    with callback_metrics.phase('figure'):
+        hist_fig = common_functions.create_magnitude_histogram(
+            *histogram, bin_width=dataset.mag_index.bin_width
+        )
+        hist_fig.update_layout(
+            template="plotly_dark",
+            paper_bgcolor="#2A2E3E",
+            plot_bgcolor="#2A2E3E",
+            font=dict(color="#FFFFFF")
+        )
+    return hist_fig
+
+
+@callback(
+    Output('kpi-count', 'children'),
+    Output('kpi-mean', 'children'),
+    Output('kpi-min-max', 'children'),
+    Output('kpi-energy', 'children'),
+    Output('kpi-depth', 'children'),
+    Input('magnitude-slider', 'value'),
+    Input('time-window', 'data'),
+    Input('boundary-slider', 'value'),
+    Input('sequence-filter', 'value')
+)
+@callback_metrics.instrument()
+def update_kpis(mag_range: list[float], time_window: dict | None, boundary_km: float | None,
+                sequence_filter: list[str]) -> tuple:
+    """
+    Met à jour les indicateurs de la barre latérale selon les filtres : à partir
+    des sommes cumulées de l'index pour une plage de magnitudes (coût indépendant
+    du nombre de séismes), sur les seuls séismes retenus si une période est choisie.
+    """
+    summary = provider.get().summary(mag_range, time_window, boundary_limit(boundary_km),
+                                     'mainshocks' in (sequence_filter or []))
+    if not summary['count']:
+        return 0, "-", "- / -", "0 J", []
+    depth_rows = [
+        html.P(f"{label} : {count}")
+        for label, count in summary.get('depth_classes', {}).items()
+    ]
+    return (
+        f"{summary['count']}",
+        f"{summary['mag_mean']:.2f}",
+        f"{summary['mag_min']:.1f} / {summary['mag_max']:.1f}",
+        f"{summary['energy']:.2e} J",
+        depth_rows,
+    )
+
+
+@callback(
     Output('main-graph', 'figure'),
     Input('magnitude-slider', 'value'),
     Input('map-style-dropdown', 'value'),
     Input('layer-switch-2d', 'value'),
     Input('zone-display-switch', 'value'),
     Input('view-switch', 'value'),
-    Input('main-graph', 'hoverData')
+    Input('map-viewport', 'data'),
+    Input('time-window', 'data'),
+    Input('boundary-slider', 'value'),
+    Input('sequence-filter', 'value'),
+    Input('color-mode', 'value'),
+    Input('globe-view', 'data')
 )
+@callback_metrics.instrument()
 def update_visuals(
     mag_range: list[float],
     map_style: str,
     layers_2d: list[str],
     zone_3d: list[str],
     view_mode: str,
-    hover_data: dict | None
-) -> tuple[go.Figure, go.Figure]:
+    viewport: dict | None,
+    time_window: dict | None,
+    boundary_km: float | None,
+    sequence_filter: list[str],
+    color_mode: str,
+    globe_view: dict | None
+) -> dict:
     """
-    Met à jour l'histogramme et le graphique principal (2D ou 3D),
+    Met à jour le graphique principal (2D ou 3D),
     selon le filtrage, la vue choisie et les couches cochées.
+    La figure est lue dans `figure_cache` si elle a déjà été construite pour
+    les mêmes entrées (normalisées par `visual_inputs`) et le même jeu de données.
+    L'emprise 2D est d'abord ramenée à la grille du niveau de zoom
+    (`GridLOD.snap_viewport`) : la figure construite ne dépend que de la clé.
     """
-    filtered_df = df[df['mag'].between(*mag_range)]
-    hist_fig = common_functions.create_magnitude_histogram(filtered_df)
-    hist_fig.update_layout(
-        template="plotly_dark",
-        paper_bgcolor="#2A2E3E",
-        plot_bgcolor="#2A2E3E",
-        font=dict(color="#FFFFFF")
+    dataset = provider.get()
+    viewport = dataset.grid_lod.snap_viewport(viewport)
+    inputs = visual_inputs(mag_range, map_style, layers_2d, zone_3d, view_mode, viewport, time_window,
+                           boundary_km, sequence_filter, color_mode, globe_view)
+    return figure_cache.get_or_build(
+        dataset.fingerprint, cache_key(**inputs),
+        lambda: build_main_figure(dataset, mag_range, map_style, layers_2d, zone_3d, view_mode,
+                                  viewport, time_window, boundary_km, sequence_filter, color_mode,
+                                  globe_view)
     )
 
+
+def visual_inputs(
+    mag_range: list[float],
+    map_style: str,
+    layers_2d: list[str],
+    zone_3d: list[str],
+    view_mode: str,
+    viewport: dict | None,
+    time_window: dict | None,
+    boundary_km: float | None,
+    sequence_filter: list[str],
+    color_mode: str,
+    globe_view: dict | None
+) -> dict:
+    """
+    Entrées de `update_visuals` ramenées à ce qui change réellement la figure :
+    magnitudes arrondies au centième (bruit flottant du slider), couches triées,
+    et seulement les options de la vue affichée (l'emprise, déjà ramenée à la
+    grille du zoom, n'importe en 2D que si une couche est affichée, les zones
+    ressenties et l'orientation du globe qu'en 3D).
+    """
+    inputs = {
+        'mag_range': [round(float(value), 2) for value in mag_range],
+        'map_style': map_style,
+        'view_mode': view_mode,
+        'time_window': time_window,
+        'max_boundary_km': boundary_limit(boundary_km),
+        'mainshocks_only': 'mainshocks' in (sequence_filter or []),
+        'color_mode': color_mode,
+    }
     if view_mode == "2D":
-        main_fig = common_functions.create_earthquake_map(filtered_df, map_style)
-        if "failles" in layers_2d:
-            main_fig = common_functions.add_fault_lines_mapbox(main_fig, tectonic_data)
-        if "seismes" in layers_2d:
-            main_fig.add_trace(go.Scattermapbox(
-                lat=filtered_df['latitude'],
-                lon=filtered_df['longitude'],
-                mode='markers',
-                marker=dict(size=8, color="#e74c3c", opacity=0.9),
-                name="Séismes",
-                text=filtered_df['mag'],
-                hovertemplate=(
-                    "Magnitude: %{text}<br>"
-                    "Latitude: %{lat}<br>"
-                    "Longitude: %{lon}<extra></extra>"
-                )
-            ))
-        if not layers_2d:
-            main_fig.add_trace(go.Scattermapbox(
-                lon=[0], lat=[0],
-                mode='markers',
-                marker=dict(size=1, color="rgba(0,0,0,0)"),
-                name="(Aucune couche)",
-                showlegend=True
-            ))
-        main_fig.update_layout(
-            template="plotly_dark",
-            paper_bgcolor="#2A2E3E",
-            font=dict(color="#FFFFFF"),
-            uirevision='map_update'
-        )
+        inputs['layers'] = sorted(layers_2d or [])
+        # La couche tectonique n'est jamais chargée ici (voir `DataProvider.warm`)
+        inputs['faults'] = provider.fault_layer() is not None
+        if layers_2d and viewport:
+            inputs['viewport'] = {name: round(float(value), 6) for name, value in viewport.items()}
     else:
-        main_fig = common_functions.create_globe_figure(filtered_df, globe_style=map_style)
-        main_fig.update_layout(
-            uirevision="globe_update",
-            template="plotly_dark",
-            paper_bgcolor="#2A2E3E",
-            font=dict(color="#FFFFFF")
-        )
-        if 'globe-zones' in zone_3d and hover_data:
-            lat_hover = hover_data['points'][0]['lat']
-            lon_hover = hover_data['points'][0]['lon']
-            hovered_point = filtered_df[
-                (filtered_df['latitude'] == lat_hover) &
-                (filtered_df['longitude'] == lon_hover)
-            ]
-            if not hovered_point.empty:
-                mag_val = hovered_point['mag'].values[0]
-                radius_km = 10 ** (0.5 * mag_val + 1)
-                circle_coords = common_functions.create_geodesic_circle(lat_hover, lon_hover, radius_km)
-                polygons = common_functions.split_polygon_at_dateline(circle_coords)
-                for poly in polygons:
-                    if len(poly) < 3:
-                        continue
-                    lat_poly = [p[0] for p in poly]
-                    lon_poly = [p[1] for p in poly]
-                    main_fig.add_trace(go.Scattergeo(
-                        lat=lat_poly,
-                        lon=lon_poly,
-                        fill='toself',
-                        fillcolor='rgba(0, 0, 255, 0.2)',
-                        line=dict(color='blue'),
-                        hoverinfo='skip',
-                        name='Zone ressentie'
+        inputs['zones'] = sorted(zone_3d or [])
+        inputs['globe_view'] = globe_view
+    return inputs
+
+
+def build_main_figure(
+    dataset: Dataset,
+    mag_range: list[float],
+    map_style: str,
+    layers_2d: list[str],
+    zone_3d: list[str],
+    view_mode: str,
+    viewport: dict | None,
+    time_window: dict | None,
+    boundary_km: float | None,
+    sequence_filter: list[str],
+    color_mode: str,
+    globe_view: dict | None
+) -> dict:
+    """
+    Construit le graphique principal.
+    En 2D, seuls les séismes visibles sont envoyés ; s'ils sont trop nombreux
+    pour le niveau de zoom, ils sont agrégés par cellule de grille.
+    En 3D, seuls les séismes de la face visible du globe sont envoyés ; au-delà
+    de MAX_GLOBE_POINTS, ils sont échantillonnés par priorité de magnitude et
+    selon la densité (`GridLOD.decimate`), et une annotation indique combien
+    de points sont omis. La zone ressentie au survol est une trace vide (indice
+    HOVER_ZONE_TRACE) remplie ensuite par `update_hover_zone`.
+    Les séismes sont colorés selon `color_mode` (séquences de répliques, voir
+    `sequence_marker`) ; les tableaux numériques des traces sont envoyés en
+    binaire (`encode_figure`).
+    """
+    mag_index, grid_lod = dataset.mag_index, dataset.grid_lod
+    with callback_metrics.phase('filter'):
+        mainshocks_only = 'mainshocks' in (sequence_filter or [])
+        if view_mode == "2D":
+            filtered_df = dataset.filtered(mag_range, time_window, boundary_limit(boundary_km), mainshocks_only)
+        else:
+            view = globe_view or DEFAULT_GLOBE_VIEW
+            n_selected, on_globe = dataset.globe_positions(mag_range, time_window, view,
+                                                           boundary_limit(boundary_km), mainshocks_only)
+
+    with callback_metrics.phase('figure'):
+        if view_mode == "2D":
+            main_fig = common_functions.create_earthquake_map(filtered_df, map_style)
+            fault_layer = provider.fault_layer()
+            if "failles" in layers_2d and fault_layer is not None:
+                zoom = viewport['zoom'] if viewport else 1
+                main_fig = common_functions.add_fault_lines_mapbox(main_fig, fault_layer, zoom)
+            if "seismes" in layers_2d:
+                visible = dataset.visible_positions(mag_range, time_window, viewport,
+                                                    boundary_limit(boundary_km), mainshocks_only)
+                if len(visible) > MAX_MAP_POINTS:
+                    zoom = viewport['zoom'] if viewport else 1
+                    cells = grid_lod.aggregate(visible, grid_lod.level_for_zoom(zoom), mag_index.mags)
+                    main_fig = common_functions.add_earthquake_clusters_mapbox(main_fig, cells)
+                else:
+                    visible_df = dataset.df.iloc[visible]
+                    main_fig.add_trace(go.Scattermapbox(
+                        lat=visible_df['latitude'],
+                        lon=visible_df['longitude'],
+                        mode='markers',
+                        marker=common_functions.sequence_marker(
+                            *dataset.sequence_labels(visible), color_mode, size=8, color="#e74c3c", opacity=0.9
+                        ),
+                        name="Séismes",
+                        text=visible_df['mag'],
+                        customdata=visible,
+                        hovertemplate=(
+                            "Magnitude: %{text:.1f}<br>"
+                            "Latitude: %{lat}<br>"
+                            "Longitude: %{lon}<extra></extra>"
+                        )
                     ))
+            if not layers_2d:
+                main_fig.add_trace(go.Scattermapbox(
+                    lon=[0], lat=[0],
+                    mode='markers',
+                    marker=dict(size=1, color="rgba(0,0,0,0)"),
+                    name="(Aucune couche)",
+                    showlegend=True
+                ))
+            main_fig.update_layout(
+                template="plotly_dark",
+                paper_bgcolor="#2A2E3E",
+                font=dict(color="#FFFFFF"),
+                uirevision='map_update'
+            )
+        else:
+            level = grid_lod.level_for_zoom(GLOBE_GRID_LEVEL + np.log2(max(view['scale'], 1)))
+            shown = grid_lod.decimate(on_globe, level, MAX_GLOBE_POINTS)
+            main_fig = common_functions.create_globe_figure(
+                dataset.df.iloc[shown], globe_style=map_style,
+                marker=common_functions.sequence_marker(
+                    *dataset.sequence_labels(shown), color_mode,
+                    size=4, color='red', opacity=0.7
+                )
+            )
+            hidden, omitted = n_selected - len(on_globe), len(on_globe) - len(shown)
+            if omitted:
+                main_fig.add_annotation(
+                    text=(f"{len(shown)} séismes affichés sur {n_selected} "
+                          f"({hidden} sur la face cachée, {omitted} omis au-delà de "
+                          f"{MAX_GLOBE_POINTS} points, les plus forts d'abord)"),
+                    x=0.01, y=0.01, xref='paper', yref='paper', xanchor='left', yanchor='bottom',
+                    showarrow=False, font=dict(size=11), bgcolor='rgba(42,46,62,0.8)'
+                )
+            main_fig.update_layout(
+                uirevision="globe_update",
+                template="plotly_dark",
+                paper_bgcolor="#2A2E3E",
+                font=dict(color="#FFFFFF")
+            )
+            if 'globe-zones' in zone_3d:
+                main_fig.add_trace(go.Scattergeo(
+                    lat=[],
+                    lon=[],
+                    mode='lines',
+                    fill='toself',
+                    fillcolor='rgba(0, 0, 255, 0.2)',
+                    line=dict(color='blue'),
+                    hoverinfo='skip',
+                    name='Zone ressentie'
+                ))
+            if 'all-zones' in zone_3d and len(on_globe):
+                # Positions triées par magnitude : les plus fortes sont en fin de tableau
+                strongest = dataset.df.iloc[on_globe[-MAX_FELT_ZONES:]]
+                zone_lats, zone_lons = common_functions.felt_zone_polygons(
+                    strongest['latitude'].to_numpy(),
+                    strongest['longitude'].to_numpy(),
+                    strongest['mag'].to_numpy()
+                )
+                main_fig.add_trace(go.Scattergeo(
+                    lat=zone_lats,
+                    lon=zone_lons,
+                    mode='lines',
+                    fill='toself',
+                    fillcolor='rgba(0, 0, 255, 0.1)',
+                    line=dict(color='blue', width=1),
+                    hoverinfo='skip',
+                    name='Zones ressenties'
+                ))
+
+    with callback_metrics.phase('encode'):
+        return encode_figure(main_fig)
 
-    return hist_fig, main_fig
+
+@callback(
+    Output('main-graph', 'figure', allow_duplicate=True),
+    Input('main-graph', 'hoverData'),
+    State('zone-display-switch', 'value'),
+    State('view-switch', 'value'),
+    prevent_initial_call=True
+)
+@callback_metrics.instrument()
+def update_hover_zone(hover_data: dict | None, zone_3d: list[str], view_mode: str) -> Patch:
+    """
+    Au survol d'un séisme sur le globe, remplace uniquement les coordonnées de
+    la trace « Zone ressentie » (mise à jour partielle) au lieu de régénérer
+    et renvoyer toute la figure.
+    """
+    if view_mode != "3D" or 'globe-zones' not in zone_3d or not hover_data:
+        return no_update
+    hovered_point = hovered_row(provider.get(), hover_data)
+    if hovered_point is None:
+        return no_update
+    zone_lats, zone_lons = common_functions.felt_zone_polygons(
+        [hovered_point['latitude']], [hovered_point['longitude']], [hovered_point['mag']]
+    )
+    patch = Patch()
+    patch['data'][HOVER_ZONE_TRACE]['lat'] = zone_lats
+    patch['data'][HOVER_ZONE_TRACE]['lon'] = zone_lons
+    return patch
+
+
+@callback(
+    Output('hover-info', 'children'),
+    Input('main-graph', 'hoverData'),
+    prevent_initial_call=True
+)
+@callback_metrics.instrument()
+def update_hover_info(hover_data: dict | None) -> str:
+    """
+    Affiche le lieu, la magnitude, la profondeur et la date du séisme survolé.
+    Ces textes ne sont pas envoyés avec la figure (un lieu par point) : seul
+    l'événement survolé est lu, à la demande. Les points agrégés sont ignorés.
+    """
+    if not hover_data or not isinstance(hover_data['points'][0].get('customdata'), (int, float)):
+        return no_update
+    dataset = provider.get()
+    row = hovered_row(dataset, hover_data)
+    if row is None:
+        return no_update
+    details = [f"M {row['mag']:.1f}"]
+    if 'depth' in row and pd.notna(row['depth']):
+        details.append(f"{row['depth']:.0f} km de profondeur")
+    if 'time' in row and pd.notna(row['time']):
+        details.append(f"{pd.Timestamp(row['time']):%Y-%m-%d %H:%M} UTC")
+    if 'boundary_distance_km' in row and pd.notna(row['boundary_distance_km']):
+        boundary = f"à {row['boundary_distance_km']:.0f} km d'une frontière"
+        if 'boundary_type' in row and pd.notna(row['boundary_type']):
+            boundary += f" ({row['boundary_type']})"
+        details.append(boundary)
+    mainshock_position = dataset.sequence_mainshock(int(row.name))
+    if mainshock_position is not None:
+        mainshock_time = pd.Timestamp(dataset.df['time'].iat[mainshock_position])
+        if mainshock_position == row.name:
+            role = "choc principal"
+        elif pd.notna(row['time']) and pd.Timestamp(row['time']) < mainshock_time:
+            role = "précurseur"
+        else:
+            role = "réplique"
+        details.append(f"{role} de la séquence du {mainshock_time:%Y-%m-%d %H:%M} UTC")
+    place = dataset.place(int(row.name)) or "Lieu inconnu"
+    return f"{place} — {', '.join(details)}"
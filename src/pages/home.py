@@ -1,8 +1,14 @@
 from dash import html
 from src.components import earthquake_visual_component
 
+# Titre selon les années couvertes par le catalogue chargé
+first_year = str(earthquake_visual_component.time_origin)[:4]
+last_year = str(earthquake_visual_component.time_origin + earthquake_visual_component.n_days)[:4]
+title = f"Activités Sismiques en {first_year}" if first_year == last_year \
+    else f"Activités Sismiques {first_year}–{last_year}"
+
 layout = html.Div([
-    html.H1("Activités Sismiques en 2024"),
+    html.H1(title),
     html.Div([
         earthquake_visual_component.earthquake_component
     ], style={"padding": "20px", "margin": "0 auto", "maxWidth": "1200px"})
@@ -1,21 +1,249 @@
+import argparse
+from typing import List, Optional, Tuple
+
+import numpy as np
 import pandas as pd
+from src.utils import column_store
+from src.utils.declustering import decluster_catalog, sequence_window
+from src.utils.tectonics import FaultLayer, load_fault_layer
+
+RAW_DATA_PATH = 'data/raw/earthquake_data.csv'
+CLEAN_DATA_PATH = 'data/cleaned/earthquake_data_cleaned.csv'
+CLEAN_STORE_PATH = 'data/cleaned/earthquake_store'
+
+# Nombre de lignes brutes traitées à la fois (borne la mémoire du nettoyage)
+CHUNK_SIZE = 100_000
+# Nombre de lignes nettoyées gardées en mémoire avant d'être fusionnées dans le store
+FLUSH_ROWS = 500_000
+# Colonnes lues pour mettre à jour les séquences de répliques du store
+SEQUENCE_INPUT_COLUMNS = ['id', 'time', 'latitude', 'longitude', 'mag', 'cluster_id', 'mainshock']
 
-def clean_earthquake_data() -> None:
+def clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Lit les données de séismes depuis un fichier CSV, effectue un nettoyage
-    (gestion des valeurs manquantes, conversion de date/heure) et enregistre
-    les données nettoyées dans un nouveau fichier CSV.
+    Nettoie un bloc de données brutes : gestion des valeurs manquantes et
+    conversion des dates.
 
-    :return: None
+    :param df: Bloc de lignes lues depuis le CSV brut
+    :return: Bloc nettoyé
     """
-    df: pd.DataFrame = pd.read_csv('data/raw/earthquake_data.csv')
     # Gérer les valeurs manquantes
     df = df.dropna(subset=['latitude', 'longitude', 'mag'])
-    # Convertir la colonne 'time' en datetime
-    df['time'] = pd.to_datetime(df['time'])
-    # Enregistrer les données nettoyées
-    df.to_csv('data/cleaned/earthquake_data_cleaned.csv', index=False)
-    print("Data cleaned and saved.")
+    # Convertir les colonnes de dates en datetime
+    df = df.assign(
+        time=pd.to_datetime(df['time'], utc=True, format='ISO8601'),
+        updated=pd.to_datetime(df['updated'], utc=True, format='ISO8601'),
+    )
+    return df
+
+def add_boundary_columns(df: pd.DataFrame, fault_layer: Optional[FaultLayer]) -> pd.DataFrame:
+    """
+    Ajoute à chaque événement la distance (km) à la frontière tectonique la plus
+    proche et le type de cette frontière, calculés par l'index des segments
+    (`BoundaryIndex`) plutôt qu'en comparant chaque événement à chaque segment.
+    Sans couche tectonique (hors ligne), les colonnes sont ajoutées vides.
+
+    :param df: Événements nettoyés
+    :param fault_layer: Frontières tectoniques, ou None
+    :return: `df` avec les colonnes 'boundary_distance_km' et 'boundary_type'
+    """
+    if fault_layer is None or df.empty:
+        return df.assign(boundary_distance_km=np.float32(np.nan), boundary_type=None)
+    distances, lines = fault_layer.boundary_index().nearest(
+        df['latitude'].to_numpy(dtype=float), df['longitude'].to_numpy(dtype=float)
+    )
+    types = np.asarray(fault_layer.types, dtype=object)[np.maximum(lines, 0)]
+    types[lines < 0] = None
+    return df.assign(boundary_distance_km=distances, boundary_type=types)
+
+def add_sequence_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ajoute à chaque événement sa séquence de répliques (Gardner–Knopoff, voir
+    `decluster_catalog`) : `id` du choc principal et rôle de choc principal.
+
+    :param df: Événements nettoyés (une révision par `id`)
+    :return: `df` avec les colonnes 'cluster_id' et 'mainshock'
+    """
+    cluster_id, mainshock, _ = decluster_catalog(df.drop(columns=['cluster_id', 'mainshock'], errors='ignore'))
+    return df.assign(cluster_id=cluster_id, mainshock=mainshock)
+
+def _label_sequences(pending: pd.DataFrame, store_path: str, existing: pd.DataFrame) -> pd.DataFrame:
+    """
+    Étiquette les séquences des lignes en attente dans le contexte du store
+    (voir `decluster_catalog`, mise à jour incrémentale) et réécrit les
+    étiquettes des seules lignes existantes qui changent.
+
+    Seule la période touchée est lue : à partir de la plus ancienne date
+    modifiée (révisions en attente et révisions qu'elles remplacent), moins
+    trois fenêtres de Gardner–Knopoff de la plus forte magnitude (la
+    fenêtre d'un changement, celles des chocs principaux qui l'atteignent et
+    de leurs répliques), élargie tant que la mise à jour repart de plus loin.
+
+    :param pending: Révisions à fusionner (une par `id`)
+    :param store_path: Store colonnaire existant
+    :param existing: Clés du store lues par `column_store.store_keys`
+    :return: Les révisions plus récentes que le store, avec 'cluster_id' et 'mainshock'
+    """
+    current = existing['updated'].reindex(pending['id']).to_numpy()
+    revision = pending['updated'].dt.tz_localize(None).to_numpy()
+    pending = pending[pd.isna(current) | (revision > current)]
+    if pending.empty:
+        return pending.assign(cluster_id=None, mainshock=False)
+    # Révisions remplacées : leur date compte parmi les changements, et le choc
+    # principal d'une réplique remplacée est réétiqueté (sa séquence peut s'éteindre)
+    replaced = column_store.read_keyed_rows(store_path, existing, pending['id'], ['time', 'cluster_id', 'mainshock'])
+    stale_mainshocks = replaced.loc[~replaced['mainshock'].to_numpy(dtype=bool), 'cluster_id'].dropna()
+    incoming = pending[SEQUENCE_INPUT_COLUMNS[:-2]].assign(
+        time=pending['time'].dt.tz_localize(None), cluster_id=None, mainshock=False
+    )
+    mag_max = column_store.store_statistics(store_path)['columns'].get('mag', {}).get('max', 0.0)
+    window = sequence_window(max(mag_max, float(incoming['mag'].max())))
+    changed = np.concatenate([incoming['time'].to_numpy(dtype='datetime64[ns]'),
+                              replaced['time'].to_numpy(dtype='datetime64[ns]')])
+    since = changed[~np.isnat(changed)].min() - 3 * window if (~np.isnat(changed)).any() else None
+
+    while True:
+        store = column_store.query_store(store_path, SEQUENCE_INPUT_COLUMNS,
+                                         time_range=None if since is None else (since, None))
+        store = store[~store['id'].isin(pending['id']).to_numpy()]
+        catalog = pd.concat([store.astype({'cluster_id': object}), incoming], ignore_index=True)
+        reset = catalog['id'].isin(stale_mainshocks).to_numpy()
+        catalog.loc[reset, 'cluster_id'] = None
+        catalog.loc[reset, 'mainshock'] = False
+        cluster_id, mainshock, start = decluster_catalog(catalog, since=since)
+        if since is None or start is None or start - 2 * window >= since:
+            break
+        since = start - 2 * window
+
+    n_kept = len(store)
+    previous = store['cluster_id'].to_numpy(dtype=object)
+    same = (previous == cluster_id[:n_kept]) | (pd.isna(previous) & pd.isna(cluster_id[:n_kept]))
+    changed_rows = ~same | (store['mainshock'].to_numpy(dtype=bool) != mainshock[:n_kept])
+    column_store.update_columns(store_path, pd.DataFrame({
+        'id': store['id'].to_numpy()[changed_rows],
+        'cluster_id': cluster_id[:n_kept][changed_rows],
+        'mainshock': mainshock[:n_kept][changed_rows],
+    }), existing=existing)
+    return pending.assign(cluster_id=cluster_id[n_kept:], mainshock=mainshock[n_kept:])
+
+def annotate_store(store_path: str = CLEAN_STORE_PATH, fault_layer: Optional[FaultLayer] = None) -> None:
+    """
+    Calcule les colonnes de distance aux frontières et de séquences de répliques
+    pour tout un store existant (store créé avant leur ajout, ou couche
+    tectonique mise à jour) et le réécrit avec le partitionnement courant.
+
+    :param store_path: Store colonnaire à compléter
+    :param fault_layer: Frontières tectoniques (chargées si None)
+    :return: None
+    """
+    df = column_store.read_store(store_path, mmap=False)
+    df = add_sequence_columns(add_boundary_columns(df, fault_layer or load_fault_layer()))
+    column_store.write_store(df, store_path, partitioning=column_store.CATALOG_PARTITIONING)
+
+def _merge_pending(frames: List[pd.DataFrame], store_path: str, fault_layer: Optional[FaultLayer],
+                   rewrite: bool, existing: Optional[pd.DataFrame]) -> Tuple[int, int]:
+    """
+    Fusionne dans le store les blocs nettoyés en attente, après dédoublonnage,
+    calcul des distances aux frontières et des séquences de répliques (voir
+    `_label_sequences`).
+
+    :param frames: Blocs nettoyés depuis la dernière fusion
+    :param store_path: Store colonnaire à mettre à jour
+    :param fault_layer: Frontières tectoniques, ou None
+    :param rewrite: Réécrit le store avec ces seules lignes au lieu de les fusionner
+    :param existing: Clés du store lues par `column_store.store_keys` (relues si None)
+    :return: (nombre d'événements ajoutés, nombre d'événements mis à jour)
+    """
+    pending = column_store.latest_revisions(pd.concat(frames, ignore_index=True))
+    pending = add_boundary_columns(pending, fault_layer)
+    partitioning = column_store.CATALOG_PARTITIONING
+    if rewrite or not column_store.store_exists(store_path):
+        pending = add_sequence_columns(pending)
+        column_store.write_store(pending.reset_index(drop=True), store_path, partitioning=partitioning)
+        return len(pending), 0
+    if existing is None:
+        # Clés lues une fois pour l'étiquetage et la fusion (`update_columns` ne déplace aucune ligne)
+        existing = column_store.store_keys(store_path)
+    pending = _label_sequences(pending, store_path, existing)
+    return column_store.upsert(store_path, pending, partitioning=partitioning, existing=existing)
+
+def clean_earthquake_data(
+    raw_path: str = RAW_DATA_PATH,
+    store_path: str = CLEAN_STORE_PATH,
+    chunksize: int = CHUNK_SIZE,
+    full_rebuild: bool = False,
+    export_csv: bool = False,
+) -> Tuple[int, int]:
+    """
+    Lit les données de séismes depuis un fichier CSV par blocs, effectue un
+    nettoyage (gestion des valeurs manquantes, conversion de date/heure) et
+    fusionne les données nettoyées dans le store colonnaire typé (voir `column_store`),
+    partitionné par année et tranche de magnitude : le catalogue peut couvrir
+    plusieurs décennies, chaque partition portant ses propres statistiques.
+    Chaque événement reçoit sa distance à la frontière tectonique la plus proche
+    (voir `add_boundary_columns`) et sa séquence de répliques : seuls les
+    événements proches dans le temps d'un changement sont réétiquetés (voir
+    `_label_sequences`), et le dashboard n'a plus qu'à lire les colonnes.
+
+    Chaque événement est dédoublonné sur son `id` en gardant la révision la plus
+    récente (`updated`). Seuls les événements nouveaux ou modifiés par rapport au
+    store sont écrits : un rafraîchissement ne coûte que la taille du CSV brut.
+    Les blocs retenus sont fusionnés dans le store dès qu'ils dépassent
+    FLUSH_ROWS lignes : la mémoire reste bornée quelle que soit la taille du CSV.
+
+    :param raw_path: CSV brut à nettoyer
+    :param store_path: Store colonnaire à mettre à jour
+    :param chunksize: Nombre de lignes lues à la fois
+    :param full_rebuild: Reconstruit le store à partir du seul CSV brut
+    :param export_csv: Exporte aussi l'intégralité du store dans le CSV nettoyé
+    :return: (nombre d'événements ajoutés, nombre d'événements mis à jour)
+    """
+    fault_layer = load_fault_layer()
+    existing = None
+    if not full_rebuild and column_store.store_exists(store_path):
+        manifest = column_store.read_manifest(store_path)
+        if 'boundary_distance_km' not in manifest['columns'] or 'cluster_id' not in manifest['columns']:
+            # Store antérieur aux colonnes calculées : elles le sont une fois pour tout le store
+            annotate_store(store_path, fault_layer)
+        elif manifest.get('partitioning') != column_store.CATALOG_PARTITIONING:
+            # Store antérieur au partitionnement courant (ex. par mois) : réécrit une fois
+            column_store.compact_store(store_path, partitioning=column_store.CATALOG_PARTITIONING)
+        # Clés lues une seule fois : filtrage des blocs et première fusion
+        existing = column_store.store_keys(store_path)
+    known = None if existing is None else existing['updated'].groupby(level=0).max()
+
+    added = updated = 0
+    rewrite = full_rebuild
+    frames: List[pd.DataFrame] = []
+    n_pending = 0
+    for chunk in pd.read_csv(raw_path, chunksize=chunksize):
+        chunk = clean_chunk(chunk)
+        if known is not None:
+            # Écarter les révisions déjà connues avant de les garder en mémoire
+            current = known.reindex(chunk['id']).to_numpy()
+            revision = chunk['updated'].dt.tz_localize(None).to_numpy()
+            newer = pd.isna(current) | (revision > current)
+            chunk = chunk[newer]
+        frames.append(chunk)
+        n_pending += len(chunk)
+        if n_pending >= FLUSH_ROWS:
+            n_added, n_updated = _merge_pending(frames, store_path, fault_layer, rewrite, existing)
+            added, updated = added + n_added, updated + n_updated
+            # Le store a changé : les fusions suivantes relisent ses clés
+            frames, n_pending, rewrite, existing = [], 0, False, None
+
+    if frames or rewrite or not column_store.store_exists(store_path):
+        if not frames:
+            frames = [clean_chunk(pd.read_csv(raw_path, nrows=0))]
+        n_added, n_updated = _merge_pending(frames, store_path, fault_layer, rewrite, existing)
+        added, updated = added + n_added, updated + n_updated
+    if export_csv:
+        column_store.read_store(store_path).to_csv(CLEAN_DATA_PATH, index=False)
+    print(f"Data cleaned and saved ({added} new, {updated} updated).")
+    return added, updated
 
 if __name__ == "__main__":
-    clean_earthquake_data()
+    parser = argparse.ArgumentParser(description="Nettoie les données brutes de séismes.")
+    parser.add_argument("--full", action="store_true", help="reconstruit entièrement le store")
+    parser.add_argument("--csv", action="store_true", help="exporte aussi le CSV nettoyé")
+    args = parser.parse_args()
+    clean_earthquake_data(full_rebuild=args.full, export_csv=args.csv)
@@ -0,0 +1,919 @@
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Version du format sur disque (incrémentée à chaque changement de layout)
+STORE_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+# Au-delà de ce nombre de segments, `upsert` regroupe le store en un seul segment
+MAX_SEGMENTS = 32
+# Store partitionné : au-delà de ce nombre de segments, une partition est regroupée
+MAX_PARTITION_SEGMENTS = 8
+
+# Partitionnement du catalogue : un répertoire par année (colonne `time`, période
+# `period` : "Y" ou "M") et par tranche de magnitude (bornes `mag_edges`), chacun avec
+# ses propres statistiques. Quelques milliers de lignes par partition : assez pour
+# que la lecture ne soit pas dominée par le coût fixe de chaque segment
+CATALOG_PARTITIONING: Dict[str, object] = {"time": "time", "period": "Y", "mag": "mag",
+                                           "mag_edges": [4.0, 5.0, 6.0]}
+
+# Types cibles des colonnes du catalogue USGS. Les colonnes inconnues sont
+# déduites : numériques -> float32, le reste -> chaîne.
+SCHEMA: Dict[str, str] = {
+    "time": "datetime",
+    "latitude": "float32",
+    "longitude": "float32",
+    "depth": "float32",
+    "mag": "float32",
+    "magType": "category",
+    "nst": "float32",
+    "gap": "float32",
+    "dmin": "float32",
+    "rms": "float32",
+    "net": "category",
+    "id": "string",
+    "updated": "datetime",
+    "place": "string",
+    "type": "category",
+    "horizontalError": "float32",
+    "depthError": "float32",
+    "magError": "float32",
+    "magNst": "float32",
+    "status": "category",
+    "locationSource": "category",
+    "magSource": "category",
+    "boundary_distance_km": "float32",
+    "boundary_type": "category",
+    "cluster_id": "category",
+    "mainshock": "bool",
+}
+
+# Séparateur des chaînes dans les fichiers texte (absent des données USGS)
+_STRING_SEP = "\x00"
+
+# Bornes (min, max) d'un filtre, None pour une borne ouverte ; emprise (ouest, sud, est, nord)
+Range = Tuple[Optional[object], Optional[object]]
+BBox = Tuple[float, float, float, float]
+
+
+def _column_kind(name: str, series: pd.Series) -> str:
+    """
+    Détermine le type de stockage d'une colonne.
+    Args:
+        name: Nom de la colonne.
+        series: Valeurs de la colonne.
+    Returns:
+        'float32', 'datetime', 'bool', 'category' ou 'string'.
+    """
+    if name in SCHEMA:
+        return SCHEMA[name]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "float32"
+    return "string"
+
+
+def _to_datetime64(series: pd.Series) -> np.ndarray:
+    """
+    Convertit une colonne de dates (texte ou datetime) en datetime64[ns] UTC naïf.
+    """
+    values = pd.to_datetime(series, utc=True, format="ISO8601")
+    return values.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+
+
+def _write_column(directory: str, name: str, kind: str, series: pd.Series) -> dict:
+    """
+    Écrit une colonne dans `directory` et retourne sa description pour le manifeste.
+    """
+    base = os.path.join(directory, name)
+    meta: dict = {"kind": kind}
+    if kind == "float32":
+        np.save(base + ".npy", pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float32))
+    elif kind == "datetime":
+        np.save(base + ".npy", _to_datetime64(series))
+    elif kind == "bool":
+        np.save(base + ".npy", series.to_numpy(dtype=bool, na_value=False))
+    elif kind == "category":
+        cat = series.astype("category")
+        categories = [str(c) for c in cat.cat.categories]
+        np.save(base + ".npy", cat.cat.codes.to_numpy(dtype=_code_dtype(len(categories))))
+        meta["categories"] = categories
+    else:
+        nulls = series.isna().to_numpy()
+        text = _STRING_SEP.join(series.fillna("").astype(str).tolist())
+        with open(base + ".txt", "wb") as f:
+            f.write(text.encode("utf-8"))
+        if nulls.any():
+            np.save(base + ".null.npy", nulls)
+            meta["nullable"] = True
+    return meta
+
+
+def _code_dtype(n_categories: int) -> type:
+    """
+    Type des codes d'une colonne catégorielle : le même que pandas, pour que la
+    relecture n'entraîne pas de copie.
+    """
+    return np.int8 if n_categories < 127 else np.int16 if n_categories < 32767 else np.int32
+
+
+def string_buffer(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode une colonne de chaînes en un tampon d'octets UTF-8 et ses décalages
+    (n + 1 entiers), deux tableaux mappables en mémoire sans matérialiser les
+    chaînes : voir `string_at`. Les valeurs nulles deviennent des chaînes vides.
+    """
+    encoded = [value.encode("utf-8") for value in series.fillna("").astype(str)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def string_at(offsets: np.ndarray, data: np.ndarray, position: int) -> str:
+    """
+    Chaîne de la ligne `position` d'un tampon écrit par `string_buffer`.
+    """
+    return bytes(data[offsets[position]:offsets[position + 1]]).decode("utf-8")
+
+
+def _column_base(directory: str, name: str, meta: dict) -> str:
+    """
+    Chemin (sans extension) du fichier courant d'une colonne : son nom, ou la
+    version écrite par `update_columns`.
+    """
+    return os.path.join(directory, meta.get("file", name))
+
+
+def _read_values(directory: str, name: str, meta: dict, n_rows: int, mmap: bool) -> np.ndarray:
+    """
+    Valeurs brutes d'une colonne écrite par `_write_column` : tableau NumPy
+    (codes pour une colonne catégorielle, objets avec None pour les chaînes nulles).
+    """
+    base = _column_base(directory, name, meta)
+    if meta["kind"] != "string":
+        return np.load(base + ".npy", mmap_mode="r" if mmap else None)
+    with open(base + ".txt", "rb") as f:
+        raw = f.read().decode("utf-8")
+    values = np.array(raw.split(_STRING_SEP) if n_rows else [], dtype=object)
+    if meta.get("nullable"):
+        values[np.load(base + ".null.npy")] = None
+    return values
+
+
+def _category_dtype(categories: List[str]) -> pd.CategoricalDtype:
+    # Catégories toujours textuelles, même vides, pour que les segments s'unissent
+    return pd.CategoricalDtype(pd.Index(categories, dtype=str))
+
+
+def _to_series(name: str, kind: str, values: np.ndarray,
+               categories: Optional[List[str]] = None) -> pd.Series:
+    """
+    Colonne typée construite sur les valeurs brutes lues par `_read_values`.
+    """
+    if kind == "category":
+        # Codes écrits par `_write_column`, donc valides : la validation les recopierait
+        return pd.Series(pd.Categorical.from_codes(values, dtype=_category_dtype(categories), validate=False),
+                         name=name)
+    if kind == "string":
+        return pd.Series(values, name=name, dtype="str")
+    # Dates UTC sans fuseau explicite : la localisation copierait la colonne mappée
+    return pd.Series(values, name=name, copy=False)
+
+
+def _read_column(directory: str, name: str, meta: dict, n_rows: int, mmap: bool) -> pd.Series:
+    """
+    Relit une colonne écrite par `_write_column`.
+    """
+    values = _read_values(directory, name, meta, n_rows, mmap)
+    return _to_series(name, meta["kind"], values, meta.get("categories"))
+
+
+def _column_stats(kind: str, values: np.ndarray) -> Optional[dict]:
+    """
+    Statistiques d'une colonne numérique ou de dates (lignes non supprimées) :
+    min, max, somme et nombre de valeurs non nulles.
+    """
+    if kind == "float32":
+        valid = values[~np.isnan(values)]
+        if not len(valid):
+            return {"count": 0}
+        return {"min": float(valid.min()), "max": float(valid.max()),
+                "sum": float(valid.sum(dtype=np.float64)), "count": int(len(valid))}
+    if kind == "datetime":
+        valid = values[~np.isnat(values)]
+        if not len(valid):
+            return {"count": 0}
+        return {"min": str(valid.min()), "max": str(valid.max()), "count": int(len(valid))}
+    return None
+
+
+def _segment_stats(path: str, segment: dict, deleted: Optional[np.ndarray] = None) -> None:
+    """
+    (Re)calcule les statistiques des colonnes d'un segment, hors lignes supprimées.
+    """
+    directory = os.path.join(path, segment["name"])
+    for name, meta in segment["columns"].items():
+        if meta["kind"] not in ("float32", "datetime"):
+            continue
+        values = np.load(_column_base(directory, name, meta) + ".npy", mmap_mode="r")
+        if deleted is not None:
+            values = values[~deleted]
+        meta["stats"] = _column_stats(meta["kind"], np.asarray(values))
+
+
+def _write_segment(path: str, name: str, df: pd.DataFrame, kinds: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Écrit un segment (un fichier par colonne) dans `path/name`.
+    Args:
+        kinds: Types de stockage imposés pour certaines colonnes (sinon SCHEMA).
+    Returns:
+        Description du segment pour le manifeste, avec les statistiques des colonnes.
+    """
+    directory = os.path.join(path, name)
+    os.makedirs(directory)
+    kinds = kinds or {}
+    columns = {
+        col: _write_column(directory, col, kinds.get(col) or _column_kind(col, df[col]), df[col])
+        for col in df.columns
+    }
+    segment = {"name": name, "n_rows": len(df), "columns": columns, "deleted": None, "n_deleted": 0}
+    _segment_stats(path, segment)
+    return segment
+
+
+def _save_manifest(path: str, manifest: dict) -> None:
+    """
+    Écrit le manifeste de manière atomique : c'est le point de validation de
+    toute modification du store, les lecteurs ne voient que les segments qu'il liste.
+    """
+    tmp_path = os.path.join(path, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_NAME))
+
+
+def _bucket_labels(edges: List[float]) -> List[str]:
+    """
+    Libellés des tranches de magnitude délimitées par `edges` (ex. lt4.0, 4.0-5.0, ge6.0).
+    """
+    if not edges:
+        return ["all"]
+    return ([f"lt{edges[0]:.1f}"]
+            + [f"{low:.1f}-{high:.1f}" for low, high in zip(edges[:-1], edges[1:])]
+            + [f"ge{edges[-1]:.1f}"])
+
+
+def partition_labels(df: pd.DataFrame, partitioning: Dict[str, object]) -> np.ndarray:
+    """
+    Partition de chaque ligne : "AAAA/tranche" (ex. "2024/4.0-5.0"), ou
+    "AAAA-MM/tranche" pour un store partitionné par mois (`period` "M", valeur
+    par défaut des stores écrits avant l'ajout de `period`).
+
+    :param df: Lignes à répartir
+    :param partitioning: Colonnes de date et de magnitude, période, bornes des tranches
+    :return: Tableau de libellés aligné sur `df`
+    """
+    period = partitioning.get("period", "M")
+    periods = _to_datetime64(df[partitioning["time"]]).astype(f"datetime64[{period}]").astype(str)
+    edges = list(partitioning.get("mag_edges") or [])
+    mags = df[partitioning["mag"]].to_numpy(dtype=np.float64)
+    buckets = np.asarray(_bucket_labels(edges))[np.searchsorted(edges, mags, side="right")]
+    return np.char.add(np.char.add(periods.astype(str), "/"), buckets)
+
+
+def _write_segments(path: str, manifest: dict, df: pd.DataFrame,
+                    kinds: Optional[Dict[str, str]] = None) -> List[dict]:
+    """
+    Écrit des lignes en nouveaux segments (un par partition si le store est
+    partitionné) et avance le compteur de segments du manifeste.
+    """
+    partitioning = manifest.get("partitioning")
+    if partitioning and len(df):
+        labels = partition_labels(df, partitioning)
+        order = np.argsort(labels, kind="stable")
+        groups, starts = np.unique(labels[order], return_index=True)
+        parts = zip(groups.tolist(), np.split(order, starts[1:]))
+    else:
+        parts = [(None, None)]
+    segments = []
+    for partition, rows in parts:
+        name = f"seg-{manifest['next_segment']:06d}"
+        if partition is not None:
+            name = f"{partition}/{name}"
+        part = df if rows is None else df.iloc[rows]
+        segment = _write_segment(path, name, part, kinds)
+        segment["partition"] = partition
+        segments.append(segment)
+        manifest["next_segment"] += 1
+    return segments
+
+
+def write_store(df: pd.DataFrame, path: str, kinds: Optional[Dict[str, str]] = None,
+                partitioning: Optional[Dict[str, object]] = None) -> None:
+    """
+    Écrit un DataFrame sous forme de store colonnaire : un fichier NumPy par
+    colonne (lisible en mémoire mappée) et un manifeste JSON décrivant le schéma.
+    Le store est construit dans un répertoire temporaire puis substitué à
+    l'ancien, de sorte qu'un lecteur ne voit jamais un store à moitié écrit.
+
+    Avec `partitioning` (ex. CATALOG_PARTITIONING), les lignes sont réparties
+    en segments par année (ou mois) et tranche de magnitude ; sinon l'ordre des lignes
+    est conservé dans un segment unique.
+
+    :param df: Données nettoyées à écrire
+    :param path: Répertoire du store
+    :param kinds: Types de stockage imposés pour certaines colonnes (ex. {'place': 'category'})
+    :param partitioning: Partitionnement du store (aucun par défaut)
+    :return: None
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    manifest = {
+        "version": STORE_VERSION,
+        "columns": {},
+        "segments": [],
+        "next_segment": 0,
+        "generation": 0,
+        "partitioning": partitioning,
+        "retired": [],
+    }
+    manifest["segments"] = _write_segments(tmp_path, manifest, df, kinds)
+    manifest["columns"] = {name: meta["kind"] for name, meta in manifest["segments"][0]["columns"].items()}
+    _save_manifest(tmp_path, manifest)
+
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def store_exists(path: str) -> bool:
+    """
+    Indique si un store colonnaire au format courant existe dans `path`.
+    """
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.isfile(manifest_path):
+        return False
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f).get("version") == STORE_VERSION
+
+
+def read_manifest(path: str) -> dict:
+    """
+    Lit le manifeste d'un store colonnaire.
+    """
+    with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != STORE_VERSION:
+        raise ValueError(f"Version de store non supportée : {manifest.get('version')}")
+    return manifest
+
+
+def _read_segment(path: str, segment: dict, columns: List[str], mmap: bool) -> pd.DataFrame:
+    """
+    Lit les colonnes demandées d'un segment, sans ses lignes supprimées.
+    """
+    return _read_segments(path, [segment], columns, mmap)
+
+
+def _kept_rows(path: str, segment: dict, mask: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Lignes conservées d'un segment : ni supprimées, ni écartées par `mask`
+    (None si toutes le sont).
+    """
+    keep = mask
+    if segment["deleted"]:
+        live = ~np.load(os.path.join(path, segment["name"], segment["deleted"]))
+        keep = live if keep is None else keep & live
+    return keep
+
+
+def _read_segments(path: str, segments: List[dict], columns: List[str], mmap: bool,
+                   masks: Optional[List[Optional[np.ndarray]]] = None) -> pd.DataFrame:
+    """
+    Lit les colonnes demandées d'une liste de segments, sans leurs lignes
+    supprimées (ni celles écartées par `masks`, un masque par segment), et les
+    concatène colonne par colonne : les tableaux NumPy des segments sont mis
+    bout à bout avant de construire une seule colonne, les codes des colonnes
+    catégorielles étant renumérotés dans l'union de leurs catégories. Un
+    segment lu en entier garde ses colonnes mappées (sans copie).
+    """
+    keeps = [_kept_rows(path, seg, masks[i] if masks else None) for i, seg in enumerate(segments)]
+    data = {}
+    for name in columns:
+        metas = [seg["columns"][name] for seg in segments]
+        parts = []
+        for segment, meta, keep in zip(segments, metas, keeps):
+            values = _read_values(os.path.join(path, segment["name"]), name, meta, segment["n_rows"], mmap)
+            parts.append(values if keep is None else values[keep])
+        kind = metas[0]["kind"]
+        if len(parts) == 1:
+            data[name] = _to_series(name, kind, parts[0], metas[0].get("categories"))
+        elif kind == "category":
+            categories = pd.unique(np.concatenate(
+                [np.asarray(meta["categories"], dtype=object) for meta in metas]
+            )).tolist()
+            union = pd.Index(categories, dtype=str)
+            code_dtype = _code_dtype(len(categories))
+            codes = []
+            for meta, part in zip(metas, parts):
+                # Code de chaque catégorie du segment dans l'union ; le dernier
+                # élément (-1) sert aux valeurs nulles (code -1)
+                mapping = np.append(union.get_indexer(pd.Index(meta["categories"], dtype=str)), -1)
+                codes.append(mapping.astype(code_dtype)[part])
+            data[name] = _to_series(name, kind, np.concatenate(codes), categories)
+        else:
+            data[name] = _to_series(name, kind, np.concatenate(parts))
+    return pd.DataFrame(data, columns=columns, copy=False)
+
+
+def read_store(path: str, columns: Optional[List[str]] = None, mmap: bool = True) -> pd.DataFrame:
+    """
+    Lit un store colonnaire en ne chargeant que les colonnes demandées.
+
+    :param path: Répertoire du store
+    :param columns: Colonnes à charger (toutes si None)
+    :param mmap: Mappe les colonnes numériques en mémoire au lieu de les copier
+    :return: DataFrame typé (float32, datetime64 en UTC sans fuseau, category)
+    """
+    manifest = read_manifest(path)
+    available = manifest["columns"]
+    if columns is None:
+        columns = list(available)
+    missing = [c for c in columns if c not in available]
+    if missing:
+        raise KeyError(f"Colonnes absentes du store : {missing}")
+    return _read_segments(path, manifest["segments"], columns, mmap)
+
+
+def _merge_statistics(segments: List[dict]) -> dict:
+    """
+    Cumule les statistiques de colonnes d'une liste de segments.
+    """
+    columns: Dict[str, dict] = {}
+    n_rows = 0
+    for segment in segments:
+        n_rows += segment["n_rows"] - segment["n_deleted"]
+        for name, meta in segment["columns"].items():
+            stats = meta.get("stats")
+            if not stats or not stats["count"]:
+                continue
+            total = columns.setdefault(name, {"count": 0})
+            total["count"] += stats["count"]
+            total["min"] = min(total.get("min", stats["min"]), stats["min"])
+            total["max"] = max(total.get("max", stats["max"]), stats["max"])
+            if "sum" in stats:
+                total["sum"] = total.get("sum", 0.0) + stats["sum"]
+    return {"n_rows": n_rows, "columns": columns}
+
+
+def store_statistics(path: str, mag_range: Optional[Range] = None, time_range: Optional[Range] = None,
+                     bbox: Optional[BBox] = None) -> dict:
+    """
+    Statistiques globales du store, calculées à partir du seul manifeste
+    (aucune colonne n'est lue) : nombre de lignes et, pour chaque colonne
+    numérique ou de dates, min, max, somme et nombre de valeurs.
+
+    Avec des filtres (voir `query_store`), seules les partitions susceptibles
+    de les satisfaire sont cumulées : les valeurs sont alors des majorants.
+
+    :param path: Répertoire du store
+    :return: {'n_rows': int, 'columns': {nom: {'min', 'max', 'sum', 'count'}}}
+    """
+    manifest = read_manifest(path)
+    return _merge_statistics([
+        seg for seg in manifest["segments"]
+        if _segment_may_match(seg, manifest, mag_range, time_range, bbox)
+    ])
+
+
+def refresh_statistics(path: str) -> None:
+    """
+    Calcule les statistiques manquantes des segments (store écrit avant leur
+    ajout) et les enregistre dans le manifeste ; seules les colonnes numériques
+    et de dates de ces segments sont lues.
+    """
+    manifest = read_manifest(path)
+    stale = [
+        segment for segment in manifest["segments"]
+        if any(meta["kind"] in ("float32", "datetime") and "stats" not in meta
+               for meta in segment["columns"].values())
+    ]
+    if not stale:
+        return
+    for segment in stale:
+        directory = os.path.join(path, segment["name"])
+        deleted = np.load(os.path.join(directory, segment["deleted"])) if segment["deleted"] else None
+        _segment_stats(path, segment, deleted)
+    _save_manifest(path, manifest)
+
+
+def partition_statistics(path: str) -> Dict[str, dict]:
+    """
+    Statistiques de chaque partition d'un store partitionné (mêmes clés que
+    `store_statistics`), lues dans le manifeste.
+
+    :param path: Répertoire du store
+    :return: {partition: statistiques}, trié par partition
+    """
+    manifest = read_manifest(path)
+    partitions: Dict[str, List[dict]] = {}
+    for segment in manifest["segments"]:
+        partitions.setdefault(segment.get("partition") or "", []).append(segment)
+    return {name: _merge_statistics(partitions[name]) for name in sorted(partitions)}
+
+
+def _overlaps(stats: Optional[dict], low, high) -> bool:
+    """
+    Indique si l'intervalle [min, max] d'une colonne peut croiser [low, high]
+    (bornes None : ouvertes). Sans statistiques, le segment est conservé.
+    """
+    if not stats:
+        return True
+    if not stats["count"]:
+        return False
+    return (low is None or stats["max"] >= low) and (high is None or stats["min"] <= high)
+
+
+def _segment_may_match(segment: dict, manifest: dict, mag_range: Optional[Range],
+                       time_range: Optional[Range], bbox: Optional[BBox]) -> bool:
+    """
+    Élagage d'un segment à partir des statistiques min/max de ses colonnes.
+    """
+    columns = segment["columns"]
+    partitioning = manifest.get("partitioning") or CATALOG_PARTITIONING
+    if mag_range is not None:
+        stats = columns.get(partitioning["mag"], {}).get("stats")
+        if not _overlaps(stats, *mag_range):
+            return False
+    if time_range is not None:
+        stats = columns.get(partitioning["time"], {}).get("stats")
+        # Dates ISO de même format : la comparaison de chaînes suit l'ordre chronologique
+        start, end = (None if t is None else str(np.datetime64(t, "ns")) for t in time_range)
+        if not _overlaps(stats, start, end):
+            return False
+    if bbox is not None:
+        west, south, east, north = bbox
+        if not _overlaps(columns.get("latitude", {}).get("stats"), south, north):
+            return False
+        lon_stats = columns.get("longitude", {}).get("stats")
+        if west <= east:
+            return _overlaps(lon_stats, west, east)
+        # Emprise à cheval sur l'antiméridien
+        return _overlaps(lon_stats, west, None) or _overlaps(lon_stats, None, east)
+    return True
+
+
+def _row_mask(path: str, segment: dict, partitioning: dict, mag_range: Optional[Range],
+              time_range: Optional[Range], bbox: Optional[BBox]) -> Optional[np.ndarray]:
+    """
+    Lignes d'un segment (supprimées comprises) qui satisfont les filtres de
+    `query_store`, lues sur les seules colonnes filtrées ; None si toutes les
+    satisfont.
+    """
+    directory = os.path.join(path, segment["name"])
+
+    def values(name: str) -> np.ndarray:
+        return np.load(_column_base(directory, name, segment["columns"][name]) + ".npy", mmap_mode="r")
+
+    mask = np.ones(segment["n_rows"], dtype=bool)
+    if mag_range is not None:
+        mags = values(partitioning["mag"])
+        low, high = mag_range
+        if low is not None:
+            mask &= mags >= np.asarray(low, dtype=mags.dtype)
+        if high is not None:
+            mask &= mags <= np.asarray(high, dtype=mags.dtype)
+    if time_range is not None:
+        times = values(partitioning["time"])
+        start, end = time_range
+        if start is not None:
+            mask &= times >= np.datetime64(start, "ns")
+        if end is not None:
+            mask &= times < np.datetime64(end, "ns")
+    if bbox is not None:
+        west, south, east, north = bbox
+        lat = values("latitude")
+        lon = values("longitude")
+        mask &= (lat >= south) & (lat <= north)
+        if west <= east:
+            mask &= (lon >= west) & (lon <= east)
+        else:
+            mask &= (lon >= west) | (lon <= east)
+    return None if mask.all() else mask
+
+
+def query_store(path: str, columns: Optional[List[str]] = None, mag_range: Optional[Range] = None,
+                time_range: Optional[Range] = None, bbox: Optional[BBox] = None,
+                mmap: bool = True) -> pd.DataFrame:
+    """
+    Lit les lignes d'un store qui satisfont des filtres, en ne lisant que les
+    segments (partitions) dont les statistiques min/max peuvent les satisfaire
+    et que les colonnes demandées ou filtrées.
+
+    :param path: Répertoire du store
+    :param columns: Colonnes à charger (toutes si None)
+    :param mag_range: Magnitudes [min, max] (bornes incluses, None : ouverte)
+    :param time_range: Dates [début, fin) (datetime64 ou ISO, None : ouverte)
+    :param bbox: Emprise (ouest, sud, est, nord) en degrés ; ouest > est si
+        elle traverse l'antiméridien
+    :param mmap: Mappe les colonnes numériques en mémoire au lieu de les copier
+    :return: DataFrame typé, comme `read_store`
+    """
+    manifest = read_manifest(path)
+    available = manifest["columns"]
+    if columns is None:
+        columns = list(available)
+    partitioning = manifest.get("partitioning") or CATALOG_PARTITIONING
+    filtered = ([partitioning["mag"]] if mag_range is not None else []) \
+        + ([partitioning["time"]] if time_range is not None else []) \
+        + (["latitude", "longitude"] if bbox is not None else [])
+    needed = columns + [c for c in dict.fromkeys(filtered) if c not in columns]
+    missing = [c for c in needed if c not in available]
+    if missing:
+        raise KeyError(f"Colonnes absentes du store : {missing}")
+
+    segments = [
+        seg for seg in manifest["segments"]
+        if _segment_may_match(seg, manifest, mag_range, time_range, bbox)
+    ]
+    if not segments:
+        return _read_segment(path, manifest["segments"][0], columns, mmap).iloc[:0]
+    masks = [_row_mask(path, seg, partitioning, mag_range, time_range, bbox) for seg in segments]
+    return _read_segments(path, segments, columns, mmap, masks)
+
+
+def latest_revisions(df: pd.DataFrame, key: str = "id", version: str = "updated") -> pd.DataFrame:
+    """
+    Ne conserve que la révision la plus récente de chaque événement.
+    Args:
+        df: Lignes éventuellement dupliquées sur `key`.
+        key: Colonne identifiant un événement.
+        version: Colonne ordonnant les révisions (la plus grande l'emporte).
+    Returns:
+        Une ligne par valeur de `key`.
+    """
+    if df[key].is_unique:
+        return df
+    return df.sort_values(version, kind="stable").drop_duplicates(key, keep="last")
+
+
+def _segment_keys(path: str, manifest: dict, key: str, version: str) -> pd.DataFrame:
+    """
+    Liste les lignes vivantes du store : clé, version, segment et position.
+    """
+    frames = []
+    for i, segment in enumerate(manifest["segments"]):
+        directory = os.path.join(path, segment["name"])
+        frame = pd.DataFrame({
+            key: _read_column(directory, key, segment["columns"][key], segment["n_rows"], True),
+            version: _read_column(directory, version, segment["columns"][version], segment["n_rows"], True),
+            "_segment": i,
+            "_row": np.arange(segment["n_rows"]),
+        })
+        if segment["deleted"]:
+            frame = frame[~np.load(os.path.join(directory, segment["deleted"]))]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def store_keys(path: str, key: str = "id", version: str = "updated") -> pd.DataFrame:
+    """
+    Lignes vivantes du store indexées par `key` : version, segment et position.
+    Peut être passé à `upsert`, `update_columns` ou `read_keyed_rows` (paramètre
+    `existing`) tant que les lignes du store n'ont pas changé entre-temps
+    (`update_columns` ne les déplace pas), pour ne lire les clés qu'une fois.
+    """
+    return _segment_keys(path, read_manifest(path), key, version).set_index(key)
+
+
+def read_keyed_rows(path: str, existing: pd.DataFrame, keys, columns: List[str]) -> pd.DataFrame:
+    """
+    Lit quelques lignes vivantes du store désignées par leur clé, à leurs
+    positions (`existing`, voir `store_keys`), dans leurs seuls segments.
+
+    :param path: Répertoire du store
+    :param existing: Clés du store lues par `store_keys`
+    :param keys: Clés recherchées (celles absentes du store sont ignorées)
+    :param columns: Colonnes à lire
+    :return: DataFrame indexé par clé
+    """
+    manifest = read_manifest(path)
+    matched = existing[existing.index.isin(keys)]
+    frames = []
+    for seg_index, rows in matched.groupby("_segment")["_row"]:
+        segment = manifest["segments"][int(seg_index)]
+        directory = os.path.join(path, segment["name"])
+        positions = rows.to_numpy(dtype=np.int64)
+        frames.append(pd.DataFrame({
+            name: _read_column(directory, name, segment["columns"][name], segment["n_rows"], True)
+            .iloc[positions].to_numpy()
+            for name in columns
+        }, index=rows.index))
+    if not frames:
+        return pd.DataFrame(columns=columns, index=matched.index)
+    return pd.concat(frames)
+
+
+def upsert(path: str, df: pd.DataFrame, key: str = "id", version: str = "updated",
+           partitioning: Optional[Dict[str, object]] = None,
+           existing: Optional[pd.DataFrame] = None) -> Tuple[int, int]:
+    """
+    Fusionne des lignes dans un store existant sans le réécrire : les nouveaux
+    événements et les nouvelles révisions sont ajoutés dans un segment (un par
+    partition touchée), les révisions remplacées sont marquées supprimées.
+    Seule une version strictement plus récente (`version`) remplace une ligne existante.
+
+    :param path: Répertoire du store (créé s'il n'existe pas)
+    :param df: Lignes à fusionner
+    :param key: Colonne identifiant un événement
+    :param version: Colonne de date de révision
+    :param partitioning: Partitionnement du store s'il doit être créé
+    :param existing: Clés du store déjà lues par `store_keys` (relues sinon)
+    :return: (nombre d'événements ajoutés, nombre d'événements mis à jour)
+    """
+    df = latest_revisions(df, key, version)
+    if not store_exists(path):
+        write_store(df.reset_index(drop=True), path, partitioning=partitioning)
+        return len(df), 0
+    if df.empty:
+        return 0, 0
+
+    manifest = read_manifest(path)
+    if existing is None:
+        existing = _segment_keys(path, manifest, key, version).set_index(key)
+    incoming_version = pd.to_datetime(df[version], utc=True, format="ISO8601").dt.tz_localize(None)
+    matched = existing.reindex(df[key])
+    is_new = matched["_segment"].isna().to_numpy()
+    current_version = matched[version]
+    is_newer = (incoming_version.to_numpy() > current_version.to_numpy()) & ~is_new
+    df = df[is_new | is_newer]
+    if df.empty:
+        return 0, 0
+
+    # Marquage des révisions remplacées, segment par segment
+    replaced = matched[is_newer]
+    generation = manifest["generation"] + 1
+    for seg_index, rows in replaced.groupby("_segment")["_row"]:
+        segment = manifest["segments"][int(seg_index)]
+        directory = os.path.join(path, segment["name"])
+        deleted = (
+            np.load(os.path.join(directory, segment["deleted"]))
+            if segment["deleted"] else np.zeros(segment["n_rows"], dtype=bool)
+        )
+        deleted[rows.to_numpy(dtype=np.int64)] = True
+        segment["deleted"] = f"_deleted-{generation}.npy"
+        segment["n_deleted"] = int(deleted.sum())
+        np.save(os.path.join(directory, segment["deleted"]), deleted)
+        _segment_stats(path, segment, deleted)
+
+    new_segments = _write_segments(path, manifest, df[list(manifest["columns"])], manifest["columns"])
+    manifest["segments"].extend(new_segments)
+    manifest["generation"] = generation
+    _save_manifest(path, manifest)
+    _remove_unreferenced(path, manifest)
+
+    if manifest.get("partitioning"):
+        # Seules les partitions modifiées sont regroupées, le reste du store est intact
+        for partition in {seg["partition"] for seg in new_segments}:
+            if sum(seg.get("partition") == partition for seg in manifest["segments"]) > MAX_PARTITION_SEGMENTS:
+                compact_partition(path, partition)
+    elif len(manifest["segments"]) > MAX_SEGMENTS:
+        compact_store(path)
+    return int(is_new.sum()), int(is_newer.sum())
+
+
+def _remove_unreferenced(path: str, manifest: dict) -> None:
+    """
+    Supprime les fichiers de suppression et les segments retirés de plus d'une
+    génération : ceux de la génération précédente restent lisibles par un
+    lecteur ayant chargé l'ancien manifeste.
+    """
+    for segment in manifest["segments"]:
+        directory = os.path.join(path, segment["name"])
+        for filename in os.listdir(directory):
+            if not filename.startswith("_deleted-") or filename == segment["deleted"]:
+                continue
+            generation = int(filename[len("_deleted-"):-len(".npy")])
+            if generation < manifest["generation"] - 1:
+                os.remove(os.path.join(directory, filename))
+    retired = manifest.get("retired") or []
+    expired = [r for r in retired if r["generation"] < manifest["generation"] - 1]
+    if expired:
+        for r in expired:
+            # Segment regroupé (répertoire) ou version remplacée d'une colonne (fichier)
+            target = os.path.join(path, r["name"])
+            if os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            elif os.path.exists(target):
+                os.remove(target)
+        manifest["retired"] = [r for r in retired if r not in expired]
+        _save_manifest(path, manifest)
+
+
+def update_columns(path: str, values: pd.DataFrame, key: str = "id",
+                   existing: Optional[pd.DataFrame] = None) -> int:
+    """
+    Remplace, pour quelques lignes désignées par leur clé, les valeurs de
+    colonnes existantes du store, sans toucher aux autres colonnes ni aux
+    positions des lignes : dans chaque segment concerné, seules les colonnes
+    mises à jour sont écrites dans un nouveau fichier, les précédents restant
+    lisibles une génération (comme les segments regroupés). Les clés lues par
+    `store_keys` restent donc valables après l'appel. Les colonnes de chaînes
+    ('string') ne peuvent pas être mises à jour.
+
+    :param path: Répertoire du store
+    :param values: Colonne `key` et nouvelles valeurs des seules lignes modifiées
+    :param key: Colonne identifiant un événement
+    :param existing: Clés du store lues par `store_keys` (relues si None)
+    :return: Nombre de segments modifiés
+    """
+    manifest = read_manifest(path)
+    names = [c for c in values.columns if c != key]
+    missing = [c for c in names if c not in manifest["columns"]]
+    if missing:
+        raise KeyError(f"Colonnes absentes du store : {missing}")
+    unsupported = [c for c in names if manifest["columns"][c] == "string"]
+    if unsupported:
+        raise ValueError(f"Colonnes de chaînes non modifiables : {unsupported}")
+    if values.empty:
+        return 0
+    if existing is None:
+        existing = _segment_keys(path, manifest, key, "updated").set_index(key)
+    matched = existing.reindex(values[key])
+    if matched["_segment"].isna().any():
+        absent = values[key][matched["_segment"].isna().to_numpy()].tolist()
+        raise KeyError(f"Clés absentes du store : {absent[:5]}")
+
+    generation = manifest["generation"] + 1
+    retired = []
+    segment_of = matched["_segment"].to_numpy(dtype=np.int64)
+    row_of = matched["_row"].to_numpy(dtype=np.int64)
+    for seg_index in np.unique(segment_of):
+        segment = manifest["segments"][int(seg_index)]
+        directory = os.path.join(path, segment["name"])
+        selected = segment_of == seg_index
+        for name in names:
+            meta = segment["columns"][name]
+            column = _read_column(directory, name, meta, segment["n_rows"], mmap=False)
+            if meta["kind"] == "category":
+                # Les nouvelles valeurs peuvent sortir des catégories du segment
+                column = column.astype(object)
+            column.iloc[row_of[selected]] = values[name].to_numpy()[selected]
+            filename = f"{name}-{generation}"
+            segment["columns"][name] = {**_write_column(directory, filename, meta["kind"], column),
+                                        "file": filename}
+            retired.append({"name": f"{segment['name']}/{meta.get('file', name)}.npy",
+                            "generation": generation})
+        if any(manifest["columns"][name] in ("float32", "datetime") for name in names):
+            deleted = np.load(os.path.join(directory, segment["deleted"])) if segment["deleted"] else None
+            _segment_stats(path, segment, deleted)
+
+    manifest["retired"] = (manifest.get("retired") or []) + retired
+    manifest["generation"] = generation
+    _save_manifest(path, manifest)
+    _remove_unreferenced(path, manifest)
+    return len(np.unique(segment_of))
+
+
+def compact_partition(path: str, partition: str) -> None:
+    """
+    Regroupe les segments d'une partition en un seul segment sans lignes supprimées.
+    """
+    manifest = read_manifest(path)
+    old = [seg for seg in manifest["segments"] if seg.get("partition") == partition]
+    if len(old) < 2:
+        return
+    columns = list(manifest["columns"])
+    df = _read_segments(path, old, columns, mmap=False)
+    generation = manifest["generation"] + 1
+    merged = _write_segments(path, manifest, df, manifest["columns"]) if len(df) else []
+    manifest["segments"] = [seg for seg in manifest["segments"] if seg not in old] + merged
+    manifest["retired"] = (manifest.get("retired") or []) + [
+        {"name": seg["name"], "generation": generation} for seg in old
+    ]
+    manifest["generation"] = generation
+    _save_manifest(path, manifest)
+    _remove_unreferenced(path, manifest)
+
+
+def compact_store(path: str, partitioning: Optional[Dict[str, object]] = None) -> None:
+    """
+    Réécrit le store sans lignes supprimées, avec un segment par partition.
+
+    :param path: Répertoire du store
+    :param partitioning: Nouveau partitionnement (celui du store par défaut)
+    :return: None
+    """
+    manifest = read_manifest(path)
+    write_store(read_store(path, mmap=False), path, kinds=manifest["columns"],
+                partitioning=partitioning or manifest.get("partitioning"))
@@ -1,21 +1,32 @@
+import os
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from geopy.distance import distance as geopy_distance
-from typing import List, Tuple,Any, Union
+from typing import List, Optional, Tuple,Any, Union
+from src.utils import column_store
+from src.utils.clean_data import CLEAN_DATA_PATH, CLEAN_STORE_PATH
+from src.utils.spatial import EARTH_RADIUS_KM
+from src.utils.tectonics import FaultLayer
 
-def create_magnitude_histogram(df: pd.DataFrame) -> go.Figure:
+def create_magnitude_histogram(bin_edges: np.ndarray, counts: np.ndarray, bin_width: float = 0.1) -> go.Figure:
     """
-    Crée un histogramme des magnitudes des séismes.
+    Crée un histogramme des magnitudes des séismes à partir de comptes pré-agrégés.
+    Seuls les comptes par classe sont envoyés au navigateur, pas chaque magnitude.
     Args:
-        df: DataFrame contenant une colonne 'mag' pour les magnitudes.
+        bin_edges: Bornes gauches des classes de magnitude.
+        counts: Nombre d'événements par classe.
+        bin_width: Largeur des classes.
     Returns:
         Un objet `go.Figure` représentant l'histogramme.
     """
     fig = go.Figure()
-    fig.add_trace(go.Histogram(
-        x=df['mag'],
+    fig.add_trace(go.Bar(
+        x=np.round(bin_edges.astype(float) + bin_width / 2, 3),
+        y=counts,
+        width=bin_width,
         marker_color='#3498db',
-        opacity=0.75
+        opacity=0.75,
+        hovertemplate="Magnitude: %{x:.2f} ± " + f"{bin_width / 2:g}" + "<br>Nombre: %{y}<extra></extra>"
     ))
     fig.update_layout(
         title="Distribution des Magnitudes",
@@ -23,7 +34,8 @@ def create_magnitude_histogram(df: pd.DataFrame) -> go.Figure:
         yaxis_title="Nombre d'événements",
         template="plotly_white",
         font=dict(family="Montserrat, Arial, sans-serif", size=14),
-        margin=dict(l=40, r=40, t=40, b=40)
+        margin=dict(l=40, r=40, t=40, b=40),
+        bargap=0
     )
     return fig
 
@@ -77,13 +89,33 @@ def create_earthquake_map(df: pd.DataFrame, map_style: str = 'open-street-map')
     )
     return fig
 
-def load_clean_data() -> pd.DataFrame:
+def ensure_store(store_path: str = CLEAN_STORE_PATH) -> None:
     """
-    Charge les données nettoyées depuis un fichier CSV.
+    Construit une fois le store colonnaire à partir du CSV nettoyé s'il n'existe pas encore.
+    """
+    if not column_store.store_exists(store_path):
+        csv_df = pd.read_csv(CLEAN_DATA_PATH)
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        column_store.write_store(csv_df, store_path, partitioning=column_store.CATALOG_PARTITIONING)
+
+def load_clean_data(columns: Optional[List[str]] = None, store_path: str = CLEAN_STORE_PATH,
+                    mag_range: Optional[tuple] = None, time_range: Optional[tuple] = None,
+                    bbox: Optional[tuple] = None) -> pd.DataFrame:
+    """
+    Charge les données nettoyées depuis le store colonnaire typé.
+    Si le store n'existe pas encore, il est construit une fois à partir du CSV nettoyé.
+    Args:
+        columns: Colonnes à charger (toutes si None). Seules ces colonnes sont lues sur disque.
+        store_path: Répertoire du store colonnaire.
+        mag_range: Magnitudes (min, max) à charger, bornes None ouvertes.
+        time_range: Dates [début, fin) à charger, bornes None ouvertes.
+        bbox: Emprise (ouest, sud, est, nord) à charger.
     Returns:
-        DataFrame contenant les données nettoyées.
+        DataFrame contenant les données nettoyées ; seules les partitions qui
+        peuvent satisfaire les filtres sont lues.
     """
-    return pd.read_csv('data/cleaned/earthquake_data_cleaned.csv')
+    ensure_store(store_path)
+    return column_store.query_store(store_path, columns, mag_range, time_range, bbox)
 
 def create_hover_circle(lat: float, lon: float, radius: float) -> go.Scattermapbox:
     """
@@ -104,12 +136,58 @@ def create_hover_circle(lat: float, lon: float, radius: float) -> go.Scattermapb
         name="Zone ressentie"
     )
 
-def create_globe_figure(df_filtered: pd.DataFrame, globe_style: str = 'open-street-map') -> go.Figure:
+# Palette des séquences de répliques (coloration « par séquence ») ; les événements isolés sont en gris
+SEQUENCE_COLORS = ['#e74c3c', '#3498db', '#2ecc71', '#9b59b6', '#f1c40f',
+                   '#e67e22', '#1abc9c', '#ff66cc', '#95a5a6', '#c0392b']
+ISOLATED_COLOR = '#7f8c8d'
+
+
+def sequence_marker(cluster_id: Optional[np.ndarray], mainshock: Optional[np.ndarray], color_mode: str,
+                    size: int, color: str, opacity: float) -> dict:
+    """
+    Style des marqueurs selon la coloration choisie : uniforme, choc principal /
+    réplique, ou une couleur par séquence. Les couleurs sont des valeurs
+    numériques associées à une échelle (tableaux compacts, voir `encode_figure`).
+    Args:
+        cluster_id: Identifiant de séquence de chaque point (NO_CLUSTER : isolé).
+        mainshock: Masque des chocs principaux de chaque point.
+        color_mode: 'uniform', 'mainshock' ou 'sequence'.
+        size: Taille des marqueurs.
+        color: Couleur de la coloration uniforme.
+        opacity: Opacité des marqueurs.
+    Returns:
+        Dictionnaire `marker` d'une trace Plotly.
+    """
+    if color_mode == 'mainshock' and mainshock is not None:
+        return dict(size=size, opacity=opacity, color=np.asarray(mainshock, dtype=np.uint8),
+                    colorscale=[[0, '#f1c40f'], [1, color]], cmin=0, cmax=1)
+    if color_mode == 'sequence' and cluster_id is not None:
+        cluster_id = np.asarray(cluster_id)
+        # Une couleur par séquence, -1 pour les événements isolés ; les identifiants
+        # (codes consécutifs) sont mélangés avant le modulo pour que deux séquences
+        # voisines dans la liste n'aient pas des couleurs voisines
+        mixed = (cluster_id.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(40)
+        values = np.where(cluster_id < 0, -1, mixed % np.uint64(len(SEQUENCE_COLORS))).astype(np.int8)
+        colors = [ISOLATED_COLOR, *SEQUENCE_COLORS]
+        colorscale = [
+            [bound / len(colors), c] for i, c in enumerate(colors) for bound in (i, i + 1)
+        ]
+        return dict(size=size, opacity=opacity, color=values,
+                    colorscale=colorscale, cmin=-1.5, cmax=len(SEQUENCE_COLORS) - 0.5)
+    return dict(size=size, color=color, opacity=opacity)
+
+
+def create_globe_figure(df_filtered: pd.DataFrame, globe_style: str = 'open-street-map',
+                        marker: Optional[dict] = None) -> go.Figure:
     """
     Crée un globe (projection orthographique) avec les séismes.
+    Chaque point porte en `customdata` l'index de sa ligne dans `df_filtered`,
+    ce qui permet de retrouver l'événement survolé sans recherche ; seuls des
+    tableaux numériques sont envoyés (le lieu est affiché à la demande, au survol).
     Args:
-        df_filtered: DataFrame contenant les colonnes 'latitude', 'longitude', 'place', et 'mag'.
+        df_filtered: DataFrame contenant les colonnes 'latitude', 'longitude' et 'mag'.
         globe_style: Style du globe.
+        marker: Style des marqueurs (voir `sequence_marker`), points rouges par défaut.
     Returns:
         Un objet `go.Figure` représentant le globe.
     """
@@ -127,11 +205,11 @@ def create_globe_figure(df_filtered: pd.DataFrame, globe_style: str = 'open-stre
         lat=df_filtered['latitude'],
         lon=df_filtered['longitude'],
         mode='markers',
-        marker=dict(size=4, color='red', opacity=0.7),
-        customdata=df_filtered[['place', 'mag']].values,
+        marker=marker or dict(size=4, color='red', opacity=0.7),
+        text=df_filtered['mag'],
+        customdata=df_filtered.index.to_numpy(),
         hovertemplate=(
-            "<b>Lieu:</b> %{customdata[0]}<br>"
-            "<b>Magnitude:</b> %{customdata[1]}<br>"
+            "<b>Magnitude:</b> %{text:.1f}<br>"
             "Latitude: %{lat}<br>"
             "Longitude: %{lon}<extra></extra>"
         ),
@@ -158,7 +236,45 @@ def create_globe_figure(df_filtered: pd.DataFrame, globe_style: str = 'open-stre
     )
     return fig
 
-def create_geodesic_circle(lat_c: float, lon_c: float, radius_km: float, n_points: int = 72) -> List[Tuple[float, float]]:
+def felt_radius_km(mag: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    """
+    Rayon approximatif (km) de la zone ressentie pour une magnitude donnée.
+    Args:
+        mag: Magnitude(s).
+    Returns:
+        Rayon(s) en kilomètres.
+    """
+    return 10 ** (0.5 * np.asarray(mag, dtype=float) + 1)
+
+def create_geodesic_circles(lats: np.ndarray, lons: np.ndarray, radii_km: np.ndarray,
+                            n_points: int = 72) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Construit en une seule opération vectorisée des cercles géodésiques (modèle
+    sphérique) autour de plusieurs points, pour tous les azimuts à la fois.
+    Args:
+        lats: Latitudes des centres.
+        lons: Longitudes des centres.
+        radii_km: Rayons en kilomètres.
+        n_points: Nombre de points par cercle (le premier est répété pour fermer le cercle).
+    Returns:
+        Tableaux (latitudes, longitudes) de forme (nombre de cercles, n_points + 1),
+        longitudes ramenées dans [-180, 180).
+    """
+    lat1 = np.radians(np.asarray(lats, dtype=float))[:, None]
+    lon1 = np.radians(np.asarray(lons, dtype=float))[:, None]
+    delta = (np.asarray(radii_km, dtype=float) / EARTH_RADIUS_KM)[:, None]
+    bearings = np.radians(np.arange(n_points + 1) % n_points * (360 / n_points))[None, :]
+
+    sin_lat2 = np.sin(lat1) * np.cos(delta) + np.cos(lat1) * np.sin(delta) * np.cos(bearings)
+    lat2 = np.arcsin(np.clip(sin_lat2, -1, 1))
+    lon2 = lon1 + np.arctan2(
+        np.sin(bearings) * np.sin(delta) * np.cos(lat1),
+        np.cos(delta) - np.sin(lat1) * sin_lat2
+    )
+    lon2 = (np.degrees(lon2) + 180) % 360 - 180
+    return np.degrees(lat2), lon2
+
+def create_geodesic_circle(lat_c: float, lon_c: float, radius_km: float, n_points: int = 72) -> np.ndarray:
     """
     Construit un polygone formant un cercle géodésique autour d'un point.
     Args:
@@ -167,77 +283,94 @@ def create_geodesic_circle(lat_c: float, lon_c: float, radius_km: float, n_point
         radius_km: Rayon du cercle en kilomètres.
         n_points: Nombre de points à utiliser pour construire le cercle.
     Returns:
-        Liste de tuples (latitude, longitude) représentant le cercle.
+        Tableau (n_points + 1, 2) de (latitude, longitude) représentant le cercle fermé.
     """
-    coords = []
-    step = 360 / n_points
-    for i in range(n_points):
-        bearing = i * step
-        pt = geopy_distance(kilometers=radius_km).destination((lat_c, lon_c), bearing)
-        coords.append((pt.latitude, pt.longitude))
-    if coords:
-        coords.append(coords[0])
-    return coords
+    lats, lons = create_geodesic_circles([lat_c], [lon_c], [radius_km], n_points)
+    return np.column_stack([lats[0], lons[0]])
 
-def split_polygon_at_dateline(coords: List[Tuple[float, float]]) -> List[List[Tuple[float, float]]]:
+def split_polygon_at_dateline(coords: np.ndarray) -> List[np.ndarray]:
     """
     Découpe une liste de points en plusieurs polygones si elle traverse le méridien ±180°.
     Args:
-        coords: Liste de tuples (latitude, longitude) représentant un polygone.
+        coords: Tableau (n, 2) de (latitude, longitude) représentant un polygone.
     Returns:
         Liste de polygones ne traversant pas le méridien ±180°.
     """
-    polygons: list[Any] = []
-    if not coords:
-        return polygons
-    current_poly = [coords[0]]
-    for i in range(1, len(coords)):
-        lat_prev, lon_prev = current_poly[-1]
-        lat_curr, lon_curr = coords[i]
-        if abs(lon_curr - lon_prev) > 180:
-            polygons.append(current_poly[:])
-            current_poly = [(lat_curr, lon_curr)]
-        else:
-            current_poly.append((lat_curr, lon_curr))
-    if current_poly:
-        polygons.append(current_poly)
-    return polygons
-
-def add_fault_lines_mapbox(fig: go.Figure, tectonic_data: dict) -> go.Figure:
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if not len(coords):
+        return []
+    jumps = np.flatnonzero(np.abs(np.diff(coords[:, 1])) > 180) + 1
+    return np.split(coords, jumps)
+
+def felt_zone_polygons(lats: np.ndarray, lons: np.ndarray, mags: np.ndarray,
+                       n_points: int = 72) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Construit les zones ressenties de nombreux séismes en un seul appel, sous
+    forme de tableaux prêts pour une unique trace `Scattergeo` : les polygones
+    sont séparés par des NaN et coupés au méridien ±180°.
+    Args:
+        lats: Latitudes des épicentres.
+        lons: Longitudes des épicentres.
+        mags: Magnitudes (déterminent le rayon de chaque zone).
+        n_points: Nombre de points par cercle.
+    Returns:
+        (latitudes, longitudes) à plat, séparées par des NaN.
+    """
+    circle_lats, circle_lons = create_geodesic_circles(lats, lons, felt_radius_km(mags), n_points)
+    # Une colonne NaN termine chaque cercle ; les sauts de longitude > 180° reçoivent aussi un NaN
+    nan_column = np.full((len(circle_lats), 1), np.nan)
+    flat_lats = np.hstack([circle_lats, nan_column]).ravel()
+    flat_lons = np.hstack([circle_lons, nan_column]).ravel()
+    jumps = np.flatnonzero(np.abs(np.diff(flat_lons)) > 180) + 1
+    return np.insert(flat_lats, jumps, np.nan), np.insert(flat_lons, jumps, np.nan)
+
+def add_fault_lines_mapbox(fig: go.Figure, fault_layer: FaultLayer, zoom: float = 1) -> go.Figure:
     """
     Ajoute des failles tectoniques à une figure Mapbox.
     Args:
         fig: Objet `go.Figure` représentant une carte.
-        tectonic_data: Données GeoJSON des failles tectoniques.
+        fault_layer: Couche des failles tectoniques (tableaux précalculés par niveau de simplification).
+        zoom: Niveau de zoom de la carte, qui détermine le niveau de simplification.
     Returns:
         La figure modifiée avec les failles tectoniques.
     """
-    all_lons = []
-    all_lats = []
-    for feature in tectonic_data["features"]:
-        geometry = feature["geometry"]
-        if geometry["type"] == "LineString":
-            coords = geometry["coordinates"]
-            for c in coords:
-                all_lons.append(c[0])
-                all_lats.append(c[1])
-            all_lons.append(None)
-            all_lats.append(None)
-        elif geometry["type"] == "MultiLineString":
-            for line_coords in geometry["coordinates"]:
-                for c in line_coords:
-                    all_lons.append(c[0])
-                    all_lats.append(c[1])
-                all_lons.append(None)
-                all_lats.append(None)
-    if all_lons and all_lons[-1] is None:
-        all_lons.pop()
-        all_lats.pop()
+    lons, lats = fault_layer.lines_for_zoom(zoom)
     fig.add_trace(go.Scattermapbox(
-        lon=all_lons,
-        lat=all_lats,
+        lon=lons,
+        lat=lats,
         mode="lines",
         line=dict(color="orange", width=2),
         name="Failles tectoniques"
     ))
     return fig
+
+def add_earthquake_clusters_mapbox(fig: go.Figure, cells: pd.DataFrame) -> go.Figure:
+    """
+    Ajoute à une figure Mapbox les séismes agrégés par cellule de grille
+    (affichage dézoomé : un marqueur par cellule au lieu d'un par séisme).
+    Args:
+        fig: Objet `go.Figure` représentant une carte.
+        cells: DataFrame avec les colonnes 'latitude', 'longitude', 'count' et 'max_mag'.
+    Returns:
+        La figure modifiée avec les cellules agrégées.
+    """
+    fig.add_trace(go.Scattermapbox(
+        lat=cells['latitude'],
+        lon=cells['longitude'],
+        mode='markers',
+        marker=dict(
+            size=np.clip(6 + 4 * np.log10(cells['count']), 6, 30),
+            color=cells['max_mag'],
+            colorscale='YlOrRd',
+            cmin=cells['max_mag'].min() if len(cells) else 0,
+            opacity=0.8,
+            colorbar=dict(title="Mag. max", thickness=10)
+        ),
+        customdata=cells[['count', 'max_mag']].values,
+        name="Séismes (agrégés)",
+        hovertemplate=(
+            "%{customdata[0]} séismes<br>"
+            "Magnitude max: %{customdata[1]:.1f}<extra></extra>"
+        )
+    ))
+    return fig
@@ -0,0 +1,631 @@
+import functools
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : pas de verrous de fichiers POSIX, le mode partagé est désactivé
+    fcntl = None
+
+from src.utils import column_store, common_functions
+from src.utils.clean_data import CLEAN_STORE_PATH
+from src.utils.declustering import NO_CLUSTER
+from src.utils.indexes import MagnitudeIndex, TimeIndex
+from src.utils.metrics import callback_metrics
+from src.utils.spatial import GridLOD, NearestEventIndex
+from src.utils.startup import startup_timer
+from src.utils.tectonics import FaultLayer, load_fault_layer
+
+# Colonnes réellement utilisées par le dashboard (projection à la lecture du store)
+DASHBOARD_COLUMNS = ['time', 'latitude', 'longitude', 'depth', 'mag', 'place',
+                     'boundary_distance_km', 'boundary_type', 'cluster_id', 'mainshock']
+# Colonnes calculées par le nettoyage, absentes des stores plus anciens (ignorées si absentes)
+OPTIONAL_COLUMNS = ('boundary_distance_km', 'boundary_type', 'cluster_id', 'mainshock')
+
+# Sous-ensemble du catalogue chargé par le dashboard (tout le catalogue par défaut) :
+# magnitude minimale et date de début (ISO), seules les partitions utiles sont lues
+MIN_MAGNITUDE_ENV = 'EARTHQUAKE_MIN_MAGNITUDE'
+SINCE_ENV = 'EARTHQUAKE_SINCE'
+
+# Répertoire de l'instantané partagé entre processus (mode multi-workers), de
+# préférence sur un tmpfs tel que /dev/shm ; mode désactivé si la variable est absente
+SHARED_DIR_ENV = 'EARTHQUAKE_SHARED_DIR'
+CURRENT_LINK = 'current'
+# Intervalle minimal (secondes) entre deux vérifications de la version partagée
+SHARED_CHECK_INTERVAL = 1.0
+
+
+def _to_datetime64(value: Optional[str]) -> Optional[np.datetime64]:
+    """
+    Convertit une date ISO (issue d'un composant Dash) en datetime64, None si absente.
+    """
+    return None if value is None else np.datetime64(value, 'ns')
+
+
+class Dataset:
+    """
+    Jeu de données chargé et ses index dérivés. Une instance n'est jamais
+    modifiée après sa construction et peut donc être lue par plusieurs
+    callbacks en parallèle.
+    """
+
+    def __init__(self, df: pd.DataFrame, version: int = 0, presorted: bool = False,
+                 arrays: Optional[Dict[str, np.ndarray]] = None):
+        """
+        Args:
+            df: Séismes nettoyés (au moins 'latitude', 'longitude', 'mag').
+            version: Numéro de version du jeu de données.
+            presorted: `df` est déjà trié par magnitude (instantané partagé).
+            arrays: Tableaux des index déjà calculés (instantané partagé, voir `arrays()`).
+        """
+        arrays = arrays or {}
+        self.version = version
+        # Trié par magnitude pour le filtrage
+        self.mag_index = MagnitudeIndex(
+            df, presorted=presorted, precomputed=arrays,
+            on_cache_access=functools.partial(callback_metrics.record_cache, 'magnitude_view')
+        )
+        self.df: pd.DataFrame = self.mag_index.df
+        # Index spatial multi-résolution de la carte 2D (positions alignées sur `df`)
+        grid_cells = (arrays['grid_col'], arrays['grid_row']) if 'grid_col' in arrays else None
+        self.grid_lod = GridLOD(
+            self.df['latitude'].to_numpy(), self.df['longitude'].to_numpy(), cells=grid_cells
+        )
+        # Index temporel (filtre par période et images de la lecture animée)
+        self.time_index: Optional[TimeIndex] = None
+        if 'time' in self.df:
+            time_arrays = ((arrays['time_order'], arrays['time_rank'], arrays['time_sorted'])
+                           if 'time_order' in arrays else None)
+            self.time_index = TimeIndex(self.df['time'].to_numpy(), precomputed=time_arrays)
+        # Séquences de répliques, calculées au nettoyage (voir `clean_data.add_sequence_columns`) :
+        # code de la séquence (`id` du choc principal, NO_CLUSTER si isolé), chocs principaux
+        # et position du choc principal de chaque code (-1 s'il est hors du jeu de travail)
+        self.cluster_id: Optional[np.ndarray] = None
+        self.mainshock: Optional[np.ndarray] = None
+        self._mainshock_at: Optional[np.ndarray] = None
+        if 'cluster_id' in self.df and 'mainshock' in self.df:
+            self.cluster_id = self.df['cluster_id'].astype('category').cat.codes.to_numpy()
+            self.mainshock = self.df['mainshock'].to_numpy(dtype=bool)
+            n_codes = int(self.cluster_id.max(initial=NO_CLUSTER)) + 1
+            self._mainshock_at = np.full(n_codes, -1, dtype=np.int64)
+            positions = np.flatnonzero(self.mainshock & (self.cluster_id != NO_CLUSTER))
+            self._mainshock_at[self.cluster_id[positions]] = positions
+        self._nearest_index: Optional[NearestEventIndex] = None
+        self._nearest_lock = threading.Lock()
+        # Lieux de l'instantané partagé : tampon d'octets mappé, lu ligne par ligne (voir `place`)
+        self._place_buffer = ((arrays['place_offsets'], arrays['place_bytes'])
+                              if 'place_offsets' in arrays else None)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Tableaux des index, publiés avec l'instantané partagé pour ne pas être
+        recalculés (ni dupliqués) dans chaque worker.
+        """
+        arrays = {'grid_col': self.grid_lod.col, 'grid_row': self.grid_lod.row, **self.mag_index.arrays()}
+        if self.time_index is not None:
+            arrays.update(time_order=self.time_index.order, time_rank=self.time_index.rank,
+                          time_sorted=self.time_index.times)
+        if 'place' in self.df:
+            arrays['place_offsets'], arrays['place_bytes'] = column_store.string_buffer(self.df['place'])
+        return arrays
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Empreinte du contenu (version, taille, somme des magnitudes, dernière date),
+        identique d'un worker à l'autre pour les mêmes données : clé des caches partagés.
+        """
+        last_time = self.time_index.span[1] if self.time_index is not None else None
+        return f"v{self.version}-{len(self.df)}-{self.mag_index.mag_prefix[-1]:.6f}-{last_time}".replace(':', '')
+
+    def time_bounds(self, time_window: Optional[dict]) -> Optional[Tuple[int, int]]:
+        """
+        Rangs temporels [i, j) d'une période, ou None si aucune n'est choisie.
+        Args:
+            time_window: {'start', 'end'} (dates ISO, fin exclue) ou, pendant la
+                lecture animée, {'period', 'frame'}.
+        """
+        if not time_window or self.time_index is None:
+            return None
+        if time_window.get('frame') is not None:
+            return self.time_index.frame_bounds(time_window['period'], time_window['frame'])
+        return self.time_index.bounds(_to_datetime64(time_window.get('start')),
+                                      _to_datetime64(time_window.get('end')))
+
+    @property
+    def boundary_distances(self) -> Optional[np.ndarray]:
+        """
+        Distance (km) de chaque séisme à la frontière tectonique la plus proche,
+        ou None si le store ne la fournit pas.
+        """
+        if 'boundary_distance_km' not in self.df:
+            return None
+        return self.df['boundary_distance_km'].to_numpy()
+
+    def selection(self, mag_range: List[float], time_window: Optional[dict] = None,
+                  max_boundary_km: Optional[float] = None,
+                  mainshocks_only: bool = False) -> Tuple[int, int, Optional[np.ndarray]]:
+        """
+        Événements retenus par les filtres.
+        Args:
+            mag_range: Magnitudes [min, max].
+            time_window: Période (voir `time_bounds`).
+            max_boundary_km: Distance maximale à une frontière tectonique (aucune limite si None).
+            mainshocks_only: Écarte les répliques et chocs précurseurs.
+        Returns:
+            (start, stop, positions) : plage [start, stop) des magnitudes et, si
+            un autre filtre est actif, positions croissantes retenues (sinon None).
+        """
+        start, stop = self.mag_index.bounds(*mag_range)
+        time_bounds = self.time_bounds(time_window)
+        positions = None if time_bounds is None else self.time_index.select(time_bounds, (start, stop))
+        distances = self.boundary_distances
+        if max_boundary_km is not None and distances is not None:
+            # Simple masque sur la plage de magnitudes (colonne float32 contiguë)
+            if positions is None:
+                positions = start + np.flatnonzero(distances[start:stop] <= max_boundary_km)
+            else:
+                positions = positions[distances[positions] <= max_boundary_km]
+        if mainshocks_only and self.mainshock is not None:
+            if positions is None:
+                positions = start + np.flatnonzero(self.mainshock[start:stop])
+            else:
+                positions = positions[self.mainshock[positions]]
+        return start, stop, positions
+
+    def filtered(self, mag_range: List[float], time_window: Optional[dict] = None,
+                 max_boundary_km: Optional[float] = None, mainshocks_only: bool = False) -> pd.DataFrame:
+        """
+        Séismes retenus par les filtres, triés par magnitude croissante.
+        """
+        _, _, positions = self.selection(mag_range, time_window, max_boundary_km, mainshocks_only)
+        if positions is None:
+            return self.mag_index.view(*mag_range)
+        return self.df.iloc[positions]
+
+    def histogram(self, mag_range: List[float], time_window: Optional[dict] = None,
+                  max_boundary_km: Optional[float] = None,
+                  mainshocks_only: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Histogramme des magnitudes des séismes retenus (voir `MagnitudeIndex.histogram`).
+        """
+        _, _, positions = self.selection(mag_range, time_window, max_boundary_km, mainshocks_only)
+        if positions is None:
+            return self.mag_index.histogram(*mag_range)
+        return self.mag_index.histogram_at(positions)
+
+    def summary(self, mag_range: List[float], time_window: Optional[dict] = None,
+                max_boundary_km: Optional[float] = None, mainshocks_only: bool = False) -> dict:
+        """
+        Indicateurs des séismes retenus (voir `MagnitudeIndex.summary`).
+        """
+        _, _, positions = self.selection(mag_range, time_window, max_boundary_km, mainshocks_only)
+        if positions is None:
+            return self.mag_index.summary(*mag_range)
+        return self.mag_index.summary_at(positions)
+
+    def visible_positions(self, mag_range: List[float], time_window: Optional[dict],
+                          viewport: Optional[dict], max_boundary_km: Optional[float] = None,
+                          mainshocks_only: bool = False) -> np.ndarray:
+        """
+        Positions croissantes des séismes retenus situés dans l'emprise de la carte.
+        """
+        start, stop, positions = self.selection(mag_range, time_window, max_boundary_km, mainshocks_only)
+        if positions is None:
+            return self.grid_lod.visible_positions(start, stop, viewport)
+        return self.grid_lod.positions_in_viewport(positions, viewport)
+
+    def globe_positions(self, mag_range: List[float], time_window: Optional[dict],
+                        view: Optional[dict], max_boundary_km: Optional[float] = None,
+                        mainshocks_only: bool = False) -> Tuple[int, np.ndarray]:
+        """
+        Nombre de séismes retenus et positions croissantes de ceux situés sur la
+        face visible du globe (voir `GridLOD.positions_on_globe`).
+        """
+        start, stop, positions = self.selection(mag_range, time_window, max_boundary_km, mainshocks_only)
+        if positions is None:
+            positions = np.arange(start, stop)
+        return len(positions), self.grid_lod.positions_on_globe(positions, view)
+
+    def sequence_labels(self, positions: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        (identifiants de séquence, chocs principaux) des séismes aux positions
+        données, (None, None) si les séquences ne sont pas calculées.
+        """
+        if self.cluster_id is None:
+            return None, None
+        return self.cluster_id[positions], self.mainshock[positions]
+
+    def sequence_mainshock(self, position: int) -> Optional[int]:
+        """
+        Position du choc principal de la séquence du séisme à une position, ou
+        None s'il est isolé (ou si le choc principal est hors du jeu de travail).
+        """
+        if self.cluster_id is None or self.cluster_id[position] == NO_CLUSTER:
+            return None
+        found = self._mainshock_at[self.cluster_id[position]]
+        return int(found) if found >= 0 else None
+
+    def place(self, position: int) -> Optional[str]:
+        """
+        Lieu du séisme à une position, ou None s'il est inconnu. Dans un
+        instantané partagé, seule cette ligne est décodée.
+        """
+        if self._place_buffer is not None:
+            return column_store.string_at(*self._place_buffer, position) or None
+        if 'place' not in self.df:
+            return None
+        place = self.df['place'].iat[position]
+        return None if pd.isna(place) else place
+
+    @property
+    def nearest_index(self) -> NearestEventIndex:
+        """
+        Index du plus proche voisin, pour les survols sans identifiant de ligne.
+        Construit à l'avance par `DataProvider.warm` (hors du chargement des
+        données), sinon au premier besoin ; une seule fois même si plusieurs
+        callbacks le demandent en même temps.
+        """
+        if self._nearest_index is None:
+            with self._nearest_lock:
+                if self._nearest_index is None:
+                    self._nearest_index = NearestEventIndex(
+                        self.df['latitude'].to_numpy(), self.df['longitude'].to_numpy()
+                    )
+        return self._nearest_index
+
+
+@contextmanager
+def _publish_lock(root: str) -> Iterator[None]:
+    """
+    Verrou inter-processus autour de la publication d'un instantané partagé.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def shared_version(root: str) -> Optional[int]:
+    """
+    Version de l'instantané partagé courant, ou None s'il n'y en a pas.
+    """
+    try:
+        return int(os.readlink(os.path.join(root, CURRENT_LINK))[1:])
+    except (OSError, ValueError):
+        return None
+
+
+def publish_dataset(dataset: Dataset, root: str) -> int:
+    """
+    Publie un jeu de données (trié, avec les tableaux de ses index) dans `root`
+    sous la forme d'un instantané versionné de fichiers mappables, puis bascule
+    atomiquement le lien `current` vers celui-ci. Les processus attachés à
+    l'ancienne version la conservent jusqu'à leur prochaine vérification.
+
+    :param dataset: Jeu de données à publier
+    :param root: Répertoire partagé (ex. /dev/shm/earthquake)
+    :return: Numéro de la version publiée
+    """
+    with _publish_lock(root):
+        return _publish_locked(dataset, root)
+
+
+def _publish_locked(dataset: Dataset, root: str) -> int:
+    """
+    Corps de `publish_dataset`, à appeler en détenant `_publish_lock(root)`.
+    """
+    version = (shared_version(root) or 0) + 1
+    name = f"v{version:06d}"
+    directory = os.path.join(root, name)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    # `place` (presque une valeur distincte par ligne) ne fait pas partie des colonnes :
+    # il est publié comme tampon d'octets mappé (voir `Dataset.arrays`) et lu au survol
+    column_store.write_store(dataset.df.drop(columns=['place'], errors='ignore'), os.path.join(directory, 'data'))
+    for array_name, array in dataset.arrays().items():
+        np.save(os.path.join(directory, f"{array_name}.npy"), array)
+    with open(os.path.join(directory, 'snapshot.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'n_rows': len(dataset.df)}, f)
+
+    tmp_link = os.path.join(root, f"{CURRENT_LINK}.tmp-{os.getpid()}")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(name, tmp_link)
+    os.replace(tmp_link, os.path.join(root, CURRENT_LINK))
+
+    # Les versions antérieures à la précédente ne sont plus lues par personne
+    for entry in os.listdir(root):
+        if entry.startswith('v') and entry[1:].isdigit() and int(entry[1:]) < version - 1:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    return version
+
+
+def attach_dataset(root: str) -> Dataset:
+    """
+    S'attache en lecture seule à l'instantané partagé courant : les colonnes et
+    les tableaux des index sont mappés en mémoire, sans copie ni recalcul.
+    """
+    name = os.readlink(os.path.join(root, CURRENT_LINK))
+    directory = os.path.join(root, name)
+    df = column_store.read_store(os.path.join(directory, 'data'), mmap=True)
+    arrays = {
+        entry[:-len('.npy')]: np.load(os.path.join(directory, entry), mmap_mode='r')
+        for entry in os.listdir(directory) if entry.endswith('.npy')
+    }
+    return Dataset(df, version=int(name[1:]), presorted=True, arrays=arrays)
+
+
+def working_set_from_env() -> dict:
+    """
+    Filtres du jeu de travail (arguments de `column_store.query_store`) lus dans
+    les variables d'environnement.
+    """
+    working_set = {}
+    if os.environ.get(MIN_MAGNITUDE_ENV):
+        working_set['mag_range'] = (float(os.environ[MIN_MAGNITUDE_ENV]), None)
+    if os.environ.get(SINCE_ENV):
+        working_set['time_range'] = (os.environ[SINCE_ENV], None)
+    return working_set
+
+
+class DataProvider:
+    """
+    Point d'accès unique aux données du dashboard, initialisé paresseusement.
+
+    Rien n'est chargé à l'import : `metadata()` ne lit que le manifeste du store
+    (suffisant pour construire la mise en page), `get()` charge les données et
+    construit les index au premier appel (ou lors de `warm()`), une seule fois
+    même si plusieurs threads le demandent en même temps.
+
+    En mode partagé (`shared_root`, par défaut la variable d'environnement
+    EARTHQUAKE_SHARED_DIR), le jeu de données est publié une seule fois sous
+    forme de fichiers mappés et tous les workers s'y attachent en lecture
+    seule ; une nouvelle publication est prise en compte sans redémarrage.
+    Sans verrous de fichiers POSIX (Windows), le mode partagé est ignoré et
+    chaque processus charge ses propres données.
+    """
+
+    def __init__(self, store_path: str = CLEAN_STORE_PATH, columns: Optional[List[str]] = None,
+                 shared_root: Optional[str] = None, working_set: Optional[dict] = None):
+        """
+        Args:
+            store_path: Répertoire du store colonnaire.
+            columns: Colonnes chargées (DASHBOARD_COLUMNS par défaut).
+            shared_root: Répertoire de l'instantané partagé (mode multi-workers).
+            working_set: Filtres du jeu de travail (`mag_range`, `time_range`, `bbox`) ;
+                par défaut ceux des variables d'environnement.
+        """
+        self.store_path = store_path
+        self.columns = columns or DASHBOARD_COLUMNS
+        self.working_set = working_set if working_set is not None else working_set_from_env()
+        self.shared_root = shared_root if shared_root is not None else os.environ.get(SHARED_DIR_ENV)
+        if self.shared_root and fcntl is None:
+            print(f"Shared snapshots need POSIX file locks; ignoring {self.shared_root}.")
+            self.shared_root = None
+        self._shared_checked = 0.0
+        self._lock = threading.Lock()
+        self._dataset: Optional[Dataset] = None
+        self._fault_layer: Optional[FaultLayer] = None
+        self._fault_layer_loaded = False
+        self._fault_layer_lock = threading.Lock()
+        self._metadata: Optional[dict] = None
+        # Génération du manifeste du store lors du dernier chargement (voir `store_changed`)
+        self._store_generation: Optional[int] = None
+
+    def get(self) -> Dataset:
+        """
+        Jeu de données courant (chargé au premier appel).
+        """
+        if self.shared_root:
+            return self._get_shared()
+        dataset = self._dataset
+        if dataset is not None:
+            return dataset
+        with self._lock:
+            if self._dataset is None:
+                self._dataset = self._build()
+            return self._dataset
+
+    def _build(self, version: int = 0) -> Dataset:
+        """
+        Charge les colonnes du store et construit les index.
+        """
+        with startup_timer.phase("data load"):
+            if column_store.store_exists(self.store_path):
+                self._store_generation = column_store.read_manifest(self.store_path)["generation"]
+            df = common_functions.load_clean_data(
+                columns=self._store_columns(), store_path=self.store_path, **self.working_set
+            )
+        with startup_timer.phase("indexes"):
+            return Dataset(df, version=version)
+
+    def _store_columns(self) -> List[str]:
+        """
+        Colonnes à charger : `columns`, sans les colonnes optionnelles absentes du store.
+        """
+        available = (column_store.read_manifest(self.store_path)["columns"]
+                     if column_store.store_exists(self.store_path) else {})
+        return [c for c in self.columns if c in available or c not in OPTIONAL_COLUMNS]
+
+    def reload(self) -> Dataset:
+        """
+        Reconstruit le jeu de données et ses index à partir du store (à appeler
+        hors du chemin des requêtes, ex. après un rafraîchissement), puis le
+        substitue au précédent en une seule affectation : les callbacks en cours
+        terminent sur l'ancienne version, les suivants voient la nouvelle.
+        En mode partagé, la nouvelle version est publiée pour tous les workers.
+        """
+        current = self._dataset
+        dataset = self._build(version=(current.version if current is not None else 0) + 1)
+        if self.shared_root:
+            publish_dataset(dataset, self.shared_root)
+            self._shared_checked = 0.0
+            return self.get()
+        # Index du plus proche voisin construit avant la substitution, comme dans `warm`
+        dataset.nearest_index
+        with self._lock:
+            self._dataset = dataset
+            self._metadata = None
+        return dataset
+
+    def store_changed(self) -> bool:
+        """
+        Le store a été modifié (ex. par le rafraîchisseur d'un autre processus)
+        depuis le chargement du jeu de données courant.
+        """
+        if self._dataset is None or not column_store.store_exists(self.store_path):
+            return False
+        return column_store.read_manifest(self.store_path)["generation"] != self._store_generation
+
+    def _get_shared(self) -> Dataset:
+        """
+        Jeu de données partagé : publié par le premier processus qui le demande,
+        puis réattaché dès que la version courante change.
+        """
+        dataset = self._dataset
+        if dataset is not None and time.monotonic() - self._shared_checked < SHARED_CHECK_INTERVAL:
+            return dataset
+        with self._lock:
+            version = shared_version(self.shared_root)
+            if version is None:
+                # Verrou inter-processus : si plusieurs workers démarrent ensemble,
+                # un seul construit et publie, les autres s'attachent à sa version
+                with _publish_lock(self.shared_root):
+                    version = shared_version(self.shared_root)
+                    if version is None:
+                        with startup_timer.phase("publish shared"):
+                            _publish_locked(self._build(), self.shared_root)
+                        version = shared_version(self.shared_root)
+            if self._dataset is None or self._dataset.version != version:
+                with startup_timer.phase("attach shared"):
+                    self._dataset = attach_dataset(self.shared_root)
+            self._shared_checked = time.monotonic()
+            return self._dataset
+
+    def fault_layer(self) -> Optional[FaultLayer]:
+        """
+        Couche des frontières tectoniques si elle est déjà chargée (par `warm`),
+        sinon None : ne lit ni ne télécharge rien, appelable depuis les callbacks.
+        """
+        return self._fault_layer
+
+    def _load_fault_layer(self) -> None:
+        """
+        Charge la couche tectonique (téléchargée si la copie locale manque, None
+        hors ligne), une seule fois, sous un verrou distinct de celui des données.
+        """
+        if self._fault_layer_loaded:
+            return
+        with self._fault_layer_lock:
+            if not self._fault_layer_loaded:
+                with startup_timer.phase("fault layer"):
+                    self._fault_layer = load_fault_layer()
+                self._fault_layer_loaded = True
+
+    def metadata(self) -> dict:
+        """
+        Valeurs nécessaires à la mise en page (nombre de séismes, magnitudes
+        min/max/moyenne, première et dernière date, présence des distances aux
+        frontières tectoniques), lues dans le manifeste du store sans charger de colonne.
+        Si le store n'existe pas encore, il est construit (à partir du CSV nettoyé) ;
+        si ses statistiques sont incomplètes, elles sont complétées dans le manifeste.
+        """
+        if self._metadata is None:
+            with startup_timer.phase("metadata"):
+                self._metadata = self._read_metadata()
+        return self._metadata
+
+    def _read_metadata(self) -> dict:
+        common_functions.ensure_store(self.store_path)
+        # Avec un jeu de travail, seules les partitions retenues sont cumulées
+        # (valeurs approchées, corrigées par les callbacks des indicateurs)
+        stats = column_store.store_statistics(self.store_path, **self.working_set)
+        mag = stats["columns"].get("mag")
+        if not mag or mag["count"] != stats["n_rows"]:
+            column_store.refresh_statistics(self.store_path)
+            stats = column_store.store_statistics(self.store_path, **self.working_set)
+            mag = stats["columns"].get("mag")
+        if not mag:
+            return {"n_rows": stats["n_rows"], "mag_min": 0.0, "mag_max": 0.0, "mag_mean": 0.0,
+                    "time_min": None, "time_max": None, "has_boundaries": False}
+        time_stats = stats["columns"].get("time", {})
+        mag_low = (self.working_set.get("mag_range") or (None, None))[0]
+        time_start = (self.working_set.get("time_range") or (None, None))[0]
+        mag_min = mag["min"] if mag_low is None else max(mag["min"], mag_low)
+        boundary = stats["columns"].get("boundary_distance_km") or {}
+        return {
+            "n_rows": stats["n_rows"],
+            "mag_min": mag_min,
+            "mag_max": mag["max"],
+            "mag_mean": min(max(mag["sum"] / mag["count"], mag_min), mag["max"]),
+            "time_min": (time_stats.get("min") if time_start is None
+                         else max(time_stats.get("min") or "", str(np.datetime64(time_start, "ns")))),
+            "time_max": time_stats.get("max"),
+            "has_boundaries": bool(boundary.get("count")),
+        }
+
+    def statistics(self) -> dict:
+        """
+        Mesures du jeu de données courant exportées par `/metrics` (source de
+        `callback_metrics`) ; ne déclenche aucun chargement.
+        """
+        dataset = self._dataset
+        if dataset is None:
+            return {}
+        # Accès au cache des vues comptés par `callback_metrics.record_cache` : les
+        # compteurs survivent au remplacement du jeu de données (et de son cache)
+        return {
+            'gauges': {'dataset_rows': len(dataset.df), 'dataset_version': dataset.version},
+        }
+
+    def warm(self, background: bool = False) -> Optional[threading.Thread]:
+        """
+        Charge les données, l'index du plus proche voisin et la couche
+        tectonique à l'avance (seul chargement de la couche : avant lui, la
+        carte s'affiche sans les failles).
+        Args:
+            background: Charge dans un thread démon au lieu de bloquer.
+        Returns:
+            Le thread de chargement si `background`, sinon None.
+        """
+        def _warm() -> None:
+            dataset = self.get()
+            with startup_timer.phase("nearest index"):
+                dataset.nearest_index
+            self._load_fault_layer()
+
+        if not background:
+            _warm()
+            return None
+        thread = threading.Thread(target=_warm, name="data-provider-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+provider = DataProvider()
+callback_metrics.register_source(provider.statistics)
+
+
+if __name__ == "__main__":
+    # Publication de l'instantané partagé à partir du store (avant de lancer les workers)
+    root = sys.argv[1] if len(sys.argv) > 1 else os.environ.get(SHARED_DIR_ENV)
+    if not root:
+        sys.exit(f"Usage: python -m src.utils.data_provider <dir> (ou {SHARED_DIR_ENV})")
+    if fcntl is None:
+        sys.exit("Shared snapshots are not supported on this platform.")
+    published = publish_dataset(DataProvider(shared_root='')._build(), root)
+    print(f"Shared dataset v{published} published in {root}.")
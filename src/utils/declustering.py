@@ -0,0 +1,337 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.utils.indexes import TimeIndex
+from src.utils.spatial import EARTH_RADIUS_KM
+
+# Taille (degrés) des cellules de la grille spatiale ; les fenêtres de Gardner–Knopoff
+# font de 30 à 130 km, une requête ne lit donc que quelques cellules
+CELL_DEGREES = 1.0
+# Identifiant de séquence des événements isolés (ni choc principal d'une séquence, ni réplique)
+NO_CLUSTER = -1
+NANOSECONDS_PER_DAY = 86_400 * 10 ** 9
+
+
+def gardner_knopoff_windows(mags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fenêtres de Gardner & Knopoff (1974) en fonction de la magnitude.
+    Returns:
+        (rayons en km, durées en jours)
+    """
+    mags = np.asarray(mags, dtype=np.float64)
+    distance_km = 10 ** (0.1238 * mags + 0.983)
+    days = np.where(mags >= 6.5, 10 ** (0.032 * mags + 2.7389), 10 ** (0.5409 * mags - 0.547))
+    return distance_km, days
+
+
+def _duration(days: np.ndarray) -> np.ndarray:
+    """
+    Durées (jours) converties en timedelta64[ns].
+    """
+    return (np.asarray(days) * NANOSECONDS_PER_DAY).astype('timedelta64[ns]')
+
+
+def sequence_window(mag: float) -> np.timedelta64:
+    """
+    Durée de la fenêtre de Gardner–Knopoff d'un séisme de magnitude `mag`
+    (la plus longue d'un catalogue dont c'est la magnitude maximale).
+    """
+    return _duration(gardner_knopoff_windows(np.array([mag]))[1])[0]
+
+
+def update_start(times: np.ndarray, mags: np.ndarray, changed: np.ndarray) -> Optional[np.datetime64]:
+    """
+    Date à partir de laquelle une mise à jour incrémentale recalcule les
+    séquences : chaque événement modifié peut rattacher ceux de sa propre
+    fenêtre, qui commence `days` avant lui. None si aucun événement daté n'a changé.
+    """
+    changed = changed & ~np.isnat(times)
+    if not changed.any():
+        return None
+    _, days = gardner_knopoff_windows(mags[changed])
+    return (times[changed] - _duration(days)).min()
+
+
+def _great_circle_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Distance (km, formule de haversine) d'un point à des positions.
+    """
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats.astype(np.float64)), np.radians(lons.astype(np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SpaceTimeIndex:
+    """
+    Index spatio-temporel des événements pour les requêtes « dans un rayon et
+    une durée donnés ».
+
+    Chaque événement daté reçoit une cellule d'une grille de CELL_DEGREES ;
+    les événements sont rangés par (cellule, rang temporel de `TimeIndex`),
+    clé entière unique. Une fenêtre (cellule, période) est alors un intervalle
+    de clés : une requête fait une recherche dichotomique par cellule voisine,
+    puis filtre les seuls candidats par leur distance exacte.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, time_index: TimeIndex,
+                 cell_degrees: float = CELL_DEGREES):
+        """
+        Args:
+            lat: Latitudes des événements.
+            lon: Longitudes des événements.
+            time_index: Index temporel aligné sur les mêmes positions.
+            cell_degrees: Taille des cellules de la grille.
+        """
+        self.lat = np.asarray(lat)
+        self.lon = np.asarray(lon)
+        self.time_index = time_index
+        self.cell_degrees = cell_degrees
+        self.n_cols = int(np.ceil(360 / cell_degrees))
+        self.n_rows = int(np.ceil(180 / cell_degrees))
+        dated = time_index.order[:time_index.n_dated]
+        col = self._col(self.lon[dated])
+        row = self._row(self.lat[dated])
+        self.n_ranks = max(len(time_index.order), 1)
+        keys = (row * self.n_cols + col) * self.n_ranks + np.arange(len(dated))
+        key_order = np.argsort(keys, kind='stable')
+        self.keys: np.ndarray = keys[key_order]
+        self.positions: np.ndarray = dated[key_order]
+
+    def _col(self, lon: np.ndarray) -> np.ndarray:
+        col = np.floor((np.asarray(lon, dtype=np.float64) + 180) / self.cell_degrees).astype(np.int64)
+        return np.clip(col, 0, self.n_cols - 1)
+
+    def _row(self, lat: np.ndarray) -> np.ndarray:
+        row = np.floor((np.asarray(lat, dtype=np.float64) + 90) / self.cell_degrees).astype(np.int64)
+        return np.clip(row, 0, self.n_rows - 1)
+
+    def rank_bounds(self, times: np.ndarray, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rangs temporels [first, last) des périodes [time - days, time + days],
+        calculés en une fois pour tous les événements.
+        """
+        delta = _duration(days)
+        dated = self.time_index.times[:self.time_index.n_dated]
+        first = np.searchsorted(dated, times - delta, side='left')
+        last = np.searchsorted(dated, times + delta, side='right')
+        return first, last
+
+    def neighbourhoods(self, lat: np.ndarray, lon: np.ndarray,
+                       distance_km: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Cellules voisines d'événements, calculées en une fois : lignes [row_lo, row_hi],
+        colonne centrale et demi-largeur en colonnes (-1 : toutes les colonnes).
+        Le rayon en degrés de latitude est élargi en longitude selon la latitude.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        radius_deg = np.degrees(np.asarray(distance_km, dtype=np.float64) / EARTH_RADIUS_KM)
+        row_lo = self._row(np.maximum(lat - radius_deg, -90.0))
+        row_hi = self._row(np.minimum(lat + radius_deg, 90.0))
+        cos_lat = np.cos(np.radians(np.minimum(np.abs(lat) + radius_deg, 90.0)))
+        with np.errstate(divide='ignore'):
+            half = np.ceil(radius_deg / cos_lat / self.cell_degrees)
+        half = np.where(cos_lat * 180 <= radius_deg, -1, np.minimum(half, self.n_cols // 2)).astype(np.int64)
+        return row_lo, row_hi, self._col(lon), half
+
+    def query(self, lat: float, lon: float, distance_km: float, first: int, last: int,
+              neighbourhood: Tuple[int, int, int, int]) -> np.ndarray:
+        """
+        Positions des événements situés à moins de `distance_km` de (lat, lon)
+        et dont le rang temporel est dans [first, last) (voir `rank_bounds`),
+        parmi les cellules `neighbourhood` (voir `neighbourhoods`).
+        """
+        row_lo, row_hi, col, half = neighbourhood
+        rows = np.arange(row_lo, row_hi + 1)
+        if half < 0:
+            cols = np.arange(self.n_cols)
+        else:
+            cols = np.arange(col - half, col + half + 1) % self.n_cols
+        cells = (rows[:, None] * self.n_cols + cols[None, :]).ravel()
+
+        starts = np.searchsorted(self.keys, cells * self.n_ranks + first, side='left')
+        stops = np.searchsorted(self.keys, cells * self.n_ranks + last, side='left')
+        lengths = stops - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        # Concaténation des intervalles [start, stop) non vides
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        candidates = self.positions[offsets + np.arange(total)]
+        close = _great_circle_km(lat, lon, self.lat[candidates], self.lon[candidates]) <= distance_km
+        return candidates[close]
+
+
+def decluster(lat: np.ndarray, lon: np.ndarray, mags: np.ndarray, time_index: TimeIndex,
+              previous: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+              start: Optional[np.datetime64] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Regroupe les séismes en séquences (chocs précurseurs, choc principal,
+    répliques) par fenêtres espace-temps de Gardner–Knopoff.
+
+    Les événements sont parcourus par magnitude décroissante : un événement
+    encore libre est un choc principal et rattache à sa séquence les événements
+    libres de magnitude inférieure ou égale situés dans sa fenêtre. Chaque
+    recherche passe par `SpaceTimeIndex` et ne lit que le voisinage de
+    l'événement : le coût est d'environ O(n log n) au lieu de O(n²).
+
+    Mise à jour incrémentale : avec `previous` et `start` (voir `update_start`),
+    seuls les événements postérieurs à `start` sont recalculés ; les chocs
+    principaux antérieurs dont la propre fenêtre atteint `start` peuvent encore
+    leur rattacher des répliques. Les séquences plus anciennes ne sont pas remises en cause.
+
+    Args:
+        lat: Latitudes.
+        lon: Longitudes.
+        mags: Magnitudes.
+        time_index: Index temporel aligné sur les mêmes positions.
+        previous: (identifiants de séquence, chocs principaux) déjà connus, alignés
+            sur les positions (valables au moins pour les événements antérieurs à `start`).
+        start: Date à partir de laquelle les événements sont recalculés.
+    Returns:
+        (identifiant de séquence par événement, masque des chocs principaux).
+        L'identifiant est la position du choc principal de la séquence,
+        NO_CLUSTER pour un événement isolé ; les événements non datés sont isolés.
+    """
+    mags = np.asarray(mags)
+    n = len(mags)
+    times = np.full(n, np.datetime64('NaT', 'ns'))
+    dated = time_index.order[:time_index.n_dated]
+    times[dated] = time_index.times[:time_index.n_dated]
+    distance_km, days = gardner_knopoff_windows(mags)
+
+    recompute = np.zeros(n, dtype=bool)
+    if previous is None or start is None:
+        cluster_id = np.full(n, NO_CLUSTER, dtype=np.int64)
+        mainshock = np.ones(n, dtype=bool)
+        recompute[dated] = True
+        context = recompute.copy()
+    else:
+        cluster_id = np.asarray(previous[0], dtype=np.int64).copy()
+        mainshock = np.asarray(previous[1], dtype=bool).copy()
+        start = np.datetime64(start, 'ns')
+        recompute[dated] = times[dated] >= start
+        cluster_id[recompute] = NO_CLUSTER
+        mainshock[recompute] = True
+        # Chocs principaux antérieurs dont la fenêtre peut atteindre les événements recalculés
+        context = recompute.copy()
+        context[dated] |= (times[dated] + _duration(days[dated]) >= start) & mainshock[dated]
+
+    index = SpaceTimeIndex(lat, lon, time_index)
+    assigned = ~recompute
+    lat64 = np.asarray(lat, dtype=np.float64)
+    lon64 = np.asarray(lon, dtype=np.float64)
+    candidates_by_mag = np.flatnonzero(context)
+    # À magnitude égale, le plus ancien d'abord : le résultat ne dépend pas de l'ordre des lignes
+    candidates_by_mag = candidates_by_mag[np.lexsort((times[candidates_by_mag], -mags[candidates_by_mag]))]
+    first, last = index.rank_bounds(times[candidates_by_mag], days[candidates_by_mag])
+    neighbourhoods = zip(*(values.tolist() for values in index.neighbourhoods(
+        lat64[candidates_by_mag], lon64[candidates_by_mag], distance_km[candidates_by_mag]
+    )))
+    # Un événement seul dans sa période n'a aucune réplique possible : pas de requête
+    alone = last - first <= 1
+    for i, rank_first, rank_last, skip, neighbourhood in zip(
+            candidates_by_mag.tolist(), first.tolist(), last.tolist(), alone.tolist(), neighbourhoods):
+        if recompute[i] and assigned[i]:
+            continue
+        assigned[i] = True
+        # Identifiant posé même sans nouvelle réplique : des événements non recalculés
+        # peuvent déjà appartenir à sa séquence (isolé sinon, voir plus bas)
+        if cluster_id[i] == NO_CLUSTER:
+            cluster_id[i] = i
+        if skip:
+            continue
+        window = index.query(lat64[i], lon64[i], distance_km[i], rank_first, rank_last, neighbourhood)
+        window = window[~assigned[window] & (mags[window] <= mags[i])]
+        if not len(window):
+            continue
+        cluster_id[window] = cluster_id[i]
+        mainshock[window] = False
+        assigned[window] = True
+
+    # Séquences parcourues réduites à leur choc principal (répliques recalculées
+    # ailleurs) : événements isolés. Les autres séquences n'ont pas changé et
+    # peuvent avoir des membres hors du catalogue (voir `decluster_catalog`)
+    ids, counts = np.unique(cluster_id[cluster_id != NO_CLUSTER], return_counts=True)
+    single = ids[counts == 1]
+    cluster_id[np.isin(cluster_id, single[context[single]])] = NO_CLUSTER
+    return cluster_id, mainshock
+
+
+def _orphans(cluster_id: np.ndarray, mainshock: np.ndarray) -> np.ndarray:
+    """
+    Événements rattachés à une séquence dont le choc principal n'en est plus un.
+    """
+    return (cluster_id >= 0) & ~mainshock[np.maximum(cluster_id, 0)]
+
+
+def decluster_catalog(df: pd.DataFrame, since: Optional[np.datetime64] = None
+                      ) -> Tuple[np.ndarray, np.ndarray, Optional[np.datetime64]]:
+    """
+    Séquences de répliques d'un catalogue, identifiées par l'`id` de leur choc
+    principal (stable d'une version du catalogue à l'autre, contrairement à
+    une position, ou à une date que deux événements peuvent partager).
+
+    Si `df` porte déjà des colonnes 'cluster_id' et 'mainshock' (store
+    nettoyé), la mise à jour est incrémentale : les événements à étiqueter
+    (ni séquence ni rôle de choc principal) et ceux dont le choc principal a
+    disparu ou n'en est plus un donnent la date de départ de `decluster`
+    (voir `update_start`).
+
+    Args:
+        df: Catalogue ('id' unique, 'time', 'latitude', 'longitude', 'mag', et
+            éventuellement 'cluster_id', 'mainshock').
+        since: `df` ne contient que les événements postérieurs à cette date (extrait
+            du store) : une étiquette dont le choc principal est absent désigne alors
+            un choc plus ancien et reste valable. L'extrait doit commencer au moins
+            deux fenêtres (voir `sequence_window`) avant la date de départ renvoyée.
+    Returns:
+        (`id` du choc principal de chaque événement, None s'il est isolé ;
+        masque des chocs principaux ; date de départ de la mise à jour
+        incrémentale, None si le catalogue a été entièrement recalculé ou n'a pas changé).
+    """
+    ids = df['id'].to_numpy(dtype=object)
+    times = pd.to_datetime(df['time'], utc=True).dt.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+    # Précision du store (float32) : même résultat avant et après l'écriture des lignes
+    lat, lon, mags = (df[name].to_numpy(dtype=np.float32) for name in ('latitude', 'longitude', 'mag'))
+    time_index = TimeIndex(times)
+
+    labels = None
+    if {'cluster_id', 'mainshock'} <= set(df.columns) and df['id'].is_unique:
+        labelled = df['cluster_id'].notna().to_numpy()
+        was_mainshock = df['mainshock'].to_numpy(dtype=bool)
+        if (labelled | was_mainshock).any():
+            mainshock_of = pd.Index(ids).get_indexer(df['cluster_id'].to_numpy(dtype=object))
+            labels = np.where(labelled & (mainshock_of >= 0), mainshock_of, NO_CLUSTER), was_mainshock
+            # Choc principal hors de l'extrait : séquence plus ancienne, conservée
+            external = labelled & (mainshock_of < 0) & (since is not None)
+            # À étiqueter : ni séquence ni choc principal ; étiquette dont le choc a disparu
+            stale = (~labelled & ~was_mainshock) | (labelled & (mainshock_of < 0) & ~external)
+
+    start = None
+    if labels is None:
+        cluster_id, mainshock = decluster(lat, lon, mags, time_index)
+    else:
+        cluster_id, mainshock = labels
+        stale |= _orphans(cluster_id, mainshock)
+        while True:
+            changed_start = update_start(times, mags, stale)
+            if changed_start is None or (start is not None and changed_start >= start):
+                break
+            start = changed_start
+            cluster_id, mainshock = decluster(lat, lon, mags, time_index, previous=labels, start=start)
+            # Une réplique ancienne peut désigner un choc recalculé devenu réplique :
+            # la mise à jour repart alors de sa propre fenêtre
+            stale = _orphans(cluster_id, mainshock)
+        # Les événements non datés sont isolés
+        undated = np.isnat(times)
+        cluster_id, mainshock = np.where(undated, NO_CLUSTER, cluster_id), mainshock | undated
+    mainshock_ids = np.where(cluster_id >= 0, ids[np.maximum(cluster_id, 0)], None)
+    if labels is not None and external.any():
+        # Non recalculées (antérieures au départ) : étiquettes d'origine
+        kept = external & ((times < start) if start is not None else True)
+        mainshock_ids[kept] = df['cluster_id'].to_numpy(dtype=object)[kept]
+    return mainshock_ids, mainshock, start
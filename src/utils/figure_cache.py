@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import plotly
+
+from src.utils.metrics import callback_metrics
+
+# Taille maximale du cache en mémoire (octets de JSON) ; une entrée plus grande
+# que le quart de ce budget n'y est pas conservée
+MEMORY_BUDGET = 64 * 2 ** 20
+# Répertoire du cache sur disque partagé entre workers (désactivé si la variable est absente)
+CACHE_DIR_ENV = 'EARTHQUAKE_FIGURE_CACHE_DIR'
+# Taille maximale du cache sur disque (octets), vérifiée toutes les DISK_PRUNE_EVERY écritures
+DISK_BUDGET = 512 * 2 ** 20
+DISK_PRUNE_EVERY = 32
+
+
+def cache_key(**inputs) -> str:
+    """
+    Clé d'un jeu d'entrées de callback déjà normalisées (listes triées, flottants
+    arrondis) : empreinte de leur représentation JSON canonique.
+    """
+    canonical = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class FigureCache:
+    """
+    Cache des figures déjà construites.
+
+    Le premier niveau est un LRU en mémoire de figures prêtes à renvoyer
+    (dictionnaires que Dash sérialise une seule fois), borné par la taille de
+    leur JSON ; le second, optionnel, est un répertoire partagé par les workers
+    (un fichier JSON par figure, écrit atomiquement). Les fichiers sont rangés
+    par empreinte du jeu de données : un worker qui sert encore la version
+    précédente pendant un rafraîchissement garde ses entrées, et celles des
+    anciennes empreintes sortent du budget disque comme les autres.
+    """
+
+    def __init__(self, memory_budget: int = MEMORY_BUDGET, cache_dir: Optional[str] = None,
+                 disk_budget: int = DISK_BUDGET):
+        """
+        Args:
+            memory_budget: Taille maximale du niveau mémoire (octets).
+            cache_dir: Répertoire du niveau disque ; par défaut la variable
+                d'environnement EARTHQUAKE_FIGURE_CACHE_DIR (désactivé si absente).
+            disk_budget: Taille maximale du niveau disque (octets).
+        """
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir if cache_dir is not None else os.environ.get(CACHE_DIR_ENV)
+        self.disk_budget = disk_budget
+        self._lock = threading.Lock()
+        # Clé -> (figure, taille de son JSON en octets)
+        self._entries: 'OrderedDict[str, Tuple[dict, int]]' = OrderedDict()
+        self._size = 0
+        self._fingerprint: Optional[str] = None
+        self._disk_writes = 0
+
+    def get_or_build(self, fingerprint: str, key: str, build: Callable[[], dict]) -> dict:
+        """
+        Figure associée à `key` pour le jeu de données `fingerprint`, construite
+        par `build` (puis mise en cache) si elle n'est dans aucun niveau.
+        La figure renvoyée est partagée entre les requêtes : ne pas la modifier.
+        """
+        self._check_fingerprint(fingerprint)
+        figure = self._get_memory(key)
+        if figure is None and self.cache_dir:
+            payload = self._get_disk(fingerprint, key)
+            if payload is not None:
+                figure = json.loads(payload)
+                self._put_memory(key, figure, len(payload))
+        callback_metrics.record_cache('figure', figure is not None)
+        if figure is not None:
+            return figure
+
+        figure = build()
+        payload = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder)
+        self._put_memory(key, figure, len(payload))
+        if self.cache_dir:
+            self._put_disk(fingerprint, key, payload)
+        return figure
+
+    def _check_fingerprint(self, fingerprint: str) -> None:
+        # Nouveau jeu de données : les figures en mémoire ne sont plus valables
+        # (le niveau disque, rangé par empreinte, n'a pas à être purgé)
+        if fingerprint == self._fingerprint:
+            return
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            self._entries.clear()
+            self._size = 0
+            self._fingerprint = fingerprint
+
+    def _get_memory(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _put_memory(self, key: str, figure: dict, size: int) -> None:
+        if size > self.memory_budget // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (figure, size)
+            self._size += size
+            while self._size > self.memory_budget:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def _get_disk(self, fingerprint: str, key: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.cache_dir, fingerprint, f"{key}.json"), encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _put_disk(self, fingerprint: str, key: str, payload: str) -> None:
+        directory = os.path.join(self.cache_dir, fingerprint)
+        path = os.path.join(directory, f"{key}.json")
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Le niveau disque est une optimisation : une écriture ratée n'est pas une erreur
+            return
+        self._disk_writes += 1
+        if self._disk_writes % DISK_PRUNE_EVERY == 0:
+            self._prune_disk(fingerprint)
+
+    def _prune_disk(self, fingerprint: str) -> None:
+        """
+        Supprime les figures les moins récemment écrites, toutes empreintes
+        confondues, au-delà du budget disque, puis les répertoires vidés des
+        empreintes précédentes.
+        """
+        stats = []
+        try:
+            directories = [entry.path for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+            for directory in directories:
+                for entry in os.scandir(directory):
+                    if entry.name.endswith('.json'):
+                        try:
+                            stats.append((entry.stat(), entry.path))
+                        except OSError:
+                            # Supprimé entre-temps par un autre worker
+                            continue
+        except OSError:
+            return
+        stats.sort(key=lambda item: item[0].st_mtime)
+        total = sum(stat.st_size for stat, _ in stats)
+        for stat, path in stats:
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= stat.st_size
+        for directory in directories:
+            if os.path.basename(directory) != fingerprint:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    # Répertoire encore utilisé (non vide)
+                    pass
+
+    def statistics(self) -> Dict[str, dict]:
+        """
+        Mesures exportées par `/metrics` (source de `callback_metrics`) ; les
+        accès au cache sont comptés par `callback_metrics.record_cache`.
+        """
+        return {
+            'gauges': {'figure_cache_bytes': self._size, 'figure_cache_entries': len(self._entries)},
+        }
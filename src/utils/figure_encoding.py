@@ -0,0 +1,68 @@
+import base64
+from typing import Any, Union
+
+import numpy as np
+import plotly.graph_objects as go
+
+# En dessous de cette longueur, un tableau reste en liste JSON (gain négligeable)
+MIN_ENCODED_LENGTH = 16
+# Types entiers candidats, du plus compact au plus large (codes des tableaux typés plotly.js)
+INTEGER_TYPES = (('u1', np.uint8), ('i1', np.int8), ('u2', np.uint16), ('i2', np.int16),
+                 ('u4', np.uint32), ('i4', np.int32))
+
+
+def typed_array(values: Any, min_length: int = MIN_ENCODED_LENGTH) -> Union[dict, Any]:
+    """
+    Encode un tableau numérique 1D au format des tableaux typés de plotly.js
+    (>= 2.28) : {'dtype', 'bdata'}, les octets du tableau en base64.
+    Les réels sont réduits en float32 (précision d'environ 1 m sur les
+    coordonnées, NaN conservés) et les entiers au plus petit type qui les contient.
+    Args:
+        values: Tableau à encoder.
+        min_length: Longueur en dessous de laquelle le tableau est laissé tel quel.
+    Returns:
+        Le tableau encodé, ou `values` inchangé s'il n'est pas concerné
+        (texte, dates, tableau à plusieurs dimensions ou trop court).
+    """
+    if not isinstance(values, np.ndarray) or values.ndim != 1 or len(values) < min_length:
+        return values
+    if values.dtype.kind == 'f':
+        code, array = 'f4', values.astype('<f4', copy=False)
+    elif values.dtype.kind in 'iu':
+        low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+        for code, dtype in INTEGER_TYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                array = values.astype(np.dtype(dtype).newbyteorder('<'), copy=False)
+                break
+        else:
+            return values
+    else:
+        return values
+    return {'dtype': code, 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def _encode_arrays(value: Any, min_length: int) -> Any:
+    # Parcourt les attributs d'une trace (marker, line... sont des dictionnaires imbriqués)
+    if isinstance(value, dict):
+        return {key: _encode_arrays(item, min_length) for key, item in value.items()}
+    return typed_array(value, min_length)
+
+
+def encode_figure(fig: go.Figure, min_length: int = MIN_ENCODED_LENGTH) -> dict:
+    """
+    Convertit une figure en dictionnaire dont les tableaux numériques des traces
+    (lat, lon, text, customdata, marker.size...) sont des tableaux typés :
+    la réponse du callback est plusieurs fois plus petite et plus rapide à
+    décoder par le navigateur qu'une liste JSON de nombres en texte.
+    La mise en page n'est pas modifiée ; le résultat reste compatible avec
+    les mises à jour partielles (`Patch`) des traces.
+    Args:
+        fig: Figure à encoder.
+        min_length: Longueur minimale des tableaux encodés.
+    Returns:
+        Dictionnaire {'data', 'layout'} accepté par `dcc.Graph`.
+    """
+    figure = fig.to_plotly_json()
+    figure['data'] = [_encode_arrays(trace, min_length) for trace in figure['data']]
+    return figure
@@ -1,30 +1,370 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple, Union
+
 import requests
-from typing import Union
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USGS_BASE_URL = "https://earthquake.usgs.gov/fdsnws/event/1"
+RAW_DATA_PATH = 'data/raw/earthquake_data.csv'
+CHUNK_DIR = 'data/raw/chunks'
+MANIFEST_NAME = 'manifest.json'
+# Magnitude minimale des séismes du catalogue
+MIN_MAGNITUDE = 4.5
+
+# Nombre maximal d'événements renvoyés par une requête de l'API USGS
+USGS_MAX_EVENTS = 20000
+# En dessous de cette durée, une fenêtre n'est plus découpée même si elle dépasse la limite
+MIN_WINDOW = timedelta(minutes=1)
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# L'API inclut `endtime` : les fenêtres [début, fin) s'arrêtent juste avant leur fin
+# (précision des dates USGS : la milliseconde)
+END_EXCLUSION = timedelta(milliseconds=1)
+
+Window = Tuple[datetime, datetime]
+
+
+def create_session(pool_size: int = 4, retries: int = 5, backoff_factor: float = 1.0) -> requests.Session:
+    """
+    Crée une session HTTP avec un pool de connexions et des tentatives automatiques
+    (backoff exponentiel) sur les erreurs réseau et les réponses 429/5xx.
+
+    :param pool_size: Nombre de connexions conservées dans le pool
+    :param retries: Nombre maximal de nouvelles tentatives par requête
+    :param backoff_factor: Facteur du backoff exponentiel entre deux tentatives (secondes)
+    :return: Session configurée
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _parse_time(value: Union[str, datetime]) -> datetime:
+    """
+    Convertit une date ISO 8601 ("YYYY-MM-DD" ou "YYYY-MM-DDTHH:MM:SS") en datetime.
+    """
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
 
-def fetch_earthquake_data(start_time: str, end_time: str, min_magnitude: Union[int, float]) -> None:
+def _query_params(
+    fmt: str,
+    start: datetime,
+    end: datetime,
+    min_magnitude: Union[int, float],
+    updated_after: Optional[datetime] = None,
+) -> dict:
+    """
+    Paramètres d'une requête `count` ou `query` de l'API USGS pour la fenêtre
+    semi-ouverte [start, end) : un événement daté exactement de `end` appartient
+    à la fenêtre suivante et n'est donc téléchargé qu'une fois.
+    """
+    last = end - END_EXCLUSION
+    params = {
+        "format": fmt,
+        "starttime": start.strftime(TIME_FORMAT),
+        "endtime": f"{last.strftime(TIME_FORMAT)}.{last.microsecond // 1000:03d}",
+        "minmagnitude": min_magnitude,
+    }
+    if updated_after is not None:
+        params["updatedafter"] = updated_after.strftime(TIME_FORMAT)
+    return params
+
+
+def count_earthquakes(
+    session: requests.Session,
+    start: datetime,
+    end: datetime,
+    min_magnitude: Union[int, float],
+    base_url: str = USGS_BASE_URL,
+    timeout: float = 30,
+    updated_after: Optional[datetime] = None,
+) -> Tuple[int, int]:
+    """
+    Interroge le point d'accès `count` de l'API USGS pour une fenêtre de temps.
+
+    :param updated_after: Ne compte que les événements modifiés après cette date
+    :return: (nombre d'événements, nombre maximal autorisé par requête)
+    """
+    params = _query_params("geojson", start, end, min_magnitude, updated_after)
+    response = session.get(f"{base_url}/count", params=params, timeout=timeout)
+    response.raise_for_status()
+    payload = response.json()
+    return int(payload["count"]), int(payload.get("maxAllowed", USGS_MAX_EVENTS))
+
+
+def plan_time_windows(
+    session: requests.Session,
+    start: datetime,
+    end: datetime,
+    min_magnitude: Union[int, float],
+    base_url: str = USGS_BASE_URL,
+    max_events: Optional[int] = None,
+    updated_after: Optional[datetime] = None,
+) -> List[Tuple[datetime, datetime, int]]:
+    """
+    Découpe [start, end) en fenêtres semi-ouvertes contiguës contenant chacune au plus
+    `max_events` événements, par dichotomie guidée par le point d'accès `count`.
+    Les périodes calmes restent donc en une seule fenêtre et les périodes
+    actives sont redécoupées autant que nécessaire.
+
+    :param max_events: Limite par fenêtre (par défaut celle annoncée par l'API)
+    :param updated_after: Ne retient que les événements modifiés après cette date
+    :return: Liste chronologique de (début, fin, nombre d'événements)
+    """
+    windows = []
+    pending = [(start, end)]
+    while pending:
+        w_start, w_end = pending.pop()
+        count, max_allowed = count_earthquakes(
+            session, w_start, w_end, min_magnitude, base_url, updated_after=updated_after
+        )
+        limit = max_events or max_allowed
+        if count > limit and w_end - w_start > MIN_WINDOW:
+            middle = w_start + (w_end - w_start) / 2
+            middle = middle.replace(microsecond=0)
+            # La fin de la première moitié est traitée en dernier (pile LIFO)
+            pending.append((middle, w_end))
+            pending.append((w_start, middle))
+        else:
+            if count > limit:
+                print(f"Warning: window {w_start} - {w_end} exceeds the API limit ({count} events).")
+            windows.append((w_start, w_end, count))
+    return sorted(windows)
+
+
+def _window_key(w_start: datetime, w_end: datetime) -> str:
+    return f"{w_start.strftime('%Y%m%dT%H%M%S')}_{w_end.strftime('%Y%m%dT%H%M%S')}"
+
+
+def _load_manifest(chunk_dir: str, query: dict) -> Optional[dict]:
+    """
+    Relit le manifeste d'un téléchargement précédent s'il porte sur la même requête.
+    """
+    path = os.path.join(chunk_dir, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("query") != query:
+        return None
+    return manifest
+
+
+def _save_manifest(chunk_dir: str, manifest: dict) -> None:
+    """
+    Écrit le manifeste de manière atomique (fichier temporaire puis renommage).
+    """
+    path = os.path.join(chunk_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def download_window(
+    session: requests.Session,
+    w_start: datetime,
+    w_end: datetime,
+    min_magnitude: Union[int, float],
+    path: str,
+    base_url: str = USGS_BASE_URL,
+    timeout: float = 120,
+    updated_after: Optional[datetime] = None,
+) -> None:
+    """
+    Télécharge une fenêtre au format CSV en écrivant la réponse sur disque au fil
+    de l'eau. Le fichier final n'apparaît qu'une fois le corps entièrement reçu.
+    """
+    params = _query_params("csv", w_start, w_end, min_magnitude, updated_after)
+    tmp_path = f"{path}.part"
+    with session.get(f"{base_url}/query", params=params, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(tmp_path, "wb") as f:
+            for block in response.iter_content(chunk_size=1 << 16):
+                f.write(block)
+    os.replace(tmp_path, path)
+
+
+def _assemble_chunks(paths: List[str], output_path: str) -> None:
+    """
+    Concatène les CSV des fenêtres (du plus récent au plus ancien, comme l'API)
+    en ne conservant que le premier en-tête.
+    """
+    tmp_path = f"{output_path}.part"
+    with open(tmp_path, "wb") as out:
+        header_written = False
+        for path in reversed(paths):
+            with open(path, "rb") as f:
+                header = f.readline()
+                if not header_written:
+                    out.write(header)
+                    header_written = True
+                shutil.copyfileobj(f, out)
+    os.replace(tmp_path, output_path)
+
+
+def fetch_earthquake_data(
+    start_time: str,
+    end_time: str,
+    min_magnitude: Union[int, float],
+    output_path: str = RAW_DATA_PATH,
+    chunk_dir: str = CHUNK_DIR,
+    base_url: str = USGS_BASE_URL,
+    max_workers: int = 4,
+    max_events: Optional[int] = None,
+) -> bool:
     """
     Télécharge les données de séismes au format CSV depuis l'API de l'USGS.
-    
+
+    La plage est découpée en fenêtres respectant la limite d'événements de l'API,
+    téléchargées en parallèle puis concaténées dans `output_path`. L'avancement est
+    consigné dans un manifeste de `chunk_dir` : relancer la même requête après une
+    interruption ne télécharge que les fenêtres manquantes.
+
     :param start_time: Date de début (format ISO 8601, ex. "YYYY-MM-DD")
-    :param end_time: Date de fin (format ISO 8601, ex. "YYYY-MM-DD")
+    :param end_time: Date de fin, exclue (format ISO 8601, ex. "YYYY-MM-DD")
     :param min_magnitude: Magnitude minimale des séismes à récupérer
-    :return: None
+    :param output_path: Fichier CSV de sortie
+    :param chunk_dir: Répertoire des fenêtres téléchargées et du manifeste
+    :param base_url: URL de base de l'API (modifiable pour pointer vers un serveur local)
+    :param max_workers: Nombre de téléchargements simultanés
+    :param max_events: Limite d'événements par fenêtre (par défaut celle de l'API)
+    :return: True si toutes les fenêtres ont été téléchargées
     """
-    url = "https://earthquake.usgs.gov/fdsnws/event/1/query"
-    params = {
-        "format": "csv",
-        "starttime": start_time,
-        "endtime": end_time,
-        "minmagnitude": min_magnitude
+    os.makedirs(chunk_dir, exist_ok=True)
+    query = {
+        "start_time": start_time,
+        "end_time": end_time,
+        "min_magnitude": min_magnitude,
+        "base_url": base_url,
     }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        with open('data/raw/earthquake_data.csv', 'wb') as f:
-            f.write(response.content)
-        print("Data downloaded successfully.")
-    else:
-        print("Failed to download data.")
+    session = create_session(pool_size=max_workers)
+    try:
+        manifest = _load_manifest(chunk_dir, query)
+        if manifest is None:
+            planned = plan_time_windows(
+                session, _parse_time(start_time), _parse_time(end_time),
+                min_magnitude, base_url, max_events
+            )
+            manifest = {
+                "query": query,
+                "windows": [
+                    {
+                        "start": w_start.strftime(TIME_FORMAT),
+                        "end": w_end.strftime(TIME_FORMAT),
+                        "count": count,
+                        "file": f"{_window_key(w_start, w_end)}.csv",
+                        "done": False,
+                    }
+                    for w_start, w_end, count in planned
+                ],
+            }
+            _save_manifest(chunk_dir, manifest)
+
+        lock = threading.Lock()
+        todo = [
+            w for w in manifest["windows"]
+            if not (w["done"] and os.path.isfile(os.path.join(chunk_dir, w["file"])))
+        ]
+
+        def _download(window: dict) -> None:
+            download_window(
+                session, _parse_time(window["start"]), _parse_time(window["end"]),
+                min_magnitude, os.path.join(chunk_dir, window["file"]), base_url
+            )
+            with lock:
+                window["done"] = True
+                _save_manifest(chunk_dir, manifest)
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_download, w): w for w in todo}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except requests.RequestException as exc:
+                    failed += 1
+                    window = futures[future]
+                    print(f"Failed to download window {window['start']} - {window['end']}: {exc}")
+    except requests.RequestException as exc:
+        print(f"Failed to download data: {exc}")
+        return False
+    finally:
+        session.close()
+
+    if failed:
+        print(f"Failed to download data ({failed} windows missing, rerun to resume).")
+        return False
+    _assemble_chunks([os.path.join(chunk_dir, w["file"]) for w in manifest["windows"]], output_path)
+    print("Data downloaded successfully.")
+    return True
+
+
+def fetch_updated_events(
+    updated_after: datetime,
+    start_time: Union[str, datetime],
+    min_magnitude: Union[int, float],
+    output_path: str,
+    base_url: str = USGS_BASE_URL,
+    end_time: Optional[datetime] = None,
+    max_events: Optional[int] = None,
+) -> int:
+    """
+    Télécharge les seuls événements créés ou modifiés après `updated_after`
+    (paramètre `updatedafter` de l'API), quelle que soit leur date d'origine
+    à partir de `start_time`. Sert au rafraîchissement incrémental du store.
+
+    :param updated_after: Date de la révision la plus récente déjà connue
+    :param start_time: Début de la plage d'origine couverte par le catalogue
+    :param min_magnitude: Magnitude minimale des séismes à récupérer
+    :param output_path: Fichier CSV de sortie (écrit seulement s'il y a des événements)
+    :param base_url: URL de base de l'API (modifiable pour pointer vers un serveur local)
+    :param end_time: Fin de la plage d'origine (maintenant par défaut)
+    :param max_events: Limite d'événements par fenêtre (par défaut celle de l'API)
+    :return: Nombre d'événements téléchargés
+    :raises requests.RequestException: si l'API reste injoignable
+    """
+    end_time = end_time or datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    session = create_session(pool_size=1)
+    try:
+        windows = plan_time_windows(
+            session, _parse_time(start_time), end_time, min_magnitude, base_url,
+            max_events, updated_after=updated_after
+        )
+        windows = [w for w in windows if w[2]]
+        if not windows:
+            return 0
+        output_dir = os.path.dirname(output_path) or "."
+        os.makedirs(output_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+            paths = []
+            for w_start, w_end, _ in windows:
+                path = os.path.join(tmp_dir, f"{_window_key(w_start, w_end)}.csv")
+                download_window(session, w_start, w_end, min_magnitude, path, base_url,
+                                updated_after=updated_after)
+                paths.append(path)
+            _assemble_chunks(paths, output_path)
+    finally:
+        session.close()
+    return sum(count for _, _, count in windows)
 
 
 if __name__ == "__main__":
-    fetch_earthquake_data("2024-01-01", "2024-11-26", 4.5)
+    fetch_earthquake_data("2024-01-01", "2024-11-26", MIN_MAGNITUDE)
@@ -0,0 +1,347 @@
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Nombre de plages de magnitude récentes dont la vue filtrée est conservée
+VIEW_CACHE_SIZE = 64
+# Largeur des classes de l'histogramme des magnitudes (pas du slider)
+HISTOGRAM_BIN_WIDTH = 0.1
+# Classes de profondeur (libellé, borne supérieure exclue en km)
+DEPTH_CLASSES = (('Superficiels (< 70 km)', 70.0),
+                 ('Intermédiaires (70-300 km)', 300.0),
+                 ('Profonds (≥ 300 km)', np.inf))
+# Périodes de la lecture animée : durée d'une image
+PLAYBACK_PERIODS = {'D': np.timedelta64(1, 'D'), 'W': np.timedelta64(7, 'D')}
+
+
+def seismic_energy(mags: np.ndarray) -> np.ndarray:
+    """
+    Énergie sismique rayonnée (joules) selon la relation de Gutenberg–Richter,
+    log10(E) = 1.5 M + 4.8.
+    """
+    return 10 ** (1.5 * np.asarray(mags, dtype=np.float64) + 4.8)
+
+
+def _prefix_sum(values: np.ndarray) -> np.ndarray:
+    """
+    Sommes cumulées précédées d'un zéro : la somme de values[start:stop] vaut
+    prefix[stop] - prefix[start].
+    """
+    prefix = np.zeros(len(values) + 1, dtype=np.int64 if values.dtype == bool else np.float64)
+    np.cumsum(values, out=prefix[1:])
+    return prefix
+
+
+class MagnitudeIndex:
+    """
+    Index des séismes trié par magnitude.
+
+    Le DataFrame est trié une fois pour toutes par `mag` : une plage de
+    magnitudes correspond alors à un intervalle contigu de lignes, trouvé par
+    recherche dichotomique et renvoyé comme une tranche sans copie. Les vues
+    des dernières plages demandées sont mises en cache (le slider avance par
+    pas de 0.1 et l'utilisateur revient souvent sur les mêmes valeurs).
+
+    L'histogramme des magnitudes est pré-agrégé : pour chaque borne de classe
+    (pas de 0.1), on retient le nombre cumulé d'événements situés en dessous.
+    Une plage de magnitudes se traduit alors en comptes par classe en O(#classes).
+
+    De même, les indicateurs de la barre latérale (moyenne, énergie libérée,
+    répartition par profondeur) sont tirés de sommes cumulées dans l'ordre des
+    magnitudes : deux lectures par indicateur, quelle que soit la taille de la plage.
+    """
+
+    def __init__(self, df: pd.DataFrame, cache_size: int = VIEW_CACHE_SIZE,
+                 bin_width: float = HISTOGRAM_BIN_WIDTH, presorted: bool = False,
+                 precomputed: Optional[Dict[str, np.ndarray]] = None,
+                 on_cache_access: Optional[Callable[[bool], None]] = None):
+        """
+        Args:
+            df: DataFrame contenant une colonne 'mag'.
+            cache_size: Nombre de vues conservées dans le cache LRU.
+            bin_width: Largeur des classes de l'histogramme.
+            presorted: `df` est déjà trié par magnitude avec un index 0..n-1
+                (il est alors utilisé tel quel, sans copie).
+            precomputed: Tableaux déjà calculés (voir `arrays()`), par exemple
+                relus depuis un instantané partagé.
+            on_cache_access: Appelée à chaque lecture de `view` (True si la vue
+                était en cache), par exemple pour les métriques.
+        """
+        precomputed = precomputed or {}
+        if presorted:
+            self.df: pd.DataFrame = df
+        else:
+            self.df = df.sort_values('mag', kind='stable').reset_index(drop=True)
+        self.mags: np.ndarray = self.df['mag'].to_numpy()
+        self._cached_view = lru_cache(maxsize=cache_size)(self._view)
+        self.on_cache_access = on_cache_access
+        # Échec du cache pendant l'appel en cours (propre à chaque thread)
+        self._view_access = threading.local()
+
+        # Bornes de classes englobant toutes les magnitudes (une classe vide de chaque côté
+        # absorbe les arrondis float32) et nombre cumulé d'événements sous chaque borne
+        self.bin_width = bin_width
+        if len(self.mags):
+            first = int(np.floor(self.mags[0] / bin_width)) - 1
+            last = int(np.ceil(self.mags[-1] / bin_width)) + 1
+        else:
+            first, last = 0, 1
+        scale = round(1 / bin_width)
+        self.bin_edges: np.ndarray = (np.arange(first, last + 1) / scale).astype(self.mags.dtype)
+        if 'bin_cumulative' in precomputed:
+            self.bin_cumulative: np.ndarray = precomputed['bin_cumulative']
+        else:
+            self.bin_cumulative = np.searchsorted(self.mags, self.bin_edges, side='left')
+
+        # Sommes cumulées des indicateurs (l'ordre croissant des magnitudes garde la
+        # différence de deux préfixes précise : les plus fortes valeurs viennent en dernier)
+        if 'mag_prefix' in precomputed:
+            self.mag_prefix: np.ndarray = precomputed['mag_prefix']
+            self.energy_prefix: np.ndarray = precomputed['energy_prefix']
+        else:
+            self.mag_prefix = _prefix_sum(self.mags.astype(np.float64))
+            self.energy_prefix = _prefix_sum(seismic_energy(self.mags))
+        self.depth_class: Optional[np.ndarray] = None
+        self.depth_prefix: Optional[np.ndarray] = None
+        if 'depth_class' in precomputed:
+            self.depth_class, self.depth_prefix = precomputed['depth_class'], precomputed['depth_prefix']
+        elif 'depth' in self.df:
+            upper_bounds = np.array([upper for _, upper in DEPTH_CLASSES])
+            # Profondeur inconnue (NaN) : hors de toute classe
+            self.depth_class = np.searchsorted(
+                upper_bounds, self.df['depth'].to_numpy(), side='right'
+            ).astype(np.int8)
+            self.depth_prefix = np.stack([
+                _prefix_sum(self.depth_class == i) for i in range(len(DEPTH_CLASSES))
+            ])
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Tableaux pré-agrégés (histogramme, sommes cumulées), à publier avec
+        l'instantané partagé et à repasser à `precomputed`.
+        """
+        arrays = {'bin_cumulative': self.bin_cumulative, 'mag_prefix': self.mag_prefix,
+                  'energy_prefix': self.energy_prefix}
+        if self.depth_class is not None:
+            arrays.update(depth_class=self.depth_class, depth_prefix=self.depth_prefix)
+        return arrays
+
+    @staticmethod
+    def _normalize(mag_low: float, mag_high: float) -> Tuple[float, float]:
+        # Les valeurs du slider peuvent porter du bruit flottant (4.699999...)
+        return round(float(mag_low), 2), round(float(mag_high), 2)
+
+    def bounds(self, mag_low: float, mag_high: float) -> Tuple[int, int]:
+        """
+        Positions [début, fin) des lignes dont la magnitude est dans [mag_low, mag_high].
+        Les bornes sont converties au type de la colonne (float32) pour ne pas
+        exclure les valeurs limites.
+        """
+        low, high = np.asarray(self._normalize(mag_low, mag_high), dtype=self.mags.dtype)
+        start = int(np.searchsorted(self.mags, low, side='left'))
+        stop = int(np.searchsorted(self.mags, high, side='right'))
+        return start, max(start, stop)
+
+    def _view(self, mag_low: float, mag_high: float) -> pd.DataFrame:
+        self._view_access.missed = True
+        start, stop = self.bounds(mag_low, mag_high)
+        return self.df.iloc[start:stop]
+
+    def view(self, mag_low: float, mag_high: float) -> pd.DataFrame:
+        """
+        Sous-ensemble des séismes dont la magnitude est dans [mag_low, mag_high].
+        Returns:
+            Tranche (sans copie) du DataFrame trié, à ne pas modifier.
+        """
+        self._view_access.missed = False
+        view = self._cached_view(*self._normalize(mag_low, mag_high))
+        if self.on_cache_access is not None:
+            self.on_cache_access(not self._view_access.missed)
+        return view
+
+    def cache_info(self):
+        """
+        Statistiques (succès, échecs, taille) du cache des vues.
+        """
+        return self._cached_view.cache_info()
+
+    def _trim_histogram(self, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Restreint l'histogramme aux classes comprises entre la première et la dernière non vide
+        nonzero = np.flatnonzero(counts)
+        if not len(nonzero):
+            return self.bin_edges[:0], counts[:0]
+        first, last = nonzero[0], nonzero[-1] + 1
+        return self.bin_edges[first:last], counts[first:last]
+
+    def histogram(self, mag_low: float, mag_high: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Histogramme des magnitudes de la plage [mag_low, mag_high], calculé à partir
+        des comptes cumulés (sans parcourir les événements).
+        Returns:
+            (bornes gauches des classes, nombre d'événements par classe), restreints
+            aux classes comprises entre la première et la dernière classe non vide.
+        """
+        start, stop = self.bounds(mag_low, mag_high)
+        return self._trim_histogram(np.diff(np.clip(self.bin_cumulative, start, stop)))
+
+    def histogram_at(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Histogramme des magnitudes d'un sous-ensemble de positions croissantes
+        (ex. plage de magnitudes restreinte à une période) : une recherche
+        dichotomique par borne de classe, sans relire les magnitudes.
+        """
+        return self._trim_histogram(np.diff(np.searchsorted(positions, self.bin_cumulative)))
+
+    def summary(self, mag_low: float, mag_high: float) -> Dict[str, object]:
+        """
+        Indicateurs de la plage [mag_low, mag_high], calculés en O(log n) à partir
+        des sommes cumulées (sans parcourir les événements).
+        Returns:
+            {'count', 'mag_mean', 'mag_min', 'mag_max', 'energy' (joules)} et, si la
+            profondeur est disponible, 'depth_classes' ({libellé: nombre d'événements}).
+            Les magnitudes valent None si la plage est vide.
+        """
+        start, stop = self.bounds(mag_low, mag_high)
+        depth_counts = None
+        if self.depth_prefix is not None:
+            depth_counts = self.depth_prefix[:, stop] - self.depth_prefix[:, start]
+        return self._summary(
+            stop - start, start, stop - 1, self.mag_prefix[stop] - self.mag_prefix[start],
+            self.energy_prefix[stop] - self.energy_prefix[start], depth_counts
+        )
+
+    def summary_at(self, positions: np.ndarray) -> Dict[str, object]:
+        """
+        Indicateurs d'un sous-ensemble de positions croissantes (mêmes clés que
+        `summary`), en O(taille du sous-ensemble).
+        """
+        mags = self.mags[positions].astype(np.float64)
+        depth_counts = None
+        if self.depth_class is not None:
+            depth_counts = np.bincount(self.depth_class[positions], minlength=len(DEPTH_CLASSES) + 1)
+        first, last = (int(positions[0]), int(positions[-1])) if len(positions) else (0, 0)
+        return self._summary(len(positions), first, last, mags.sum(), seismic_energy(mags).sum(), depth_counts)
+
+    def _summary(self, count: int, first: int, last: int, mag_sum: float, energy: float,
+                 depth_counts: Optional[np.ndarray]) -> Dict[str, object]:
+        # Positions croissantes dans l'ordre des magnitudes : min en `first`, max en `last`
+        summary: Dict[str, object] = {
+            'count': count,
+            'mag_mean': float(mag_sum) / count if count else None,
+            'mag_min': float(self.mags[first]) if count else None,
+            'mag_max': float(self.mags[last]) if count else None,
+            'energy': float(energy),
+        }
+        if depth_counts is not None:
+            summary['depth_classes'] = {
+                label: int(n) for (label, _), n in zip(DEPTH_CLASSES, depth_counts)
+            }
+        return summary
+
+
+class TimeIndex:
+    """
+    Index temporel des séismes, aligné sur l'ordre des magnitudes.
+
+    `order` liste les positions du DataFrame trié par magnitude par date
+    croissante et `rank` en est l'inverse : une période est un intervalle
+    [i, j) de rangs, trouvé par recherche dichotomique dans `times`. Croisée
+    avec une plage de magnitudes (intervalle de positions), la sélection ne
+    parcourt que le plus petit des deux intervalles.
+
+    Pour la lecture animée, les images (jour, semaine) sont précalculées sous
+    forme de bornes de rangs : une image est une tranche de `order`.
+    """
+
+    def __init__(self, times: np.ndarray,
+                 precomputed: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None):
+        """
+        Args:
+            times: Dates des événements (datetime64, ordre des magnitudes).
+            precomputed: (`order`, `rank`, `times` triés) déjà calculés,
+                par exemple relus depuis un instantané partagé.
+        """
+        if precomputed is not None:
+            self.order, self.rank, self.times = precomputed
+        else:
+            times = np.asarray(times, dtype='datetime64[ns]')
+            # Les dates manquantes (NaT) sont rangées en dernier
+            self.order = np.argsort(times, kind='stable')
+            self.rank = np.empty_like(self.order)
+            self.rank[self.order] = np.arange(len(self.order))
+            self.times = times[self.order]
+        self.n_dated = int(np.searchsorted(self.times, np.datetime64('NaT', 'ns'), side='left'))
+        self._frame_offsets = lru_cache(maxsize=len(PLAYBACK_PERIODS))(self._compute_frame_offsets)
+
+    @property
+    def span(self) -> Tuple[Optional[np.datetime64], Optional[np.datetime64]]:
+        """
+        Première et dernière date connues (None si aucune).
+        """
+        if not self.n_dated:
+            return None, None
+        return self.times[0], self.times[self.n_dated - 1]
+
+    def bounds(self, start: Optional[np.datetime64], end: Optional[np.datetime64]) -> Tuple[int, int]:
+        """
+        Rangs [i, j) des événements datés dans [start, end) (bornes None : ouvertes).
+        """
+        i = 0 if start is None else int(np.searchsorted(self.times, np.datetime64(start, 'ns'), side='left'))
+        j = self.n_dated if end is None else int(np.searchsorted(self.times, np.datetime64(end, 'ns'), side='left'))
+        return i, max(i, j)
+
+    def select(self, time_bounds: Tuple[int, int], mag_bounds: Tuple[int, int]) -> np.ndarray:
+        """
+        Positions (croissantes, ordre des magnitudes) des événements dont le rang
+        temporel est dans `time_bounds` et la position dans `mag_bounds`.
+        """
+        i, j = time_bounds
+        start, stop = mag_bounds
+        if j - i < stop - start:
+            positions = self.order[i:j]
+            positions = np.sort(positions[(positions >= start) & (positions < stop)])
+        else:
+            ranks = self.rank[start:stop]
+            positions = start + np.flatnonzero((ranks >= i) & (ranks < j))
+        return positions
+
+    def _compute_frame_offsets(self, period: str) -> Tuple[np.ndarray, np.ndarray]:
+        first, last = self.span
+        if first is None:
+            return np.empty(0, dtype='datetime64[D]'), np.zeros(1, dtype=np.int64)
+        step = PLAYBACK_PERIODS[period]
+        origin = first.astype('datetime64[D]')
+        n_frames = int((last.astype('datetime64[D]') - origin) // step) + 1
+        edges = origin + step * np.arange(n_frames + 1)
+        return edges, np.searchsorted(self.times, edges.astype('datetime64[ns]'), side='left')
+
+    def frames(self, period: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Images de la lecture animée pour une période ('D' ou 'W').
+        Returns:
+            (dates de début des images et date de fin de la dernière,
+             rangs de début de chaque image et rang de fin de la dernière)
+        """
+        return self._frame_offsets(period)
+
+    def frame_bounds(self, period: str, frame: int) -> Tuple[int, int]:
+        """
+        Rangs [i, j) des événements de l'image `frame`.
+        """
+        _, offsets = self.frames(period)
+        frame = min(max(frame, 0), len(offsets) - 2)
+        return int(offsets[frame]), int(offsets[frame + 1])
+
+    def frame_range(self, period: str, start: Optional[np.datetime64],
+                    end: Optional[np.datetime64]) -> Tuple[int, int]:
+        """
+        Images [première, dernière) qui commencent dans [start, end).
+        """
+        edges, _ = self.frames(period)
+        n_frames = len(edges) - 1
+        first = 0 if start is None else int(np.searchsorted(edges[:-1], np.datetime64(start, 'D'), side='left'))
+        last = n_frames if end is None else int(np.searchsorted(edges[:-1], np.datetime64(end, 'D'), side='left'))
+        return first, max(first, last)
@@ -0,0 +1,363 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from dash import ctx
+from dash.exceptions import PreventUpdate
+from flask import Flask, Response, g, has_request_context
+
+# Bornes des histogrammes de durée (secondes) et de taille des réponses (octets)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7)
+# Profilage par échantillonnage des requêtes lentes : seuil en millisecondes (désactivé si absent)
+PROFILE_SLOW_MS_ENV = 'EARTHQUAKE_PROFILE_SLOW_MS'
+PROFILE_DIR_ENV = 'EARTHQUAKE_PROFILE_DIR'
+PROFILE_DIR = 'profiles'
+# Période d'échantillonnage des piles d'appels (secondes)
+PROFILE_INTERVAL = 0.005
+# Phase ajoutée pour la sérialisation de la réponse par Dash (après le retour du callback)
+SERIALIZATION_PHASE = 'serialization'
+
+
+class Histogram:
+    """
+    Histogramme cumulatif à bornes fixes (format Prometheus) : nombre
+    d'observations sous chaque borne, somme et nombre total.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        Paires (borne 'le', nombre cumulé), la dernière borne étant '+Inf'.
+        """
+        total, pairs = 0, []
+        for bound, count in zip([*map(_format_number, self.buckets), '+Inf'], self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _labels(**labels: str) -> str:
+    escaped = (
+        key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _stack(frame) -> Tuple[str, ...]:
+    """
+    Pile d'appels d'une frame, de la racine vers la fonction en cours
+    (une entrée par fonction : le profil agrège les lignes d'une même fonction).
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage pour les requêtes lentes : un thread relève
+    périodiquement la pile d'appels des callbacks en cours ; si un callback
+    dépasse le seuil, ses piles sont écrites au format « folded » (une ligne
+    `fonction;fonction;... nombre` par pile, lisible par flamegraph.pl ou speedscope).
+    """
+
+    def __init__(self, threshold: float, output_dir: str = PROFILE_DIR,
+                 interval: float = PROFILE_INTERVAL):
+        """
+        Args:
+            threshold: Durée (secondes) au-delà de laquelle le profil est écrit.
+            output_dir: Répertoire des profils.
+            interval: Période d'échantillonnage (secondes).
+        """
+        self.threshold = threshold
+        self.output_dir = output_dir
+        self.interval = interval
+        self.written = 0
+        self._samples: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Commence l'échantillonnage du thread courant.
+        """
+        with self._lock:
+            self._samples[threading.get_ident()] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="callback-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, name: str, seconds: float) -> Optional[str]:
+        """
+        Arrête l'échantillonnage du thread courant et écrit le profil s'il a été lent.
+        Returns:
+            Chemin du profil écrit, ou None.
+        """
+        with self._lock:
+            samples = self._samples.pop(threading.get_ident(), None)
+        if not samples or seconds < self.threshold:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        path = os.path.join(self.output_dir, f"{stamp}-{name}-{seconds * 1000:.0f}ms.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        self.written += 1
+        return path
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._samples:
+                    # Plus aucun callback en cours : le thread sera relancé au prochain
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, samples in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_stack(frame)] += 1
+            time.sleep(self.interval)
+
+
+def profiler_from_env() -> Optional[SamplingProfiler]:
+    """
+    Profileur des requêtes lentes configuré par EARTHQUAKE_PROFILE_SLOW_MS
+    (seuil en millisecondes) et EARTHQUAKE_PROFILE_DIR, ou None s'il n'est pas activé.
+    """
+    threshold_ms = os.environ.get(PROFILE_SLOW_MS_ENV)
+    if not threshold_ms:
+        return None
+    return SamplingProfiler(float(threshold_ms) / 1000, os.environ.get(PROFILE_DIR_ENV, PROFILE_DIR))
+
+
+class CallbackMetrics:
+    """
+    Instrumentation des callbacks Dash : durée totale et par phase (filtrage,
+    construction de la figure, sérialisation), taille de la réponse, entrée
+    déclenchante, erreurs et taux de succès des caches. Les mesures sont
+    agrégées en histogrammes, exposés au format texte Prometheus par la route
+    `/metrics` (voir `register_server`).
+
+    Les compteurs sont propres à chaque processus : avec plusieurs workers,
+    chacun expose les siens.
+    """
+
+    def __init__(self, profiler: Optional[SamplingProfiler] = None):
+        """
+        Args:
+            profiler: Profileur des requêtes lentes (optionnel).
+        """
+        self.profiler = profiler
+        self.durations: Dict[str, Histogram] = {}
+        self.phases: Dict[Tuple[str, str], Histogram] = {}
+        self.payloads: Dict[str, Histogram] = {}
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.cache: Counter = Counter()
+        self._sources: List[Callable[[], Dict[str, Dict[str, float]]]] = []
+        self._lock = threading.Lock()
+        self._current = threading.local()
+
+    def _observe(self, table: dict, key, buckets: Tuple[float, ...], value: float) -> None:
+        with self._lock:
+            histogram = table.get(key)
+            if histogram is None:
+                histogram = table[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def instrument(self, name: Optional[str] = None) -> Callable:
+        """
+        Décorateur d'un callback (à placer sous `@callback`) : mesure chaque appel.
+        Args:
+            name: Nom du callback dans les métriques (nom de la fonction par défaut).
+        """
+        def decorator(func: Callable) -> Callable:
+            label = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                self._current.name = label
+                if self.profiler is not None:
+                    self.profiler.start()
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except PreventUpdate:
+                    raise
+                except Exception:
+                    with self._lock:
+                        self.errors[label] += 1
+                    raise
+                finally:
+                    end = time.perf_counter()
+                    self._current.name = None
+                    self._observe(self.durations, label, DURATION_BUCKETS, end - start)
+                    with self._lock:
+                        self.calls[(label, _trigger())] += 1
+                    if self.profiler is not None:
+                        self.profiler.stop(label, end - start)
+                    if has_request_context():
+                        # La réponse est sérialisée par Dash après le retour du callback
+                        g.metrics_callback = (label, end)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Chronomètre une phase du callback en cours (ex. 'filter', 'figure').
+        Sans callback instrumenté en cours, le bloc s'exécute sans mesure.
+        """
+        label = getattr(self._current, 'name', None)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if label is not None:
+                self._observe(self.phases, (label, name), DURATION_BUCKETS, time.perf_counter() - start)
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        """
+        Compte un accès à un cache (succès ou échec).
+        """
+        with self._lock:
+            self.cache[(cache, 'hit' if hit else 'miss')] += 1
+
+    def register_source(self, source: Callable[[], Dict[str, Dict[str, float]]]) -> None:
+        """
+        Ajoute une source de mesures lues au moment de l'export : fonction renvoyant
+        {'caches': {nom: (succès, échecs)}, 'gauges': {nom: valeur}} (clés optionnelles),
+        par exemple les statistiques d'un cache `lru_cache`.
+        """
+        self._sources.append(source)
+
+    def record_response(self, response: Response) -> Response:
+        """
+        Complète la mesure d'un callback avec la taille de sa réponse et la durée
+        de sérialisation (hook `after_request` du serveur Flask).
+        """
+        measured = g.pop('metrics_callback', None)
+        if measured is not None and not response.direct_passthrough:
+            label, end = measured
+            self._observe(self.phases, (label, SERIALIZATION_PHASE), DURATION_BUCKETS,
+                          time.perf_counter() - end)
+            self._observe(self.payloads, label, PAYLOAD_BUCKETS, len(response.get_data()))
+        return response
+
+    def render(self) -> str:
+        """
+        Export des métriques au format texte Prometheus.
+        """
+        lines: List[str] = []
+
+        def histogram_lines(metric: str, help_text: str, table: dict, label_names: Tuple[str, ...]) -> None:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for key, histogram in sorted(table.items()):
+                labels = dict(zip(label_names, key if isinstance(key, tuple) else (key,)))
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{metric}_bucket{_labels(**labels, le=bound)} {count}")
+                lines.append(f"{metric}_sum{_labels(**labels)} {histogram.sum!r}")
+                lines.append(f"{metric}_count{_labels(**labels)} {histogram.count}")
+
+        caches = Counter()
+        gauges: Dict[str, float] = {}
+        for source in self._sources:
+            values = source()
+            for cache, (hits, misses) in values.get('caches', {}).items():
+                caches[(cache, 'hit')] += hits
+                caches[(cache, 'miss')] += misses
+            gauges.update(values.get('gauges', {}))
+
+        with self._lock:
+            histogram_lines("dashboard_callback_seconds", "Durée des callbacks.",
+                            self.durations, ('callback',))
+            histogram_lines("dashboard_callback_phase_seconds", "Durée des phases des callbacks.",
+                            self.phases, ('callback', 'phase'))
+            histogram_lines("dashboard_callback_payload_bytes", "Taille des réponses des callbacks.",
+                            self.payloads, ('callback',))
+            lines.append("# HELP dashboard_callback_calls_total Appels par callback et entrée déclenchante.")
+            lines.append("# TYPE dashboard_callback_calls_total counter")
+            for (label, trigger), count in sorted(self.calls.items()):
+                lines.append(f"dashboard_callback_calls_total{_labels(callback=label, trigger=trigger)} {count}")
+            lines.append("# HELP dashboard_callback_errors_total Exceptions levées par callback.")
+            lines.append("# TYPE dashboard_callback_errors_total counter")
+            for label, count in sorted(self.errors.items()):
+                lines.append(f"dashboard_callback_errors_total{_labels(callback=label)} {count}")
+            caches.update(self.cache)
+
+        lines.append("# HELP dashboard_cache_requests_total Accès aux caches (succès ou échec).")
+        lines.append("# TYPE dashboard_cache_requests_total counter")
+        for (cache, result), count in sorted(caches.items()):
+            lines.append(f"dashboard_cache_requests_total{_labels(cache=cache, result=result)} {count}")
+        lines.append("# HELP dashboard_cache_hit_ratio Part des accès servis par le cache.")
+        lines.append("# TYPE dashboard_cache_hit_ratio gauge")
+        for cache in sorted({cache for cache, _ in caches}):
+            total = caches[(cache, 'hit')] + caches[(cache, 'miss')]
+            if total:
+                lines.append(f"dashboard_cache_hit_ratio{_labels(cache=cache)} {caches[(cache, 'hit')] / total!r}")
+        if self.profiler is not None:
+            gauges['profiles_written'] = self.profiler.written
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE dashboard_{name} gauge")
+            lines.append(f"dashboard_{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def register_server(self, server: Flask, route: str = '/metrics') -> None:
+        """
+        Branche la mesure des réponses sur le serveur Flask et y ajoute la route d'export.
+        """
+        server.after_request(self.record_response)
+        server.add_url_rule(
+            route, 'metrics',
+            lambda: Response(self.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+        )
+
+
+def _trigger() -> str:
+    """
+    Identifiant de l'entrée ayant déclenché le callback en cours ('initial' au chargement).
+    """
+    try:
+        triggered = ctx.triggered_id
+    except Exception:
+        # Appel hors d'une requête Dash (ex. tests, benchmarks)
+        return 'none'
+    if triggered is None:
+        return 'initial'
+    return triggered if isinstance(triggered, str) else str(triggered)
+
+
+callback_metrics = CallbackMetrics(profiler_from_env())
@@ -0,0 +1,169 @@
+import os
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+import pandas as pd
+import requests
+
+from src.utils import column_store
+from src.utils.clean_data import clean_earthquake_data
+from src.utils.data_provider import DataProvider, provider
+from src.utils.get_data import MIN_MAGNITUDE, USGS_BASE_URL, fetch_updated_events
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : pas de verrous de fichiers POSIX, chaque processus rafraîchit sans verrou
+    fcntl = None
+
+# Période de rafraîchissement en secondes (0 ou absent : pas de rafraîchissement)
+REFRESH_INTERVAL_ENV = 'EARTHQUAKE_REFRESH_INTERVAL'
+# URL de l'API interrogée (modifiable pour pointer vers un serveur local)
+REFRESH_BASE_URL_ENV = 'EARTHQUAKE_USGS_URL'
+# CSV temporaire des événements nouveaux ou modifiés
+UPDATES_PATH = 'data/raw/earthquake_updates.csv'
+
+
+@contextmanager
+def _refresh_lock(store_path: str) -> Iterator[bool]:
+    """
+    Verrou exclusif non bloquant du rafraîchissement d'un store : indique s'il a
+    été obtenu (toujours vrai sans verrous de fichiers POSIX).
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(f"{store_path}.refresh.lock", 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class DataRefresher:
+    """
+    Rafraîchissement incrémental en arrière-plan.
+
+    À chaque période, seuls les événements modifiés après la révision la plus
+    récente du store (`updated`, lue dans le manifeste) sont demandés à l'API,
+    fusionnés dans le store, puis le fournisseur reconstruit les index dans ce
+    thread et substitue atomiquement la nouvelle version du jeu de données.
+    Un verrou de fichier garantit qu'un seul processus rafraîchit un store donné ;
+    les autres workers (hors mode partagé) rechargent le store dès qu'il a changé.
+    Sans verrous de fichiers POSIX (Windows), le rafraîchissement se fait sans
+    verrou : n'y lancer qu'un seul processus rafraîchisseur par store.
+    """
+
+    def __init__(self, data_provider: DataProvider, interval: float,
+                 min_magnitude: float = MIN_MAGNITUDE, base_url: str = USGS_BASE_URL,
+                 updates_path: str = UPDATES_PATH):
+        """
+        Args:
+            data_provider: Fournisseur dont le jeu de données est remplacé.
+            interval: Période entre deux rafraîchissements (secondes).
+            min_magnitude: Magnitude minimale des événements demandés.
+            base_url: URL de base de l'API USGS.
+            updates_path: CSV temporaire des événements téléchargés.
+        """
+        self.provider = data_provider
+        self.interval = interval
+        self.min_magnitude = min_magnitude
+        self.base_url = base_url
+        self.updates_path = updates_path
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh_once(self) -> Tuple[int, int]:
+        """
+        Effectue un rafraîchissement (ignoré si un autre processus est en train de
+        le faire), puis, hors mode partagé, recharge le jeu de données si le store a
+        été modifié depuis son chargement, y compris par le rafraîchisseur d'un autre worker.
+        Returns:
+            (nombre d'événements ajoutés, nombre d'événements mis à jour)
+        """
+        store_path = self.provider.store_path
+        if not column_store.store_exists(store_path):
+            # Premier chargement : construit le store à partir du CSV nettoyé
+            self.provider.get()
+        added = updated = 0
+        with _refresh_lock(store_path) as acquired:
+            if acquired:
+                added, updated = self._refresh(store_path)
+        if self.provider.shared_root:
+            # Mode partagé : seul le processus qui a fusionné publie, les autres s'attachent
+            if added or updated:
+                self.provider.reload()
+        elif self.provider.store_changed():
+            self.provider.reload()
+        return added, updated
+
+    def _refresh(self, store_path: str) -> Tuple[int, int]:
+        stats = column_store.store_statistics(store_path)['columns']
+        if 'updated' not in stats or 'time' not in stats:
+            return 0, 0
+        updated_after = pd.Timestamp(stats['updated']['max']).floor('s').to_pydatetime()
+        start_time = pd.Timestamp(stats['time']['min']).floor('D').to_pydatetime()
+        n_events = fetch_updated_events(
+            updated_after, start_time, self.min_magnitude, self.updates_path, self.base_url
+        )
+        if not n_events:
+            return 0, 0
+        try:
+            return clean_earthquake_data(raw_path=self.updates_path, store_path=store_path)
+        finally:
+            os.remove(self.updates_path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh_once()
+            except requests.RequestException as exc:
+                print(f"Data refresh failed: {exc}")
+            except Exception:
+                # Toute autre erreur est consignée sans arrêter les rafraîchissements suivants
+                print("Data refresh failed:")
+                traceback.print_exc()
+
+    def start(self) -> threading.Thread:
+        """
+        Lance les rafraîchissements périodiques dans un thread démon.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="data-refresher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Arrête les rafraîchissements (le rafraîchissement en cours se termine).
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def refresher_from_env(data_provider: DataProvider = provider) -> Optional[DataRefresher]:
+    """
+    Rafraîchisseur configuré par les variables d'environnement, ou None s'il est désactivé.
+    """
+    interval = float(os.environ.get(REFRESH_INTERVAL_ENV) or 0)
+    if interval <= 0:
+        return None
+    return DataRefresher(data_provider, interval,
+                         base_url=os.environ.get(REFRESH_BASE_URL_ENV) or USGS_BASE_URL)
+
+
+if __name__ == "__main__":
+    # Rafraîchisseur autonome, ex. à côté de workers en mode partagé
+    refresher = refresher_from_env()
+    if refresher is None:
+        raise SystemExit(f"Set {REFRESH_INTERVAL_ENV} to the refresh period in seconds.")
+    print(f"Refreshing every {refresher.interval:g} s (Ctrl+C to stop).")
+    refresher.start().join()
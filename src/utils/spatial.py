@@ -0,0 +1,471 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# Niveau de grille le plus fin (correspond au niveau de zoom Mapbox)
+GRID_MAX_LEVEL = 8
+# Nombre de cellules par tuile de 256 px (cellules d'environ 32 px à l'écran)
+GRID_CELLS_PER_TILE = 8
+# Jusqu'à ce nombre de cellules, l'agrégation compte directement sur la grille complète
+DENSE_GRID_MAX_CELLS = 1 << 20
+# Rayon moyen de la Terre (km), utilisé pour les calculs géodésiques sphériques
+EARTH_RADIUS_KM = 6371.0088
+# Longueur maximale des segments indexés par `BoundaryIndex` (km) : les plus longs sont découpés
+BOUNDARY_SEGMENT_KM = 50.0
+# Nombre de segments candidats examinés par événement avant le recours à une recherche par rayon
+BOUNDARY_CANDIDATES = 8
+# Vue du globe (projection orthographique) tant que l'utilisateur ne l'a pas déplacée
+DEFAULT_GLOBE_VIEW = {'lon': 0.0, 'lat': 0.0, 'scale': 0.85}
+# Pas d'arrondi de la rotation du globe (degrés) et subdivisions de l'échelle par doublement
+GLOBE_ROTATION_STEP = 5.0
+GLOBE_SCALE_STEPS = 4
+# Rayon du cadre de tracé rapporté à celui du globe à l'échelle 1 (coins du cadre compris)
+GLOBE_FRAME_RATIO = 2.0
+# Marge ajoutée à l'hémisphère visible (degrés) : arrondi de la vue et petits déplacements
+GLOBE_CULL_MARGIN = 10.0
+
+
+def parse_mapbox_viewport(relayout_data: Optional[dict]) -> Optional[dict]:
+    """
+    Extrait la vue courante (zoom et emprise) d'un événement `relayoutData` Mapbox.
+    Args:
+        relayout_data: Données émises par le graphique lors d'un zoom/déplacement.
+    Returns:
+        {'zoom', 'west', 'east', 'south', 'north'} ou None si l'événement
+        ne concerne pas la vue de la carte.
+    """
+    if not relayout_data or 'mapbox.zoom' not in relayout_data:
+        return None
+    zoom = float(relayout_data['mapbox.zoom'])
+    derived = relayout_data.get('mapbox._derived', {}).get('coordinates')
+    if derived:
+        lons = [c[0] for c in derived]
+        lats = [c[1] for c in derived]
+        west, east = derived[0][0], derived[1][0]
+        south, north = min(lats), max(lats)
+        if max(lons) - min(lons) >= 360:
+            west, east = -180.0, 180.0
+    else:
+        # Emprise estimée pour une carte d'environ 1000 x 500 px
+        center = relayout_data.get('mapbox.center', {'lon': 0, 'lat': 0})
+        half_width = 360 / 2 ** zoom * 1000 / 512 / 2
+        half_height = half_width / 2
+        west, east = center['lon'] - half_width, center['lon'] + half_width
+        south, north = center['lat'] - half_height, center['lat'] + half_height
+        if half_width >= 180:
+            west, east = -180.0, 180.0
+    # Ramène les longitudes dans [-180, 180] (la carte peut faire plusieurs tours)
+    if east - west < 360:
+        west = (west + 180) % 360 - 180
+        east = (east + 180) % 360 - 180
+    return {
+        'zoom': zoom,
+        'west': float(west), 'east': float(east),
+        'south': float(max(south, -90)), 'north': float(min(north, 90)),
+    }
+
+
+def parse_globe_view(relayout_data: Optional[dict], previous: Optional[dict] = None) -> Optional[dict]:
+    """
+    Extrait la vue du globe (centre de la rotation et échelle) d'un événement
+    `relayoutData` de la projection orthographique. Les événements ne portent
+    que ce qui a changé (rotation ou échelle) : le reste vient de `previous`.
+    La rotation est arrondie à GLOBE_ROTATION_STEP et l'échelle arrondie par
+    défaut, pour que les petits déplacements donnent la même vue.
+    Args:
+        relayout_data: Données émises par le graphique lors d'une rotation/d'un zoom.
+        previous: Vue précédente (DEFAULT_GLOBE_VIEW si None).
+    Returns:
+        {'lon', 'lat', 'scale'} ou None si l'événement ne concerne pas le globe.
+    """
+    if not relayout_data:
+        return None
+    projection = dict(relayout_data.get('geo.projection') or {})
+    rotation = dict(projection.get('rotation') or relayout_data.get('geo.projection.rotation') or {})
+    lon = relayout_data.get('geo.projection.rotation.lon', rotation.get('lon'))
+    lat = relayout_data.get('geo.projection.rotation.lat', rotation.get('lat'))
+    scale = relayout_data.get('geo.projection.scale', projection.get('scale'))
+    if lon is None and lat is None and scale is None:
+        return None
+    view = dict(previous or DEFAULT_GLOBE_VIEW)
+    if lon is not None:
+        view['lon'] = float((round(float(lon) / GLOBE_ROTATION_STEP) * GLOBE_ROTATION_STEP + 180) % 360 - 180)
+    if lat is not None:
+        view['lat'] = float(np.clip(round(float(lat) / GLOBE_ROTATION_STEP) * GLOBE_ROTATION_STEP, -90, 90))
+    if scale is not None:
+        steps = np.floor(np.log2(max(float(scale), 1e-3)) * GLOBE_SCALE_STEPS)
+        view['scale'] = float(2 ** (steps / GLOBE_SCALE_STEPS))
+    return view
+
+
+def globe_visible_radius(scale: float) -> float:
+    """
+    Distance angulaire (degrés) au centre de la vue au-delà de laquelle un point
+    du globe n'est plus visible : la face cachée, et les bords sortis du cadre
+    lorsque le globe est agrandi. GLOBE_CULL_MARGIN est incluse.
+    """
+    radius = 90.0
+    if scale > GLOBE_FRAME_RATIO:
+        radius = float(np.degrees(np.arcsin(GLOBE_FRAME_RATIO / scale)))
+    return min(radius + GLOBE_CULL_MARGIN, 180.0)
+
+
+def _globe_mask(lat: np.ndarray, lon: np.ndarray, view: dict) -> np.ndarray:
+    """
+    Masque des coordonnées visibles sur le globe orienté selon `view`.
+    """
+    radius = globe_visible_radius(view['scale'])
+    if radius >= 180:
+        return np.ones(len(lat), dtype=bool)
+    lat0, lon0 = np.radians(view['lat']), np.radians(view['lon'])
+    lat_rad = np.radians(lat.astype(np.float64))
+    cos_angle = (np.sin(lat_rad) * np.sin(lat0)
+                 + np.cos(lat_rad) * np.cos(lat0) * np.cos(np.radians(lon.astype(np.float64)) - lon0))
+    return cos_angle >= np.cos(np.radians(radius))
+
+
+def _viewport_mask(lat: np.ndarray, lon: np.ndarray, viewport: dict) -> np.ndarray:
+    """
+    Masque des coordonnées situées dans une emprise issue de `parse_mapbox_viewport`.
+    """
+    mask = (lat >= viewport['south']) & (lat <= viewport['north'])
+    if viewport['east'] - viewport['west'] < 360:
+        if viewport['west'] <= viewport['east']:
+            mask &= (lon >= viewport['west']) & (lon <= viewport['east'])
+        else:
+            # Emprise à cheval sur l'antiméridien
+            mask &= (lon >= viewport['west']) | (lon <= viewport['east'])
+    return mask
+
+
+class GridLOD:
+    """
+    Index spatial multi-résolution pour l'affichage adapté au zoom.
+
+    Chaque événement reçoit une fois pour toutes ses coordonnées de cellule
+    dans la grille la plus fine (niveau `max_level`) ; la cellule aux niveaux
+    plus grossiers s'obtient par simple décalage de bits. Les positions sont
+    celles du DataFrame indexé (trié par magnitude), ce qui permet de combiner
+    l'emprise de la carte avec une plage de magnitudes.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray,
+                 max_level: int = GRID_MAX_LEVEL, cells_per_tile: int = GRID_CELLS_PER_TILE,
+                 cells: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        """
+        Args:
+            lat: Latitudes des événements.
+            lon: Longitudes des événements.
+            max_level: Niveau de la grille la plus fine.
+            cells_per_tile: Nombre de cellules par tuile et par axe.
+            cells: Colonnes et lignes de grille déjà calculées (`col`, `row`),
+                par exemple relues depuis un instantané partagé.
+        """
+        self.lat = np.asarray(lat)
+        self.lon = np.asarray(lon)
+        self.max_level = max_level
+        self.n_cols = 2 ** max_level * cells_per_tile
+        self.n_rows = self.n_cols // 2
+        if cells is not None:
+            self.col, self.row = cells
+            return
+        col = np.floor((self.lon.astype(np.float64) + 180) / 360 * self.n_cols)
+        row = np.floor((self.lat.astype(np.float64) + 90) / 180 * self.n_rows)
+        self.col: np.ndarray = np.clip(col, 0, self.n_cols - 1).astype(np.int32)
+        self.row: np.ndarray = np.clip(row, 0, self.n_rows - 1).astype(np.int32)
+
+    def level_for_zoom(self, zoom: float) -> int:
+        """
+        Niveau de grille adapté à un niveau de zoom de la carte.
+        """
+        return int(min(max(np.floor(zoom), 0), self.max_level))
+
+    def snap_viewport(self, viewport: Optional[dict]) -> Optional[dict]:
+        """
+        Ramène une emprise de `parse_mapbox_viewport` au niveau de zoom entier
+        et l'élargit aux cellules de grille de ce niveau qu'elle recoupe : les
+        petits déplacements de la carte donnent la même emprise (et donc la
+        même figure en cache), les points ajoutés restant hors écran.
+        """
+        if viewport is None:
+            return None
+        level = self.level_for_zoom(viewport['zoom'])
+        shift = self.max_level - level
+        cell_lon = 360 / (self.n_cols >> shift)
+        cell_lat = 180 / (self.n_rows >> shift)
+        west = np.floor((viewport['west'] + 180) / cell_lon) * cell_lon - 180
+        east = np.ceil((viewport['east'] + 180) / cell_lon) * cell_lon - 180
+        wraps = viewport['west'] > viewport['east']
+        if east - west >= 360 or (wraps and west <= east):
+            # Emprise élargie au monde entier (y compris à cheval sur l'antiméridien)
+            west, east = -180.0, 180.0
+        return {
+            'zoom': float(level),
+            'west': float(west), 'east': float(east),
+            'south': float(max(np.floor((viewport['south'] + 90) / cell_lat) * cell_lat - 90, -90)),
+            'north': float(min(np.ceil((viewport['north'] + 90) / cell_lat) * cell_lat - 90, 90)),
+        }
+
+    def visible_positions(self, start: int, stop: int, viewport: Optional[dict]) -> np.ndarray:
+        """
+        Positions, dans [start, stop), des événements situés dans l'emprise de la carte.
+        Args:
+            start: Première position de la plage (ex. plage de magnitudes).
+            stop: Fin (exclue) de la plage.
+            viewport: Emprise issue de `parse_mapbox_viewport` (monde entier si None).
+        Returns:
+            Tableau de positions croissantes.
+        """
+        if viewport is None:
+            return np.arange(start, stop)
+        return start + np.flatnonzero(_viewport_mask(self.lat[start:stop], self.lon[start:stop], viewport))
+
+    def positions_in_viewport(self, positions: np.ndarray, viewport: Optional[dict]) -> np.ndarray:
+        """
+        Sous-ensemble de `positions` (ex. plage de magnitudes restreinte à une
+        période) situé dans l'emprise de la carte, dans le même ordre.
+        """
+        if viewport is None:
+            return positions
+        return positions[_viewport_mask(self.lat[positions], self.lon[positions], viewport)]
+
+    def positions_on_globe(self, positions: np.ndarray, view: Optional[dict]) -> np.ndarray:
+        """
+        Sous-ensemble de `positions` visible sur le globe (voir `parse_globe_view`),
+        dans le même ordre : la face cachée n'est pas envoyée au navigateur.
+        """
+        return positions[_globe_mask(self.lat[positions], self.lon[positions], view or DEFAULT_GLOBE_VIEW)]
+
+    def _cells(self, positions: np.ndarray, level: int) -> Tuple[np.ndarray, int]:
+        """
+        Cellule de chaque événement au niveau `level` et nombre de cellules de ce niveau.
+        """
+        shift = self.max_level - level
+        n_cols = self.n_cols >> shift
+        cells = (self.row[positions] >> shift).astype(np.int64) * n_cols + (self.col[positions] >> shift)
+        return cells, n_cols * (self.n_rows >> shift)
+
+    def decimate(self, positions: np.ndarray, level: int, budget: int) -> np.ndarray:
+        """
+        Réduit `positions` à au plus `budget` événements, par priorité de magnitude
+        et en tenant compte de la densité : dans chaque cellule du niveau `level`,
+        les événements sont classés par magnitude décroissante, et le rang est
+        divisé par la racine du nombre d'événements de la cellule. Le plus fort de
+        chaque cellule est donc gardé en premier, puis les cellules actives
+        reçoivent plus de points que les autres, sans consommer tout le budget.
+        Args:
+            positions: Positions croissantes (donc par magnitude croissante).
+            level: Niveau de grille utilisé pour la densité.
+            budget: Nombre maximal d'événements conservés.
+        Returns:
+            Positions conservées, croissantes.
+        """
+        if len(positions) <= budget:
+            return positions
+        cells, _ = self._cells(positions, level)
+        # Dans chaque cellule, rang des événements par magnitude décroissante
+        order = np.lexsort((-positions, cells))
+        sorted_cells = cells[order]
+        first = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+        counts = np.diff(np.r_[first, len(order)])
+        group_start = np.repeat(first, counts)
+        priority = np.empty(len(order), dtype=np.float64)
+        priority[order] = (np.arange(len(order)) - group_start) / np.sqrt(np.repeat(counts, counts))
+        kept = np.lexsort((-positions, priority))[:budget]
+        return np.sort(positions[kept])
+
+    def aggregate(self, positions: np.ndarray, level: int, mags: np.ndarray) -> pd.DataFrame:
+        """
+        Agrège des événements par cellule de la grille du niveau `level`.
+        Args:
+            positions: Positions des événements à agréger.
+            level: Niveau de grille (0 = le plus grossier).
+            mags: Magnitudes de tous les événements (alignées sur les positions).
+        Returns:
+            Une ligne par cellule non vide : 'latitude', 'longitude' (barycentre
+            des événements), 'count' et 'max_mag'.
+        """
+        cells, n_cells = self._cells(positions, level)
+        if n_cells <= DENSE_GRID_MAX_CELLS:
+            # Grille grossière : comptage direct, sans tri
+            counts = np.bincount(cells, minlength=n_cells)
+            occupied = np.flatnonzero(counts)
+            lookup = np.empty(n_cells, dtype=np.int64)
+            lookup[occupied] = np.arange(len(occupied))
+            inverse = lookup[cells]
+            counts = counts[occupied]
+        else:
+            occupied, inverse = np.unique(cells, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(occupied))
+        lat_sum = np.bincount(inverse, weights=self.lat[positions], minlength=len(occupied))
+        lon_sum = np.bincount(inverse, weights=self.lon[positions], minlength=len(occupied))
+        max_mag = pd.Series(mags[positions]).groupby(inverse, sort=True).max().to_numpy()
+        return pd.DataFrame({
+            'latitude': lat_sum / np.maximum(counts, 1),
+            'longitude': lon_sum / np.maximum(counts, 1),
+            'count': counts,
+            'max_mag': max_mag,
+        })
+
+
+def to_unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Convertit des coordonnées géographiques en vecteurs unitaires 3D : la distance
+    euclidienne entre vecteurs croît avec la distance sur le globe, sans effet
+    de bord au méridien ±180° ni aux pôles.
+    Returns:
+        Tableau (n, 3).
+    """
+    lat_rad = np.radians(np.asarray(lat, dtype=float))
+    lon_rad = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack([cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)])
+
+
+class NearestEventIndex:
+    """
+    KD-tree des événements sur la sphère unité, pour retrouver l'événement le
+    plus proche d'une position (survol sans identifiant de ligne).
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        """
+        Args:
+            lat: Latitudes des événements.
+            lon: Longitudes des événements.
+        """
+        self.tree = cKDTree(to_unit_vectors(lat, lon))
+
+    def nearest(self, lat: float, lon: float) -> int:
+        """
+        Position de l'événement le plus proche de (lat, lon).
+        """
+        _, position = self.tree.query(to_unit_vectors([lat], [lon])[0])
+        return int(position)
+
+
+def _angle(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """
+    Angle (radians) entre vecteurs unitaires, précis aussi pour les petits angles.
+    """
+    return np.arctan2(np.linalg.norm(np.cross(u, v), axis=-1), np.sum(u * v, axis=-1))
+
+
+def _distance_to_arcs(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Distance angulaire (radians) de points à des arcs de grand cercle.
+    Args:
+        points: Vecteurs unitaires (..., 3).
+        starts: Origines des arcs (..., 3), diffusées avec `points`.
+        ends: Extrémités des arcs (..., 3).
+    Returns:
+        Distance de chaque point à l'arc correspondant : au grand cercle si la
+        projection du point tombe entre les extrémités, sinon à l'extrémité la plus proche.
+    """
+    normal = np.cross(starts, ends)
+    norm = np.linalg.norm(normal, axis=-1, keepdims=True)
+    degenerate = norm[..., 0] < 1e-12
+    normal = normal / np.where(norm < 1e-12, 1.0, norm)
+    offset = np.sum(points * normal, axis=-1)
+    projected = points - offset[..., None] * normal
+    inside = (
+        (np.sum(np.cross(starts, projected) * normal, axis=-1) >= 0)
+        & (np.sum(np.cross(projected, ends) * normal, axis=-1) >= 0)
+        & ~degenerate
+    )
+    to_ends = np.minimum(_angle(points, starts), _angle(points, ends))
+    return np.where(inside, np.arcsin(np.clip(np.abs(offset), 0, 1)), to_ends)
+
+
+class BoundaryIndex:
+    """
+    Index des segments de frontières tectoniques pour la distance de chaque
+    événement à la frontière la plus proche.
+
+    Les segments sont découpés à BOUNDARY_SEGMENT_KM au plus et leurs milieux
+    rangés dans un KD-tree sur la sphère unité. Pour un événement, seuls les
+    segments dont le milieu est parmi les plus proches sont mesurés exactement ;
+    le résultat est exact dès que le candidat le plus éloigné ne peut plus faire
+    mieux (distance de son milieu moins la demi-longueur maximale d'un segment),
+    sinon une recherche par rayon complète les candidats.
+    """
+
+    def __init__(self, lines: List[np.ndarray], max_segment_km: float = BOUNDARY_SEGMENT_KM):
+        """
+        Args:
+            lines: Polylignes (n, 2) lon/lat (ex. `FaultLayer.lines`).
+            max_segment_km: Longueur maximale d'un segment indexé.
+        """
+        starts, ends, owners = [], [], []
+        for i, line in enumerate(lines):
+            vectors = to_unit_vectors(line[:, 1], line[:, 0])
+            starts.append(vectors[:-1])
+            ends.append(vectors[1:])
+            owners.append(np.full(len(line) - 1, i, dtype=np.int32))
+        start = np.concatenate(starts) if starts else np.empty((0, 3))
+        end = np.concatenate(ends) if ends else np.empty((0, 3))
+        owner = np.concatenate(owners) if owners else np.empty(0, dtype=np.int32)
+
+        # Découpage des segments longs le long du grand cercle (interpolation sphérique)
+        theta = _angle(start, end)
+        pieces = np.maximum(1, np.ceil(theta * EARTH_RADIUS_KM / max_segment_km)).astype(np.int64)
+        segment = np.repeat(np.arange(len(start)), pieces)
+        step = np.arange(len(segment)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        t0 = (step / pieces[segment])[:, None]
+        t1 = ((step + 1) / pieces[segment])[:, None]
+        angle = theta[segment][:, None]
+        sin_angle = np.sin(angle)
+        safe = np.where(sin_angle < 1e-12, 1.0, sin_angle)
+
+        def slerp(t: np.ndarray) -> np.ndarray:
+            mixed = (np.sin((1 - t) * angle) * start[segment] + np.sin(t * angle) * end[segment]) / safe
+            return np.where(sin_angle < 1e-12, start[segment], mixed)
+
+        self.starts: np.ndarray = slerp(t0)
+        self.ends: np.ndarray = slerp(t1)
+        self.owner: np.ndarray = owner[segment]
+        midpoints = self.starts + self.ends
+        midpoints /= np.maximum(np.linalg.norm(midpoints, axis=1, keepdims=True), 1e-12)
+        self.max_half_angle = float((theta[segment] / pieces[segment]).max() / 2) if len(segment) else 0.0
+        self.tree = cKDTree(midpoints) if len(segment) else None
+
+    def nearest(self, lat: np.ndarray, lon: np.ndarray,
+                candidates: int = BOUNDARY_CANDIDATES) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distance de chaque position à la frontière la plus proche.
+        Args:
+            lat: Latitudes des événements.
+            lon: Longitudes des événements.
+            candidates: Nombre de segments examinés d'emblée par événement.
+        Returns:
+            (distances en km (float32), indice de la polyligne la plus proche) ;
+            NaN et -1 si l'index est vide.
+        """
+        n = len(lat)
+        if self.tree is None or n == 0:
+            return np.full(n, np.nan, dtype=np.float32), np.full(n, -1, dtype=np.int32)
+        points = to_unit_vectors(lat, lon)
+        k = min(candidates, len(self.owner))
+        chords, neighbours = self.tree.query(points, k=k)
+        chords, neighbours = chords.reshape(n, k), neighbours.reshape(n, k)
+        distances = _distance_to_arcs(points[:, None, :], self.starts[neighbours], self.ends[neighbours])
+        best = np.argmin(distances, axis=1)
+        rows = np.arange(n)
+        best_distance = distances[rows, best]
+        best_segment = neighbours[rows, best]
+
+        # Un segment non examiné est au moins à (distance de son milieu - demi-longueur) :
+        # au-delà du k-ième milieu, seul un recours par rayon peut encore trouver mieux
+        farthest = 2 * np.arcsin(np.clip(chords[:, -1] / 2, 0, 1))
+        unsure = np.flatnonzero((k < len(self.owner)) & (best_distance > farthest - self.max_half_angle))
+        for i in unsure:
+            radius = 2 * np.sin(min((best_distance[i] + self.max_half_angle) / 2, np.pi / 2))
+            found = np.asarray(self.tree.query_ball_point(points[i], radius), dtype=np.int64)
+            if len(found):
+                exact = _distance_to_arcs(points[i], self.starts[found], self.ends[found])
+                j = int(np.argmin(exact))
+                if exact[j] < best_distance[i]:
+                    best_distance[i], best_segment[i] = exact[j], found[j]
+        return (best_distance * EARTH_RADIUS_KM).astype(np.float32), self.owner[best_segment]
@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+# Durée de démarrage visée (secondes), modifiable par la variable d'environnement STARTUP_BUDGET_S
+STARTUP_BUDGET_S = float(os.environ.get("STARTUP_BUDGET_S", 5))
+
+
+class StartupTimer:
+    """
+    Mesure la durée des phases du démarrage (imports, chargement des données,
+    construction des index, mise en page...) pour les comparer au budget.
+    """
+
+    def __init__(self):
+        # (nom, durée en secondes, profondeur d'imbrication)
+        self.phases: List[Tuple[str, float, int]] = []
+        self._depth = threading.local()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Chronomètre le bloc `with` et l'enregistre sous le nom `name`.
+        Les phases imbriquées sont détaillées mais ne comptent pas dans le total.
+        """
+        depth = getattr(self._depth, "value", 0)
+        self._depth.value = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth.value = depth
+            self.phases.append((name, time.perf_counter() - start, depth))
+
+    def report(self, budget: float = STARTUP_BUDGET_S) -> dict:
+        """
+        Affiche la durée de chaque phase et le total par rapport au budget.
+        Returns:
+            {'phases': {nom: secondes}, 'total': secondes, 'budget': secondes, 'within_budget': bool}
+        """
+        total = sum(seconds for _, seconds, depth in self.phases if depth == 0)
+        for name, seconds, depth in self.phases:
+            print(f"{'  ' * depth + name:<24} {seconds * 1000:9.1f} ms")
+        status = "OK" if total <= budget else "OVER BUDGET"
+        print(f"{'total':<24} {total * 1000:9.1f} ms (budget {budget * 1000:.0f} ms, {status})")
+        return {
+            "phases": {name: seconds for name, seconds, _ in self.phases},
+            "total": total,
+            "budget": budget,
+            "within_budget": total <= budget,
+        }
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,224 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from src.utils.spatial import BoundaryIndex
+
+# URL du GeoJSON des frontières tectoniques
+TECTONIC_GEOJSON_URL = "https://raw.githubusercontent.com/fraxen/tectonicplates/master/GeoJSON/PB2002_boundaries.json"
+# Copie locale compacte (tableaux NumPy) des frontières, générée une fois par
+# `python -m src.utils.tectonics` (non versionnée, téléchargée à défaut au premier chargement)
+TECTONIC_CACHE_PATH = 'data/tectonic/PB2002_boundaries.npz'
+# Tolérances de simplification Douglas–Peucker (degrés) ; le niveau 0 est la géométrie complète
+SIMPLIFICATION_TOLERANCES = (0.0, 0.01, 0.05, 0.2)
+# Écart maximal toléré à l'écran lors du choix du niveau de simplification (pixels)
+MAX_PIXEL_ERROR = 0.5
+
+
+def douglas_peucker(coords: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplifie une polyligne par l'algorithme de Douglas–Peucker.
+    Args:
+        coords: Tableau (n, 2) de (longitude, latitude).
+        tolerance: Écart maximal (en degrés) entre la ligne simplifiée et l'originale.
+    Returns:
+        Masque booléen des sommets conservés (les extrémités le sont toujours).
+    """
+    n = len(coords)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if tolerance <= 0 or n < 3:
+        keep[:] = True
+        return keep
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = coords[first], coords[last]
+        segment = end - start
+        points = coords[first + 1:last] - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(points[:, 0], points[:, 1])
+        else:
+            distances = np.abs(segment[0] * points[:, 1] - segment[1] * points[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return keep
+
+
+def geojson_to_lines(tectonic_data: dict) -> Tuple[List[np.ndarray], List[str], List[str]]:
+    """
+    Extrait les polylignes (LineString et MultiLineString) d'un GeoJSON de frontières.
+    Returns:
+        (liste de tableaux (n, 2) lon/lat, noms des frontières, types des frontières)
+    """
+    lines, names, types = [], [], []
+    for feature in tectonic_data["features"]:
+        geometry = feature["geometry"]
+        properties = feature.get("properties") or {}
+        if geometry["type"] == "LineString":
+            parts = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiLineString":
+            parts = geometry["coordinates"]
+        else:
+            continue
+        for part in parts:
+            if len(part) < 2:
+                continue
+            lines.append(np.asarray(part, dtype=float)[:, :2])
+            names.append(str(properties.get("Name", "")))
+            types.append(str(properties.get("Type") or "boundary"))
+    return lines, names, types
+
+
+def _join_lines(lines: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Concatène des polylignes en tableaux lon/lat séparés par des NaN (une seule trace).
+    """
+    if not lines:
+        empty = np.empty(0, dtype=np.float32)
+        return empty, empty
+    separator = np.full((1, 2), np.nan)
+    joined = np.concatenate([part for line in lines for part in (line, separator)][:-1])
+    return joined[:, 0].astype(np.float32), joined[:, 1].astype(np.float32)
+
+
+class FaultLayer:
+    """
+    Couche des frontières tectoniques prête à l'affichage : les tableaux lon/lat
+    (séparés par des NaN) sont calculés une fois pour chaque niveau de
+    simplification, et les segments d'origine restent disponibles pour les
+    calculs géométriques.
+    """
+
+    def __init__(self, lines: List[np.ndarray], names: List[str], types: List[str],
+                 tolerances: Tuple[float, ...] = SIMPLIFICATION_TOLERANCES,
+                 levels: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None):
+        """
+        Args:
+            lines: Polylignes (n, 2) lon/lat à pleine résolution.
+            names: Nom de chaque polyligne (ex. 'AF-AN').
+            types: Type de frontière de chaque polyligne.
+            tolerances: Tolérances des niveaux de simplification (croissantes).
+            levels: Tableaux lon/lat déjà calculés par niveau (sinon calculés ici).
+        """
+        self.lines = lines
+        self.names = names
+        self.types = types
+        self.tolerances = tuple(tolerances)
+        if levels is None:
+            levels = [
+                _join_lines([line[douglas_peucker(line, tol)] for line in lines])
+                for tol in self.tolerances
+            ]
+        self.levels = levels
+
+    def level_for_zoom(self, zoom: float) -> int:
+        """
+        Niveau le plus simplifié dont l'écart reste sous MAX_PIXEL_ERROR au zoom donné
+        (une tuile de 512 px couvre 360° au zoom 0).
+        """
+        degrees_per_pixel = 360 / (512 * 2 ** zoom)
+        level = 0
+        for i, tolerance in enumerate(self.tolerances):
+            if tolerance <= MAX_PIXEL_ERROR * degrees_per_pixel:
+                level = i
+        return level
+
+    def lines_for_zoom(self, zoom: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tableaux (longitudes, latitudes) séparés par des NaN adaptés au zoom.
+        """
+        return self.levels[self.level_for_zoom(zoom)]
+
+    def boundary_index(self) -> BoundaryIndex:
+        """
+        Index des segments à pleine résolution pour les distances aux frontières.
+        """
+        return BoundaryIndex(self.lines)
+
+    def save(self, path: str) -> None:
+        """
+        Enregistre la couche au format NumPy compressé (.npz).
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        lengths = np.array([len(line) for line in self.lines], dtype=np.int64)
+        arrays = {
+            "tolerances": np.asarray(self.tolerances, dtype=float),
+            "line_offsets": np.concatenate([[0], np.cumsum(lengths)]),
+            "line_coords": (np.concatenate(self.lines) if self.lines else np.empty((0, 2))).astype(np.float32),
+            "line_names": np.asarray(self.names, dtype=str),
+            "line_types": np.asarray(self.types, dtype=str),
+        }
+        for i, (lon, lat) in enumerate(self.levels):
+            arrays[f"lon_{i}"] = lon
+            arrays[f"lat_{i}"] = lat
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FaultLayer":
+        """
+        Relit une couche enregistrée par `save`.
+        """
+        with np.load(path) as data:
+            tolerances = tuple(data["tolerances"].tolist())
+            offsets = data["line_offsets"]
+            coords = data["line_coords"].astype(float)
+            lines = [coords[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+            levels = [(data[f"lon_{i}"], data[f"lat_{i}"]) for i in range(len(tolerances))]
+            return cls(lines, data["line_names"].tolist(), data["line_types"].tolist(), tolerances, levels)
+
+    @classmethod
+    def from_geojson(cls, tectonic_data: dict) -> "FaultLayer":
+        """
+        Construit la couche (et ses niveaux de simplification) à partir du GeoJSON.
+        """
+        return cls(*geojson_to_lines(tectonic_data))
+
+
+def download_fault_layer(url: str = TECTONIC_GEOJSON_URL, cache_path: str = TECTONIC_CACHE_PATH,
+                         timeout: float = 10) -> FaultLayer:
+    """
+    Télécharge le GeoJSON des frontières, le convertit et l'enregistre dans le cache local.
+    """
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    layer = FaultLayer.from_geojson(json.loads(response.text))
+    layer.save(cache_path)
+    return layer
+
+
+def load_fault_layer(cache_path: str = TECTONIC_CACHE_PATH, url: str = TECTONIC_GEOJSON_URL,
+                     timeout: float = 10) -> Optional[FaultLayer]:
+    """
+    Charge la couche des frontières tectoniques depuis le cache local ; si celui-ci
+    est absent, tente un téléchargement borné par `timeout`.
+    Returns:
+        La couche, ou None si elle n'est pas disponible (mode hors ligne).
+    """
+    if os.path.isfile(cache_path):
+        return FaultLayer.load(cache_path)
+    try:
+        return download_fault_layer(url, cache_path, timeout)
+    except (requests.RequestException, ValueError, KeyError) as exc:
+        print(f"Tectonic boundaries unavailable: {exc}")
+        return None
+
+
+if __name__ == "__main__":
+    layer = download_fault_layer()
+    print(f"Tectonic boundaries saved to {TECTONIC_CACHE_PATH} "
+          f"({sum(len(line) for line in layer.lines)} vertices).")
@@ -0,0 +1,154 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from src.utils import get_data
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 1, 3)
+
+
+class StubResponse:
+    """
+    Réponse minimale de `requests` : JSON du point d'accès `count` ou corps CSV
+    diffusé par blocs, éventuellement interrompu après le premier bloc.
+    """
+
+    def __init__(self, payload=None, body=b"", interrupted=False):
+        self.payload = payload
+        self.body = body
+        self.interrupted = interrupted
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+    def iter_content(self, chunk_size):
+        yield self.body[:16]
+        if self.interrupted:
+            raise requests.ConnectionError("connexion interrompue")
+        yield self.body[16:]
+
+
+class StubSession:
+    """
+    Imite l'API USGS sur un catalogue en mémoire (bornes `starttime` et
+    `endtime` incluses, comme l'API) et consigne les requêtes reçues.
+    """
+
+    def __init__(self, times, max_allowed=20000, interrupt_starts=()):
+        self.times = sorted(times)
+        self.max_allowed = max_allowed
+        self.interrupt_starts = set(interrupt_starts)
+        self.counts = []
+        self.queries = []
+
+    def _selected(self, params):
+        start = datetime.fromisoformat(params["starttime"])
+        end = datetime.fromisoformat(params["endtime"])
+        return start, [t for t in self.times if start <= t <= end]
+
+    def get(self, url, params, timeout, stream=False):
+        start, selected = self._selected(params)
+        if url.endswith("/count"):
+            self.counts.append(params)
+            return StubResponse({"count": len(selected), "maxAllowed": self.max_allowed})
+        self.queries.append(params)
+        # Comme l'API : du plus récent au plus ancien
+        rows = "".join(f"{t.isoformat()}Z,{t:%Y%m%d%H%M%S}\n" for t in reversed(selected))
+        body = f"time,id\n{rows}".encode()
+        return StubResponse(body=body, interrupted=start in self.interrupt_starts)
+
+    def close(self):
+        pass
+
+
+def hourly(start=START, end=END):
+    """Un événement à chaque heure pile de [start, end)."""
+    return [start + timedelta(hours=h) for h in range(int((end - start) / timedelta(hours=1)))]
+
+
+def read_ids(path):
+    with open(path, encoding="utf-8") as f:
+        header = f.readline()
+        assert header == "time,id\n"
+        return [line.rstrip("\n").split(",")[1] for line in f]
+
+
+def test_plan_time_windows_bisects_into_half_open_windows():
+    times = hourly()
+    session = StubSession(times)
+    windows = get_data.plan_time_windows(session, START, END, 4.5, max_events=5)
+
+    assert windows[0][0] == START and windows[-1][1] == END
+    for (_, previous_end, _), (next_start, _, _) in zip(windows, windows[1:]):
+        assert previous_end == next_start
+    assert all(count <= 5 for _, _, count in windows)
+    # Les événements situés sur une frontière de fenêtre ne sont comptés qu'une fois
+    assert any(w_start in times for w_start, _, _ in windows[1:])
+    assert sum(count for _, _, count in windows) == len(times)
+
+
+def test_plan_time_windows_keeps_quiet_periods_whole():
+    session = StubSession(hourly(START, START + timedelta(hours=3)))
+    windows = get_data.plan_time_windows(session, START, END, 4.5, max_events=5)
+    assert windows == [(START, END, 3)]
+    assert len(session.counts) == 1
+
+
+def test_download_window_excludes_end(tmp_path):
+    session = StubSession([START, START + timedelta(hours=1), END])
+    path = tmp_path / "window.csv"
+    get_data.download_window(session, START, END, 4.5, str(path))
+    assert len(read_ids(path)) == 2
+    assert session.queries[0]["endtime"] == "2024-01-02T23:59:59.999"
+
+
+def test_interrupted_download_leaves_only_part_file(tmp_path):
+    session = StubSession(hourly(), interrupt_starts=[START])
+    path = tmp_path / "window.csv"
+    with pytest.raises(requests.ConnectionError):
+        get_data.download_window(session, START, END, 4.5, str(path))
+    assert not path.exists()
+    assert (tmp_path / "window.csv.part").exists()
+
+
+def test_fetch_resumes_missing_windows_from_manifest(tmp_path, monkeypatch):
+    times = hourly()
+    chunk_dir = tmp_path / "chunks"
+    output = tmp_path / "earthquakes.csv"
+    failing = StubSession(times, max_allowed=12, interrupt_starts=[START])
+    monkeypatch.setattr(get_data, "create_session", lambda pool_size=4: failing)
+
+    assert not get_data.fetch_earthquake_data(
+        "2024-01-01", "2024-01-03", 4.5, str(output), str(chunk_dir), max_workers=1
+    )
+    assert not output.exists()
+    with open(chunk_dir / get_data.MANIFEST_NAME, encoding="utf-8") as f:
+        manifest = json.load(f)
+    missing = [w for w in manifest["windows"] if not w["done"]]
+    assert len(missing) == 1 and missing[0]["start"] == "2024-01-01T00:00:00"
+    assert (chunk_dir / f"{missing[0]['file']}.part").exists()
+
+    resumed = StubSession(times, max_allowed=12)
+    monkeypatch.setattr(get_data, "create_session", lambda pool_size=4: resumed)
+    assert get_data.fetch_earthquake_data(
+        "2024-01-01", "2024-01-03", 4.5, str(output), str(chunk_dir), max_workers=1
+    )
+    # Le plan est relu dans le manifeste et seule la fenêtre manquante est téléchargée
+    assert resumed.counts == []
+    assert [q["starttime"] for q in resumed.queries] == ["2024-01-01T00:00:00"]
+    assert not any(name.endswith(".part") for name in os.listdir(chunk_dir))
+    ids = read_ids(output)
+    assert len(ids) == len(set(ids)) == len(times)
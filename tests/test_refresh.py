@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from src.utils import clean_data, get_data
+from src.utils.clean_data import clean_earthquake_data
+from src.utils.data_provider import DataProvider
+from src.utils.refresh import DataRefresher
+
+COLUMNS = ["time", "latitude", "longitude", "depth", "mag", "place", "updated", "id"]
+
+
+def event(event_id, time, mag, updated, lat=10.0, lon=20.0):
+    return {"time": f"{time}Z", "latitude": lat, "longitude": lon, "depth": 10.0, "mag": mag,
+            "place": f"near {event_id}", "updated": f"{updated}Z", "id": event_id}
+
+
+def to_csv(events):
+    return pd.DataFrame(events, columns=COLUMNS).to_csv(index=False)
+
+
+class StubResponse:
+    """
+    Réponse minimale de `requests` : JSON du point d'accès `count` ou corps CSV.
+    """
+
+    def __init__(self, payload=None, body=b""):
+        self.payload = payload
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+
+class StubSession:
+    """
+    Imite l'API USGS sur un catalogue en mémoire : bornes `starttime` et
+    `endtime` incluses, seuls les événements modifiés à partir de `updatedafter`
+    sont renvoyés. Consigne les paramètres des requêtes reçues.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.queries = []
+
+    def _selected(self, params):
+        start = datetime.fromisoformat(params["starttime"])
+        end = datetime.fromisoformat(params["endtime"])
+        updated_after = datetime.fromisoformat(params["updatedafter"])
+        return [e for e in self.events
+                if start <= datetime.fromisoformat(e["time"][:-1]) <= end
+                and datetime.fromisoformat(e["updated"][:-1]) >= updated_after]
+
+    def get(self, url, params, timeout, stream=False):
+        self.queries.append(params)
+        selected = self._selected(params)
+        if url.endswith("/count"):
+            return StubResponse({"count": len(selected), "maxAllowed": 20000})
+        return StubResponse(body=to_csv(selected).encode())
+
+    def close(self):
+        pass
+
+
+def test_refresh_once_merges_updates_and_advances_cursor(tmp_path, monkeypatch):
+    monkeypatch.setattr(clean_data, "load_fault_layer", lambda: None)
+    raw_path = tmp_path / "raw.csv"
+    store_path = str(tmp_path / "store")
+    raw_path.write_text(to_csv([
+        event("a", "2024-01-01T00:00:00", 5.0, "2024-01-01T01:00:00"),
+        event("b", "2024-01-02T00:00:00", 4.6, "2024-01-02T01:00:00", lat=-30.0),
+    ]))
+    clean_earthquake_data(raw_path=str(raw_path), store_path=store_path)
+    data_provider = DataProvider(store_path=store_path, shared_root="", working_set={})
+    assert len(data_provider.get().df) == 2
+
+    # Révision de "b" (magnitude corrigée) et nouvel événement "c"
+    session = StubSession([
+        event("b", "2024-01-02T00:00:00", 4.9, "2024-01-03T00:00:00", lat=-30.0),
+        event("c", "2024-01-02T12:00:00", 6.1, "2024-01-02T13:00:00", lat=40.0),
+    ])
+    monkeypatch.setattr(get_data, "create_session", lambda pool_size=4: session)
+    refresher = DataRefresher(data_provider, interval=60, updates_path=str(tmp_path / "updates.csv"))
+
+    assert refresher.refresh_once() == (1, 1)
+    # Le curseur part de la révision la plus récente du store initial
+    assert {q["updatedafter"] for q in session.queries} == {"2024-01-02T01:00:00"}
+    assert all(q["starttime"] == "2024-01-01T00:00:00" for q in session.queries)
+    assert not (tmp_path / "updates.csv").exists()
+    df = data_provider.get().df.set_index("place")
+    assert sorted(df.index) == ["near a", "near b", "near c"]
+    assert df.loc["near b", "mag"] == pytest.approx(4.9)
+
+    session.queries.clear()
+    assert refresher.refresh_once() == (0, 0)
+    # Second passage : le curseur a avancé jusqu'à la révision de "b"
+    assert {q["updatedafter"] for q in session.queries} == {"2024-01-03T00:00:00"}
+    assert len(data_provider.get().df) == 3